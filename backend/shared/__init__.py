@@ -0,0 +1,3 @@
+'''
+Общий код для функций backend/clients, backend/contacts и backend/crm-api
+'''
@@ -0,0 +1,142 @@
+'''
+Business: asyncio-путь к PostgreSQL через asyncpg - независимые запросы одного вызова выполняются параллельно
+Args: ASYNC_DB (on/off), DATABASE_URL, ASYNC_DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, PREPARED_STATEMENTS - переменные окружения
+Returns: run(coro) для синхронного handler, gather(...) и fetch/fetchrow/fetchval с замерами в RequestTrace
+
+Платформа вызывает handler синхронно, поэтому корутины выполняются в отдельном потоке
+со своим event loop; loop и пул asyncpg живут между тёплыми вызовами, как и ConnectionPool.
+Каждый запрос внутри gather берёт своё соединение из пула, так что время ответа - это
+самый долгий запрос, а не сумма. Запросы пишутся с %s и %(name)s, как для psycopg2,
+и переводятся в $1, $2 тем же to_positional, что и prepared statements.
+'''
+import asyncio
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from shared.db import DEFAULT_MAX_SIZE, DEFAULT_TIMEOUT
+from shared.instrumentation import RequestTrace, current_trace, record_query
+from shared.prepared import to_positional
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+Params = Union[Sequence[Any], Mapping[str, Any]]
+
+_trace: ContextVar[Optional[RequestTrace]] = ContextVar('crm_async_trace', default=None)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+_pool: Any = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+_statements: Dict[str, Tuple[str, List[Optional[str]]]] = {}
+
+
+def enabled() -> bool:
+    return asyncpg is not None and os.environ.get('ASYNC_DB', 'off') == 'on'
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='crm-async-db', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run(coro: Awaitable[Any]) -> Any:
+    '''
+    Выполняет корутину в фоновом loop и ждёт результат; трассировка текущего вызова
+    передаётся в корутину через ContextVar и наследуется задачами gather.
+    '''
+    trace = current_trace()
+
+    async def traced() -> Any:
+        _trace.set(trace)
+        return await coro
+
+    return asyncio.run_coroutine_threadsafe(traced(), _get_loop()).result()
+
+
+async def get_async_pool() -> Any:
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                # За PgBouncer в режиме transaction кэш prepared statements asyncpg тоже надо выключить
+                statement_cache_size = 0 if os.environ.get('PREPARED_STATEMENTS', 'on') == 'off' else 100
+                _pool = await asyncpg.create_pool(
+                    os.environ.get('DATABASE_URL'),
+                    min_size=0,
+                    max_size=int(os.environ.get('ASYNC_DB_POOL_MAX_SIZE', DEFAULT_MAX_SIZE)),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_TIMEOUT)),
+                    statement_cache_size=statement_cache_size
+                )
+    return _pool
+
+
+def stats_header() -> str:
+    if _pool is None:
+        return 'async;size=0;idle=0'
+    return f'async;size={_pool.get_size()};idle={_pool.get_idle_size()}'
+
+
+def _positional(sql: str, params: Params) -> Tuple[str, Sequence[Any]]:
+    cached = _statements.get(sql)
+    if cached is None:
+        cached = _statements[sql] = to_positional(sql)
+    text, order = cached
+    if isinstance(params, Mapping):
+        params = [params[key] for key in order]
+    return text, params
+
+
+async def _query(method: str, sql: str, params: Params) -> Any:
+    text, args = _positional(sql, params)
+    pool = await get_async_pool()
+    timeout = float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_TIMEOUT))
+    async with pool.acquire(timeout=timeout) as conn:
+        started = time.perf_counter()
+        result = await getattr(conn, method)(text, *args)
+        seconds = time.perf_counter() - started
+    if method == 'fetch':
+        rows = len(result)
+    else:
+        rows = 0 if result is None else 1
+    record_query(_trace.get(), seconds, rows, lambda: ' '.join(text.split()))
+    return result
+
+
+async def fetch(sql: str, params: Params = ()) -> List[Any]:
+    return await _query('fetch', sql, params)
+
+
+async def fetchrow(sql: str, params: Params = ()) -> Optional[Any]:
+    return await _query('fetchrow', sql, params)
+
+
+async def fetchval(sql: str, params: Params = ()) -> Any:
+    return await _query('fetchval', sql, params)
+
+
+async def gather(*queries: Awaitable[Any]) -> List[Any]:
+    '''
+    asyncio.gather, который при ошибке одного запроса дожидается остальных -
+    соединения возвращаются в пул до того, как ошибка уйдёт в Router.
+    '''
+    results = await asyncio.gather(*queries, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return list(results)
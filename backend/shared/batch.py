@@ -0,0 +1,163 @@
+'''
+Business: Пакетная запись взаимодействий - массив одним INSERT и групповая фиксация одиночных POST
+Args: INTERACTIONS_GROUP_COMMIT_MS - окно сбора одиночных POST (0 - выключено), INTERACTIONS_GROUP_COMMIT_MAX
+Returns: read_batch(body) - проверенные строки пакета; get_group_commit() - GroupCommit или None
+
+Колл-центр пишет по строке на звонок, и каждая строка - отдельная транзакция с COMMIT.
+action=batch принимает массив и вставляет его одним оператором в одной транзакции.
+Групповая фиксация собирает одиночные POST, пришедшие в окно в несколько миллисекунд
+в потоках одного тёплого контейнера: первый запрос становится ведущим, ждёт окно,
+вставляет строки всех ожидающих одним INSERT и одним COMMIT и раздаёт каждому его строку.
+'''
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+DEFAULT_GROUP_COMMIT_MAX = 100
+MAX_BATCH_ROWS = 1000
+
+# Ведомый ждёт ведущего не дольше этого; обычно ждать приходится окно плюс один INSERT
+FOLLOWER_TIMEOUT = 30.0
+
+Values = Tuple[Any, ...]
+InsertRows = Callable[[Any, Sequence[Values]], List[Sequence[Any]]]
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def interaction_values(item: Any, position: Optional[int] = None) -> Values:
+    '''
+    (client_id, interaction_type, description, created_by) - те же поля, что у одиночного POST.
+    '''
+    where = f'Item {position}: ' if position is not None else ''
+    if not isinstance(item, dict):
+        raise InvalidBatch(f'{where}interaction must be an object')
+    try:
+        client_id = int(item.get('clientId'))
+    except (TypeError, ValueError):
+        raise InvalidBatch(f'{where}clientId must be an integer')
+    interaction_type = item.get('interactionType')
+    if not interaction_type:
+        raise InvalidBatch(f'{where}interactionType is required')
+    return client_id, interaction_type, item.get('description'), item.get('createdBy', 'System')
+
+
+def read_batch(body: Any) -> List[Values]:
+    items = body.get('interactions') if isinstance(body, dict) else body
+    if not isinstance(items, list) or not items:
+        raise InvalidBatch('Body must be a non-empty array of interactions')
+    if len(items) > MAX_BATCH_ROWS:
+        raise InvalidBatch(f'At most {MAX_BATCH_ROWS} interactions per batch')
+    return [interaction_values(item, position) for position, item in enumerate(items)]
+
+
+class _Pending:
+    __slots__ = ('values', 'done', 'row', 'error')
+
+    def __init__(self, values: Values):
+        self.values = values
+        self.done = threading.Event()
+        self.row: Optional[Sequence[Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommit:
+    '''
+    Ведущий - поток, заставший очередь пустой; он же и пишет, на своём соединении.
+    Набралось max_rows строк - ведущий не дожидается конца окна.
+    '''
+
+    def __init__(self, window: float, max_rows: int = DEFAULT_GROUP_COMMIT_MAX):
+        self.window = window
+        self.max_rows = max(1, max_rows)
+        self._lock = threading.Lock()
+        self._pending: List[_Pending] = []
+        self._full = threading.Event()
+        self._leading = False
+        self.groups = 0
+        self.rows = 0
+        self.fallbacks = 0
+
+    def submit(self, conn: Any, values: Values, insert: InsertRows) -> Sequence[Any]:
+        item = _Pending(values)
+        with self._lock:
+            self._pending.append(item)
+            lead = not self._leading
+            self._leading = True
+            if len(self._pending) >= self.max_rows:
+                self._full.set()
+
+        if lead:
+            self._full.wait(self.window)
+            with self._lock:
+                group, self._pending = self._pending, []
+                self._leading = False
+                self._full.clear()
+            self._flush(conn, group, insert)
+        elif not item.done.wait(FOLLOWER_TIMEOUT):
+            raise TimeoutError('Group commit did not complete in time')
+
+        if item.error is not None:
+            raise item.error
+        return item.row
+
+    def _flush(self, conn: Any, group: List[_Pending], insert: InsertRows) -> None:
+        try:
+            try:
+                with conn.cursor() as cursor:
+                    rows = insert(cursor, [item.values for item in group])
+                conn.commit()
+                for item, row in zip(group, rows):
+                    item.row = row
+                with self._lock:
+                    self.groups += 1
+                    self.rows += len(group)
+            except psycopg2.Error:
+                conn.rollback()
+                if len(group) == 1:
+                    raise
+                # Одна плохая строка (например, удалённый клиент) не должна ронять чужие звонки
+                with self._lock:
+                    self.fallbacks += 1
+                for item in group:
+                    try:
+                        with conn.cursor() as cursor:
+                            item.row = insert(cursor, [item.values])[0]
+                        conn.commit()
+                    except psycopg2.Error as error:
+                        conn.rollback()
+                        item.error = error
+        except BaseException as error:
+            for item in group:
+                if item.row is None and item.error is None:
+                    item.error = error
+        finally:
+            for item in group:
+                item.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'groups': self.groups, 'rows': self.rows, 'fallbacks': self.fallbacks}
+
+
+_group_commit: Optional[GroupCommit] = None
+_group_commit_lock = threading.Lock()
+
+
+def get_group_commit() -> Optional[GroupCommit]:
+    global _group_commit
+    window_ms = float(os.environ.get('INTERACTIONS_GROUP_COMMIT_MS', 0))
+    if window_ms <= 0:
+        return None
+    if _group_commit is None:
+        with _group_commit_lock:
+            if _group_commit is None:
+                _group_commit = GroupCommit(
+                    window_ms / 1000,
+                    int(os.environ.get('INTERACTIONS_GROUP_COMMIT_MAX', DEFAULT_GROUP_COMMIT_MAX))
+                )
+    return _group_commit
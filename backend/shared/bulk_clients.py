@@ -0,0 +1,141 @@
+'''
+Business: Массовое удаление и изменение клиентов по списку id или фильтру - один SQL-оператор на операцию
+Args: conn - соединение из пула, body - {"ids": [...]} или {"filter": {...}}, для изменения ещё {"set": {...}}
+Returns: dict с числом затронутых клиентов, контактов и взаимодействий
+
+Удаление клиента вместе с контактами и взаимодействиями - один оператор с CTE: внешние
+ключи V0001 проверяются в конце оператора (NO ACTION), поэтому порядок удаления внутри
+него не важен, а триггеры счётчиков и версий срабатывают по разу на таблицу, а не на клиента.
+Клиенты блокируются FOR UPDATE в начале, так что параллельная вставка контакта или
+взаимодействия для удаляемого клиента дождётся конца удаления и получит ошибку внешнего ключа.
+'''
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.db import transaction
+from shared.bulk_import import CLIENT_LIMITS
+
+MAX_BULK_IDS = 10000
+
+# Поля, которые можно задать сразу многим клиентам: name обязателен и индивидуален, email уникален
+BULK_UPDATE_FIELDS = ('company', 'phone', 'address')
+
+# Фильтр в crm-api приходит в camelCase, в clients - в snake_case
+FILTER_ALIASES = {'createdBefore': 'created_before', 'updatedBefore': 'updated_before', 'inactiveSince': 'inactive_since'}
+
+
+class InvalidBulkRequest(ValueError):
+    pass
+
+
+def _timestamp(name: str, value: Any) -> datetime:
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise InvalidBulkRequest(f'{name} must be an ISO 8601 date or timestamp')
+
+
+def read_selection(body: Dict[str, Any], schema: str = '') -> Tuple[str, List[Any]]:
+    '''
+    Условие WHERE для clients c. Пустой фильтр - ошибка: "удалить всех" одним запросом не делается.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    ids = body.get('ids')
+    raw_filter = body.get('filter')
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise InvalidBulkRequest('ids must be a non-empty array')
+        if len(ids) > MAX_BULK_IDS:
+            raise InvalidBulkRequest(f'At most {MAX_BULK_IDS} ids per request')
+        try:
+            ids = [int(client_id) for client_id in ids]
+        except (TypeError, ValueError):
+            raise InvalidBulkRequest('ids must be integers')
+        return 'c.id = ANY(%s)', [ids]
+
+    if not isinstance(raw_filter, dict):
+        raise InvalidBulkRequest('Either ids or filter is required')
+    criteria = {FILTER_ALIASES.get(k, k): v for k, v in raw_filter.items()}
+    conditions: List[str] = []
+    params: List[Any] = []
+    if criteria.get('created_before'):
+        conditions.append('c.created_at < %s')
+        params.append(_timestamp('created_before', criteria['created_before']))
+    if criteria.get('updated_before'):
+        conditions.append('c.updated_at < %s')
+        params.append(_timestamp('updated_before', criteria['updated_before']))
+    if criteria.get('inactive_since'):
+        # "Устаревший" клиент: заведён до даты и с тех пор ни одного взаимодействия
+        since = _timestamp('inactive_since', criteria['inactive_since'])
+        conditions.append(f"""c.created_at < %s AND NOT EXISTS (
+            SELECT 1 FROM {prefix}interactions i WHERE i.client_id = c.id AND i.interaction_date >= %s
+        )""")
+        params.extend([since, since])
+    if 'company' in criteria:
+        # Равенство и IS NULL раздельно: IS NOT DISTINCT FROM индекс по company не использует
+        if criteria['company']:
+            conditions.append('c.company = %s')
+            params.append(criteria['company'])
+        else:
+            conditions.append('c.company IS NULL')
+    if not conditions:
+        raise InvalidBulkRequest('filter must contain created_before, updated_before, inactive_since or company')
+    return ' AND '.join(conditions), params
+
+
+def read_changes(body: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    changes = body.get('set')
+    if not isinstance(changes, dict) or not changes:
+        raise InvalidBulkRequest(f"set must be an object with any of: {', '.join(BULK_UPDATE_FIELDS)}")
+    unknown = sorted(set(changes) - set(BULK_UPDATE_FIELDS))
+    if unknown:
+        raise InvalidBulkRequest(f"Fields cannot be bulk-updated: {', '.join(unknown)}")
+    cleaned: Dict[str, Optional[str]] = {}
+    for field, value in changes.items():
+        value = str(value).strip() if value is not None else None
+        limit = CLIENT_LIMITS[field]
+        if limit and value and len(value) > limit:
+            raise InvalidBulkRequest(f'{field} is longer than {limit} characters')
+        cleaned[field] = value or None
+    return cleaned
+
+
+def delete_clients(conn: Any, where: str, params: List[Any], schema: str = '') -> Dict[str, Any]:
+    prefix = f'{schema}.' if schema else ''
+    with transaction(conn), conn.cursor() as cursor:
+        cursor.execute(f"""
+            WITH target AS (
+                SELECT c.id FROM {prefix}clients c WHERE {where} FOR UPDATE
+            ), removed_interactions AS (
+                DELETE FROM {prefix}interactions WHERE client_id IN (SELECT id FROM target) RETURNING 1
+            ), removed_contacts AS (
+                DELETE FROM {prefix}contacts WHERE client_id IN (SELECT id FROM target) RETURNING 1
+            ), removed_clients AS (
+                DELETE FROM {prefix}clients WHERE id IN (SELECT id FROM target) RETURNING id
+            )
+            SELECT
+                (SELECT COUNT(*) FROM removed_clients),
+                (SELECT COUNT(*) FROM removed_contacts),
+                (SELECT COUNT(*) FROM removed_interactions),
+                ARRAY(SELECT id FROM removed_clients ORDER BY id)
+        """, params)
+        clients, contacts, interactions, ids = cursor.fetchone()
+    return {'deleted': {'clients': clients, 'contacts': contacts, 'interactions': interactions}, 'ids': ids}
+
+
+def update_clients(
+    conn: Any, where: str, params: List[Any], changes: Dict[str, Optional[str]], schema: str = ''
+) -> Dict[str, Any]:
+    prefix = f'{schema}.' if schema else ''
+    assignments = ', '.join(f'{field} = %s' for field in changes)
+    with transaction(conn), conn.cursor() as cursor:
+        cursor.execute(f"""
+            WITH updated AS (
+                UPDATE {prefix}clients c SET {assignments}
+                WHERE {where}
+                RETURNING c.id
+            )
+            SELECT COUNT(*), ARRAY(SELECT id FROM updated ORDER BY id) FROM updated
+        """, [*changes.values(), *params])
+        updated, ids = cursor.fetchone()
+    return {'updated': updated, 'ids': ids}
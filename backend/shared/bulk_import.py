@@ -0,0 +1,247 @@
+'''
+Business: Массовый импорт клиентов и контактов из CSV или NDJSON одним запросом
+Args: event - тело запроса с CSV (с заголовком) или NDJSON, conn - соединение из пула
+Returns: dict с числом вставленных строк, ошибками валидации и дубликатами email
+'''
+import base64
+import csv
+import io
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from shared.db import transaction
+
+MAX_IMPORT_ROWS = 100000
+MAX_REPORTED_ISSUES = 1000
+
+CLIENT_LIMITS = {'name': 255, 'company': 255, 'email': 255, 'phone': 50, 'address': None}
+CONTACT_LIMITS = {'contact_person': 255, 'position': 100, 'email': 255, 'phone': 50}
+
+# Контакты в crm-api приходят в camelCase, в contacts - в snake_case
+CONTACT_ALIASES = {'clientId': 'client_id', 'contactPerson': 'contact_person', 'isPrimary': 'is_primary'}
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'да'}
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+def read_records(event: Dict[str, Any], params: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8-sig')
+    elif body.startswith('\ufeff'):
+        body = body[1:]
+
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    data_format = params.get('format') or ''
+    if not data_format:
+        content_type = headers.get('content-type', '')
+        if 'csv' in content_type:
+            data_format = 'csv'
+        elif 'ndjson' in content_type or 'jsonl' in content_type or body.lstrip().startswith('{'):
+            data_format = 'ndjson'
+        else:
+            data_format = 'csv'
+
+    if data_format == 'csv':
+        reader = csv.DictReader(io.StringIO(body))
+        for record in reader:
+            yield reader.line_num, record
+    elif data_format == 'ndjson':
+        for line_no, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, record if isinstance(record, dict) else None
+    else:
+        raise InvalidImport(f'Unsupported import format: {data_format}')
+
+
+def _clean(record: Dict[str, Any], field: str) -> Optional[str]:
+    value = record.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _check_lengths(row: Dict[str, Optional[str]], limits: Dict[str, Optional[int]]) -> Optional[str]:
+    for field, limit in limits.items():
+        if limit and row[field] is not None and len(row[field]) > limit:
+            return f'{field} is longer than {limit} characters'
+    return None
+
+
+def _copy_rows(cursor: Any, table: str, columns: List[str], rows: List[Tuple[Any, ...]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['t' if v is True else 'f' if v is False else v for v in row])
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+class _Report:
+    def __init__(self):
+        self.received = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.duplicates: List[Dict[str, Any]] = []
+        self.error_count = 0
+        self.duplicate_count = 0
+
+    def error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ISSUES:
+            self.errors.append({'line': line, 'error': message})
+
+    def duplicate(self, line: int, email: str) -> None:
+        self.duplicate_count += 1
+        if len(self.duplicates) < MAX_REPORTED_ISSUES:
+            self.duplicates.append({'line': line, 'email': email})
+
+    def as_dict(self, inserted: int) -> Dict[str, Any]:
+        return {
+            'received': self.received,
+            'inserted': inserted,
+            'errorCount': self.error_count,
+            'duplicateCount': self.duplicate_count,
+            'errors': self.errors,
+            'duplicates': self.duplicates
+        }
+
+
+def import_clients(conn: Any, records: Iterator[Tuple[int, Dict[str, Any]]], schema: str = '') -> Dict[str, Any]:
+    prefix = f'{schema}.' if schema else ''
+    report = _Report()
+    rows: List[Tuple[Any, ...]] = []
+    lines_by_email: Dict[str, int] = {}
+
+    for line, record in records:
+        report.received += 1
+        if report.received > MAX_IMPORT_ROWS:
+            raise InvalidImport(f'Import is limited to {MAX_IMPORT_ROWS} rows per request')
+        if record is None:
+            report.error(line, 'Malformed record')
+            continue
+        row = {field: _clean(record, field) for field in CLIENT_LIMITS}
+        if not row['name']:
+            report.error(line, 'Name is required')
+            continue
+        problem = _check_lengths(row, CLIENT_LIMITS)
+        if problem:
+            report.error(line, problem)
+            continue
+        # Как триггер V0008: иначе email из RETURNING не найдётся среди строк файла
+        email = row['email'].lower() if row['email'] is not None else None
+        if email is not None:
+            if email in lines_by_email:
+                report.duplicate(line, email)
+                continue
+            lines_by_email[email] = line
+        rows.append((line, row['name'], row['company'], email, row['phone'], row['address']))
+
+    def work(cursor: Any) -> int:
+        cursor.execute("""
+            CREATE TEMP TABLE import_clients_staging (
+                line_no INTEGER, name VARCHAR(255), company VARCHAR(255), email VARCHAR(255),
+                phone VARCHAR(50), address TEXT
+            ) ON COMMIT DROP
+        """)
+        _copy_rows(cursor, 'import_clients_staging', ['line_no', 'name', 'company', 'email', 'phone', 'address'], rows)
+        # ON CONFLICT отсекает и уже существующие email, и вставленные параллельно
+        cursor.execute(f"""
+            INSERT INTO {prefix}clients (name, company, email, phone, address)
+            SELECT name, company, email, phone, address FROM import_clients_staging
+            ORDER BY line_no
+            ON CONFLICT (email) DO NOTHING
+            RETURNING email
+        """)
+        inserted = cursor.fetchall()
+        inserted_emails = {r[0] for r in inserted if r[0] is not None}
+        for email, line in lines_by_email.items():
+            if email not in inserted_emails:
+                report.duplicate(line, email)
+        return len(inserted)
+
+    inserted = 0
+    if rows:
+        with transaction(conn), conn.cursor() as cursor:
+            inserted = work(cursor)
+    return report.as_dict(inserted)
+
+
+def import_contacts(conn: Any, records: Iterator[Tuple[int, Dict[str, Any]]], schema: str = '') -> Dict[str, Any]:
+    prefix = f'{schema}.' if schema else ''
+    report = _Report()
+    rows: List[Tuple[Any, ...]] = []
+
+    for line, record in records:
+        report.received += 1
+        if report.received > MAX_IMPORT_ROWS:
+            raise InvalidImport(f'Import is limited to {MAX_IMPORT_ROWS} rows per request')
+        if record is None:
+            report.error(line, 'Malformed record')
+            continue
+        record = {CONTACT_ALIASES.get(k, k): v for k, v in record.items()}
+        row = {field: _clean(record, field) for field in CONTACT_LIMITS}
+        try:
+            client_id = int(_clean(record, 'client_id') or '')
+        except ValueError:
+            report.error(line, 'client_id and contact_person are required')
+            continue
+        if not row['contact_person']:
+            report.error(line, 'client_id and contact_person are required')
+            continue
+        problem = _check_lengths(row, CONTACT_LIMITS)
+        if problem:
+            report.error(line, problem)
+            continue
+        is_primary = record.get('is_primary')
+        if not isinstance(is_primary, bool):
+            is_primary = str(is_primary or '').strip().lower() in TRUE_VALUES
+        rows.append((line, client_id, row['contact_person'], row['position'], row['email'], row['phone'], is_primary))
+
+    def work(cursor: Any) -> int:
+        cursor.execute("""
+            CREATE TEMP TABLE import_contacts_staging (
+                line_no INTEGER, client_id INTEGER, contact_person VARCHAR(255), position VARCHAR(100),
+                email VARCHAR(255), phone VARCHAR(50), is_primary BOOLEAN
+            ) ON COMMIT DROP
+        """)
+        _copy_rows(
+            cursor, 'import_contacts_staging',
+            ['line_no', 'client_id', 'contact_person', 'position', 'email', 'phone', 'is_primary'], rows
+        )
+        cursor.execute(f"""
+            SELECT s.line_no, s.client_id FROM import_contacts_staging s
+            LEFT JOIN {prefix}clients c ON c.id = s.client_id
+            WHERE c.id IS NULL
+            ORDER BY s.line_no
+        """)
+        for line, client_id in cursor.fetchall():
+            report.error(line, f'Client {client_id} not found')
+        # FOR KEY SHARE не даёт удалить клиента между проверкой и вставкой
+        cursor.execute(f"""
+            INSERT INTO {prefix}contacts (client_id, contact_person, position, email, phone, is_primary)
+            SELECT s.client_id, s.contact_person, s.position, s.email, s.phone, s.is_primary
+            FROM import_contacts_staging s
+            JOIN (
+                SELECT id FROM {prefix}clients
+                WHERE id IN (SELECT client_id FROM import_contacts_staging)
+                FOR KEY SHARE
+            ) c ON c.id = s.client_id
+            ORDER BY s.line_no
+        """)
+        return cursor.rowcount
+
+    inserted = 0
+    if rows:
+        with transaction(conn), conn.cursor() as cursor:
+            inserted = work(cursor)
+    return report.as_dict(inserted)
@@ -0,0 +1,393 @@
+'''
+Business: Кэш ответов GET с точечной инвалидацией по тегам при POST/PUT/DELETE
+Args: CACHE_BACKEND (off/redis/lru, по умолчанию off), CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_TIMEOUT, REDIS_URL - переменные окружения
+Returns: декоратор cached_handler для handler в index.py
+
+Ключ ответа - функция + сущность + отсортированные параметры запроса. Теги описывают,
+какие строки попали в ответ (client:5, contact:7, contacts:client:5, clients:list, stats ...),
+запись по сущности сбрасывает только ответы с затронутыми тегами. По умолчанию кэш выключен:
+сбрасывать его между тёплыми контейнерами и функциями может только общий Redis-совместимый
+бэкенд (Redis, Valkey, KeyDB, Dragonfly). In-process LRU живёт в одном контейнере, запись
+через clients его кэш crm-api не видит - он для замеров и одиночного процесса.
+Кэш не ломает ответы: ошибка бэкенда (Redis недоступен, таймаут) считается в errors,
+а ответ отдаёт сам handler. Запись к этому моменту уже зафиксирована, поэтому несостоявшийся
+сброс тегов не превращает её в 500 - устаревший ответ доживает до CACHE_TTL.
+Запрос с X-Db-Lsn идёт мимо кэша: вызывающий только что писал, и ответ должен прийти
+с узла, который эту запись уже видит, а не из кэша, заполненного до неё.
+'''
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from shared.etag import ETAG_HEADER, etag_matches, not_modified, request_header
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Ошибки бэкенда, при которых кэш пропускается: сеть и протокол Redis, повреждённое значение
+CACHE_ERRORS = (OSError, ValueError) + ((redis.RedisError,) if redis is not None else ())
+
+DEFAULT_TTL = 30.0
+# Недоступный Redis не должен держать вызов: ответ из базы дешевле ожидания
+DEFAULT_TIMEOUT = 0.5
+DEFAULT_MAX_ENTRIES = 1000
+
+CACHE_HEADER = 'X-Cache'
+CACHE_STATS_HEADER = 'X-Cache-Stats'
+
+# Выгрузки слишком велики для кэша, импорт - это запись, дельта ленты растёт без смены тегов,
+# дубли зависят от полного прохода maintenance/dedup.py, который тегов не сбрасывает
+UNCACHED_ACTIONS = {'export', 'import', 'changes', 'duplicates'}
+
+# Позиция последней записи вызывающего (shared/replicas.py)
+LSN_HEADER = 'X-Db-Lsn'
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, str, Set[str]]]' = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        evicted = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._drop(key)
+                        evicted += 1
+        return evicted
+
+    def _drop(self, key: str) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache:
+    '''
+    Значения живут с TTL, теги - множества ключей. TTL у всех ответов одинаковый,
+    поэтому продление множества тега при каждой записи не даёт ему пережить свои ключи.
+    '''
+
+    def __init__(self, url: str, prefix: str = 'crm:', timeout: float = DEFAULT_TIMEOUT):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package')
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float, tags: Iterable[str]) -> None:
+        seconds = max(1, int(ttl))
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=seconds)
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, seconds)
+        pipe.execute()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        tag_keys = [f'{self.prefix}tag:{tag}' for tag in tags]
+        if not tag_keys:
+            return 0
+        pipe = self.client.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = {self.prefix + member.decode('utf-8') for members in pipe.execute() for member in members}
+        if keys:
+            self.client.delete(*keys)
+        self.client.delete(*tag_keys)
+        return len(keys)
+
+
+class ResponseCache:
+    def __init__(self, backend: Any, ttl: float = DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.evicted = 0
+        self.errors = 0
+
+    def _failed(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        '''
+        Ошибка бэкенда - промах: ответ соберёт handler.
+        '''
+        try:
+            value = self.backend.get(key)
+            cached = json.loads(value) if value is not None else None
+        except CACHE_ERRORS:
+            self._failed()
+            return None
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return cached
+
+    def store(self, key: str, response: Dict[str, Any], tags: Set[str]) -> None:
+        try:
+            self.backend.set(key, json.dumps(response), self.ttl, tags)
+        except CACHE_ERRORS:
+            self._failed()
+            return
+        with self._lock:
+            self.stores += 1
+
+    def invalidate(self, tags: Set[str]) -> None:
+        try:
+            evicted = self.backend.invalidate(tags)
+        except CACHE_ERRORS:
+            self._failed()
+            return
+        with self._lock:
+            self.invalidations += 1
+            self.evicted += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'invalidations': self.invalidations,
+                'evicted': self.evicted,
+                'errors': self.errors
+            }
+
+    def stats_header(self) -> str:
+        stats = self.stats()
+        return ';'.join(f'{key}={stats[key]}' for key in ('hits', 'misses', 'hitRatio', 'evicted', 'errors'))
+
+
+def _parse(text: Optional[str]) -> Any:
+    try:
+        return json.loads(text) if text else None
+    except ValueError:
+        return None
+
+
+def _as_list(data: Any) -> List[Dict[str, Any]]:
+    if isinstance(data, list):
+        return [item for item in data if isinstance(item, dict)]
+    return [data] if isinstance(data, dict) else []
+
+
+def _client_id(*sources: Any) -> Optional[Any]:
+    for source in sources:
+        if isinstance(source, dict):
+            value = source.get('clientId') or source.get('client_id')
+            if value:
+                return value
+    return None
+
+
+def read_tags(entity: str, params: Dict[str, Any], body: str) -> Set[str]:
+    tags = {f'entity:{entity}'}
+    rows = _as_list(_parse(body))
+    client_id = _client_id(params)
+
+    if entity == 'clients':
+        if params.get('action') == 'stats':
+            tags.add('stats')
+        elif params.get('id') or params.get('ids'):
+            # Теги по запрошенным id, а не по найденным: создание клиента из ?ids= тоже сбросит ответ
+            for requested in str(params.get('ids') or params.get('id')).split(','):
+                requested = requested.strip()
+                tags.update({
+                    f'client:{requested}', f'contacts:client:{requested}', f'interactions:client:{requested}'
+                })
+            for row in rows:
+                tags.update(f"contact:{c.get('id')}" for c in _as_list(row.get('contacts')))
+        else:
+            tags.add('clients:search' if params.get('search') else 'clients:list')
+            tags.update(f"client:{row.get('id')}" for row in rows)
+    elif entity == 'contacts':
+        if not params.get('id'):
+            tags.add(f'contacts:client:{client_id}' if client_id else 'contacts:list')
+        tags.update(f"contact:{row.get('id')}" for row in rows)
+    elif entity == 'interactions':
+        tags.add(f'interactions:client:{client_id}' if client_id else 'interactions:list')
+        if params.get('action') == 'timeline':
+            # В таймлайне счётчики, а не строки: его сбрасывает любая запись взаимодействий (клиента)
+            return tags
+        # В списке есть имя клиента из JOIN, поэтому правка клиента тоже его сбрасывает
+        tags.update(f'client:{_client_id(row)}' for row in rows)
+        tags.update(f"interaction:{row.get('id')}" for row in rows)
+    return tags
+
+
+def write_tags(entity: str, method: str, params: Dict[str, Any], request_body: str, response_body: str) -> Set[str]:
+    if params.get('action') == 'import':
+        # Импорт контактов меняет и карточки клиентов, в которые контакты встроены
+        return {f'entity:{entity}', 'entity:clients', 'stats'}
+
+    if params.get('action') == 'bulk-delete':
+        # Тысячи id не превращаются в тысячи тегов: массовое удаление сбрасывает все три сущности
+        return {'entity:clients', 'entity:contacts', 'entity:interactions', 'stats'}
+    if params.get('action') == 'merge':
+        # Контакты и взаимодействия дублей переезжают к оставшемуся клиенту, дубли удаляются
+        return {'entity:clients', 'entity:contacts', 'entity:interactions', 'stats'}
+    if params.get('action') == 'bulk-update':
+        # Массово меняются только company, phone и address - их нет ни в контактах, ни в списке взаимодействий
+        return {'entity:clients'}
+    if params.get('action') == 'batch':
+        # Пакет взаимодействий: ответ - массив созданных строк с clientId
+        rows = _as_list(_parse(response_body))
+        return {'interactions:list', 'stats', *(f'interactions:client:{_client_id(row)}' for row in rows)}
+
+    request = _parse(request_body) if method != 'DELETE' else None
+    response = _parse(response_body)
+    record_id = params.get('id') if method == 'DELETE' else (request or {}).get('id') or (response or {}).get('id')
+    client_id = _client_id(request, response)
+    tags: Set[str] = set()
+
+    if entity == 'clients':
+        tags.update({'clients:search', 'stats'})
+        if method == 'POST':
+            tags.add('clients:list')
+        else:
+            tags.add(f'client:{record_id}')
+        if method == 'DELETE':
+            tags.update({
+                f'contacts:client:{record_id}', f'interactions:client:{record_id}',
+                'contacts:list', 'interactions:list'
+            })
+    elif entity == 'contacts':
+        if method == 'POST':
+            tags.add('contacts:list')
+        else:
+            tags.add(f'contact:{record_id}')
+        if client_id:
+            tags.add(f'contacts:client:{client_id}')
+    elif entity == 'interactions':
+        tags.update({'interactions:list', 'stats'})
+        if method != 'POST':
+            tags.add(f'interaction:{record_id}')
+        if client_id:
+            tags.add(f'interactions:client:{client_id}')
+    return tags
+
+
+def cache_key(namespace: str, entity: str, params: Dict[str, Any]) -> str:
+    return f"resp:{namespace}:{entity}:{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    global _cache
+    backend_name = os.environ.get('CACHE_BACKEND', 'off')
+    if backend_name not in ('redis', 'lru'):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if backend_name == 'redis':
+                    if redis is None:
+                        # Без пакета redis кэш выключен, а не ломает каждый вызов
+                        return None
+                    backend = RedisCache(
+                        os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+                        timeout=float(os.environ.get('CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+                    )
+                else:
+                    backend = LRUCache(int(os.environ.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)))
+                _cache = ResponseCache(backend, float(os.environ.get('CACHE_TTL', DEFAULT_TTL)))
+    return _cache
+
+
+def cached_handler(namespace: str, entity: Optional[str] = None) -> Callable:
+    '''
+    entity=None - сущность берётся из параметра entity, как в crm-api.
+    '''
+    def decorate(handler: Callable) -> Callable:
+        @wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            cache = get_response_cache()
+            method = event.get('httpMethod', 'GET')
+            if cache is None or method == 'OPTIONS':
+                return handler(event, context)
+
+            params = event.get('queryStringParameters') or {}
+            target = entity or params.get('entity', 'clients')
+
+            if method == 'GET' and request_header(event, LSN_HEADER):
+                return handler(event, context)
+            if method == 'GET' and params.get('action') not in UNCACHED_ACTIONS:
+                key = cache_key(namespace, target, params)
+                cached = cache.lookup(key)
+                if cached is not None:
+                    etag = cached.get('headers', {}).get(ETAG_HEADER)
+                    if etag_matches(event, etag):
+                        return not_modified(etag, {**cached['headers'], CACHE_HEADER: 'HIT'})
+                    cached['headers'] = {
+                        **cached.get('headers', {}), CACHE_HEADER: 'HIT', CACHE_STATS_HEADER: cache.stats_header()
+                    }
+                    return cached
+                response = handler(event, context)
+                if response.get('statusCode') == 200:
+                    cache.store(key, response, read_tags(target, params, response.get('body', '')))
+                response['headers'] = {
+                    **response.get('headers', {}), CACHE_HEADER: 'MISS', CACHE_STATS_HEADER: cache.stats_header()
+                }
+                return response
+
+            response = handler(event, context)
+            if method in ('POST', 'PUT', 'DELETE') and 200 <= response.get('statusCode', 500) < 300:
+                cache.invalidate(write_tags(target, method, params, event.get('body') or '', response.get('body', '')))
+            return response
+        return wrapper
+    return decorate
@@ -0,0 +1,77 @@
+'''
+Business: Дельта по ленте изменений crm_changes (миграция V0007) - изменённые и удалённые строки с прошлой отметки
+Args: since - значение next из прошлого ответа (0 - получить начальную отметку), fields - как у списков
+Returns: {"changed": [...], "deleted": [id, ...], "next": N} или {"reset": true, "next": N}
+
+Клиент берёт отметку (since=0 отвечает reset с next), загружает полный список и дальше
+опрашивает since=next: changed заменяют строки по id, deleted удаляются. reset означает
+"перезагрузите список и продолжайте с next" - так бывает, если отметка старше очищенной
+части ленты, изменений больше MAX_DELTA_ROWS или таблицу очистили TRUNCATE.
+Отметка - xmin снимка: транзакции ниже него завершены, поэтому строка ленты не может
+появиться позади уже выданной отметки. Строка может прийти дважды - это безопасно.
+'''
+import json
+from typing import Any, Dict, List
+
+from shared.serializers import Serializer
+
+MAX_DELTA_ROWS = 1000
+
+
+class InvalidChangesRequest(ValueError):
+    pass
+
+
+def parse_since(params: Dict[str, Any]) -> int:
+    try:
+        since = int(params.get('since') or 0)
+    except (TypeError, ValueError):
+        raise InvalidChangesRequest('since must be a non-negative integer')
+    if since < 0:
+        raise InvalidChangesRequest('since must be a non-negative integer')
+    return since
+
+
+def _reset(upto: int) -> str:
+    return json.dumps({'reset': True, 'next': upto})
+
+
+def fetch_changes(cursor: Any, entity: str, since: int, rows_sql: str, serializer: Serializer, schema: str = '') -> str:
+    '''
+    rows_sql выбирает текущие строки сущности по массиву id в единственном %s.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    cursor.execute(f"""
+        SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, pruned_before::text::bigint
+        FROM {prefix}crm_changes_horizon
+        WHERE id = 1
+    """)
+    upto, horizon = cursor.fetchone()
+    if since < horizon:
+        return _reset(upto)
+    if since >= upto:
+        return json.dumps({'changed': [], 'deleted': [], 'next': since})
+
+    # id не переиспользуются, поэтому строка с D в окне удалена, а без D - жива.
+    # row_id NULL - запись TRUNCATE
+    cursor.execute(f"""
+        SELECT row_id, bool_or(op = 'D')
+        FROM {prefix}crm_changes
+        WHERE entity = %s AND txid >= %s::text::xid8 AND txid < %s::text::xid8
+        GROUP BY row_id
+        LIMIT %s
+    """, (entity, str(since), str(upto), MAX_DELTA_ROWS + 1))
+    touched = cursor.fetchall()
+    if len(touched) > MAX_DELTA_ROWS or any(row_id is None for row_id, _ in touched):
+        return _reset(upto)
+
+    live = [row_id for row_id, is_deleted in touched if not is_deleted]
+    rows: List[Any] = []
+    if live:
+        cursor.execute(rows_sql, (live,))
+        rows = cursor.fetchall()
+    # Строка, удалённая транзакцией после upto, уже не найдётся - для клиента она тоже удалена
+    row_key = serializer.key('id')
+    found = {row_key(row)[0] for row in rows}
+    deleted = sorted(row_id for row_id, _ in touched if row_id not in found)
+    return f'{{"changed": {serializer.dumps(rows)}, "deleted": {json.dumps(deleted)}, "next": {upto}}}'
@@ -0,0 +1,109 @@
+'''
+Business: Сжатие JSON-ответов gzip или brotli по заголовку Accept-Encoding
+Args: RESPONSE_COMPRESSION (on/off), COMPRESSION_MIN_BYTES - переменные окружения
+Returns: декоратор compressed для handler; сжатое тело - base64 с isBase64Encoded=True
+
+Декоратор стоит снаружи кэша ответов: в кэше лежит несжатый JSON, по которому
+считаются теги, а кодировка выбирается под каждого клиента. Поэтому ключ кэша от
+Accept-Encoding не зависит, а ответ из кэша сжимается заново - это доли миллисекунды
+против десятков килобайт по сети. Короткие ответы не сжимаются: выигрыш съедают
+заголовки gzip и рост base64 на треть.
+'''
+import base64
+import gzip
+import os
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from shared.etag import request_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_BYTES = 1024
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def enabled() -> bool:
+    return os.environ.get('RESPONSE_COMPRESSION', 'on') != 'off'
+
+
+def min_bytes() -> int:
+    return int(os.environ.get('COMPRESSION_MIN_BYTES', DEFAULT_MIN_BYTES))
+
+
+def supported_encodings() -> List[str]:
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    '''
+    Кодировка с наибольшим q из поддерживаемых; при равных q brotli предпочтительнее.
+    "gzip;q=0" запрещает gzip, "*" разрешает всё, что не названо явно.
+    '''
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best = None
+    best_weight = 0.0
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 - одинаковый JSON даёт одинаковые байты
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response: Dict[str, Any], encoding: Optional[str]) -> Dict[str, Any]:
+    headers = response.get('headers') or {}
+    if response.get('isBase64Encoded') or 'Content-Encoding' in headers:
+        return response
+    if not headers.get('Content-Type', '').startswith('application/json'):
+        return response
+
+    vary = headers.get('Vary')
+    headers = {**headers, 'Vary': f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'}
+    body = (response.get('body') or '').encode('utf-8')
+    if encoding is None or len(body) < min_bytes():
+        return {**response, 'headers': headers}
+
+    return {
+        **response,
+        'headers': {**headers, 'Content-Encoding': encoding},
+        'body': base64.b64encode(compress(body, encoding)).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+
+def compressed(handler: Callable) -> Callable:
+    @wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        response = handler(event, context)
+        if not enabled() or event.get('httpMethod', 'GET') == 'OPTIONS':
+            return response
+        return compress_response(response, negotiate(request_header(event, 'Accept-Encoding')))
+    return wrapper
@@ -0,0 +1,240 @@
+'''
+Business: Пул соединений с PostgreSQL, живущий между тёплыми вызовами функции
+Args: DATABASE_URL, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_AFTER,
+      DB_POOL_MAX_LIFETIME - переменные окружения
+Returns: get_pool() - общий ConnectionPool на процесс
+'''
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from shared.instrumentation import InstrumentedConnection
+
+DEFAULT_MAX_SIZE = 4
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_HEALTHCHECK_AFTER = 5.0
+DEFAULT_MAX_LIFETIME = 1800.0
+
+_BROKEN_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    '''
+    Потокобезопасный пул: держит не более max_size открытых соединений,
+    перед выдачей проверяет простаивавшие соединения и выбрасывает мёртвые.
+    '''
+
+    def __init__(
+        self,
+        dsn: str,
+        max_size: int = DEFAULT_MAX_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        healthcheck_after: float = DEFAULT_HEALTHCHECK_AFTER,
+        max_lifetime: float = DEFAULT_MAX_LIFETIME,
+        connection_factory: Optional[Any] = None
+    ):
+        self.dsn = dsn
+        self.connection_factory = connection_factory
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.max_lifetime = max_lifetime
+
+        self._lock = threading.Condition()
+        self._idle: List[Tuple[Any, float, float]] = []
+        self._born: Dict[int, float] = {}
+        self._in_use = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+        self.discarded = 0
+        self.healthcheck_failures = 0
+
+    def _connect(self) -> Any:
+        started = time.perf_counter()
+        if self.connection_factory is not None:
+            conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        else:
+            conn = psycopg2.connect(self.dsn)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_seconds += elapsed
+            self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _close(self, conn: Any) -> None:
+        self._born.pop(id(conn), None)
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn: Any, idle_since: float, born: float) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - born > self.max_lifetime:
+            return False
+        status = conn.info.transaction_status
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - idle_since < self.healthcheck_after:
+            return True
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except _BROKEN_ERRORS:
+            return False
+
+    def _drain_idle(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+            for conn, _, _ in idle:
+                self._close(conn)
+
+    def acquire(self, autocommit: bool = False) -> Any:
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f'No free database connections (max_size={self.max_size})')
+                self._lock.wait(remaining)
+            self._in_use += 1
+            candidate = self._idle.pop() if self._idle else None
+
+        try:
+            if candidate is not None:
+                conn, idle_since, born = candidate
+                if self._is_healthy(conn, idle_since, born):
+                    with self._lock:
+                        self.hits += 1
+                    conn.autocommit = autocommit
+                    return conn
+                with self._lock:
+                    self.healthcheck_failures += 1
+                    self._close(conn)
+                # Упавший бэкенд обычно уносит с собой все соединения пула
+                self._drain_idle()
+
+            with self._lock:
+                self.misses += 1
+            try:
+                conn = self._connect()
+            except _BROKEN_ERRORS:
+                time.sleep(0.05)
+                conn = self._connect()
+            conn.autocommit = autocommit
+            return conn
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except _BROKEN_ERRORS:
+                    discard = True
+
+        with self._lock:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic(), self._born.get(id(conn), time.monotonic())))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, autocommit: bool = False) -> Iterator[Any]:
+        conn = self.acquire(autocommit=autocommit)
+        discard = False
+        try:
+            yield conn
+        except _BROKEN_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self) -> None:
+        self._drain_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / requests, 4) if requests else 0.0,
+                'handshakes': self.handshakes,
+                'handshakeMs': round(self.handshake_seconds * 1000, 2),
+                'avgHandshakeMs': round(self.handshake_seconds * 1000 / self.handshakes, 2) if self.handshakes else 0.0,
+                'discarded': self.discarded,
+                'healthcheckFailures': self.healthcheck_failures,
+                'idle': len(self._idle),
+                'inUse': self._in_use,
+                'maxSize': self.max_size
+            }
+
+    def stats_header(self) -> str:
+        stats = self.stats()
+        return ';'.join(f'{key}={stats[key]}' for key in ('hits', 'misses', 'handshakes', 'handshakeMs', 'discarded'))
+
+
+@contextmanager
+def transaction(conn: Any) -> Iterator[Any]:
+    '''
+    Явная транзакция на соединении из пула, даже если оно выдано в режиме autocommit.
+    '''
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = autocommit
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    max_size=int(os.environ.get('DB_POOL_MAX_SIZE', DEFAULT_MAX_SIZE)),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_TIMEOUT)),
+                    healthcheck_after=float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', DEFAULT_HEALTHCHECK_AFTER)),
+                    max_lifetime=float(os.environ.get('DB_POOL_MAX_LIFETIME', DEFAULT_MAX_LIFETIME)),
+                    connection_factory=InstrumentedConnection
+                )
+    return _pool
@@ -0,0 +1,161 @@
+'''
+Business: Дубли клиентов - кандидаты по блокам (миграция V0008) и слияние дублей в одного клиента
+Args: cursor/conn - соединение из пула; слияние - {"survivorId": N, "duplicateIds": [...]} (в clients - snake_case)
+Returns: кандидаты с причинами (phone, email, name) и score; итог слияния - оставшийся клиент и число перенесённых строк
+
+Кандидаты для одного клиента ищутся на лету функцией crm_client_duplicates, очередь по всей
+базе - результат полного прохода maintenance/dedup.py в crm_duplicate_candidates. Слияние -
+одна транзакция: клиенты блокируются FOR UPDATE по возрастанию id, контакты и взаимодействия
+переезжают к оставшемуся клиенту, дубли удаляются, а пустые поля оставшегося клиента
+заполняются из дублей. Параллельная запись контакта для дубля дождётся конца слияния
+и получит ошибку внешнего ключа, как и при массовом удалении.
+'''
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.db import transaction
+from shared.pagination import parse_page, keyset_condition, split_page
+from shared.serializers import Serializer, dumps
+
+MAX_MERGE_IDS = 50
+DUPLICATES_PER_CLIENT = 20
+
+# Поля, которые оставшийся клиент получает из дублей, если у него они пустые
+MERGE_FILL_FIELDS = ('company', 'email', 'phone', 'address')
+
+MERGE_ALIASES = {'survivorId': 'survivor_id', 'duplicateIds': 'duplicate_ids'}
+
+
+class InvalidMergeRequest(ValueError):
+    pass
+
+
+def read_merge(body: Dict[str, Any]) -> Tuple[int, List[int]]:
+    body = {MERGE_ALIASES.get(key, key): value for key, value in body.items()}
+    survivor_id = body.get('survivor_id')
+    duplicate_ids = body.get('duplicate_ids')
+    if not isinstance(duplicate_ids, list) or not duplicate_ids:
+        raise InvalidMergeRequest('duplicate_ids must be a non-empty list of client ids')
+    if len(duplicate_ids) > MAX_MERGE_IDS:
+        raise InvalidMergeRequest(f'Merge is limited to {MAX_MERGE_IDS} duplicates per request')
+    try:
+        survivor_id = int(survivor_id)
+        duplicate_ids = sorted({int(value) for value in duplicate_ids})
+    except (TypeError, ValueError):
+        raise InvalidMergeRequest('survivor_id and duplicate_ids must be integers')
+    if survivor_id in duplicate_ids:
+        raise InvalidMergeRequest('survivor_id cannot be among duplicate_ids')
+    return survivor_id, duplicate_ids
+
+
+def find_duplicates(cursor: Any, client_id: int, serializer: Serializer, schema: str = '') -> str:
+    '''
+    Кандидаты для одного клиента: строки клиентов с причинами и score, лучшие первыми.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    cursor.execute(f"""
+        SELECT {serializer.select_list('c')}, d.reasons, d.score
+        FROM {prefix}crm_client_duplicates(ARRAY[%s], %s) d
+        JOIN {prefix}clients c ON c.id = d.duplicate_id
+        ORDER BY d.score DESC, c.id
+    """, (client_id, DUPLICATES_PER_CLIENT))
+    width = len(serializer.columns)
+    return dumps([
+        {**serializer.to_dict(row[:width]), 'reasons': row[width], 'score': row[width + 1]}
+        for row in cursor.fetchall()
+    ])
+
+
+def fetch_candidates(
+    cursor: Any, params: Dict[str, Any], serializer: Serializer, schema: str = ''
+) -> Tuple[str, Optional[str]]:
+    '''
+    Очередь пар из последнего полного прохода, самые вероятные первыми, с keyset-курсором.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    limit, after = parse_page(params, 3)
+    page_where, page_params = keyset_condition(('q.score', 'q.client_id', 'q.duplicate_id'), after)
+    cursor.execute(f"""
+        SELECT {serializer.select_list('a')}, {serializer.select_list('b')},
+               q.reasons, q.score, q.client_id, q.duplicate_id
+        FROM {prefix}crm_duplicate_candidates q
+        JOIN {prefix}clients a ON a.id = q.client_id
+        JOIN {prefix}clients b ON b.id = q.duplicate_id
+        WHERE {page_where}
+        ORDER BY q.score DESC, q.client_id DESC, q.duplicate_id DESC
+        LIMIT %s
+    """, (*page_params, limit + 1))
+    width = len(serializer.columns)
+    rows, next_cursor = split_page(cursor.fetchall(), limit, lambda row: row[-3:])
+    return dumps([
+        {
+            'client': serializer.to_dict(row[:width]),
+            'duplicate': serializer.to_dict(row[width:2 * width]),
+            'reasons': row[2 * width],
+            'score': row[2 * width + 1]
+        }
+        for row in rows
+    ]), next_cursor
+
+
+def merge_clients(
+    conn: Any, survivor_id: int, duplicate_ids: List[int], serializer: Serializer, schema: str = ''
+) -> Optional[Dict[str, Any]]:
+    '''
+    None - оставшегося клиента нет. Неизвестный id дубля - ошибка запроса, ничего не меняется.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    with transaction(conn), conn.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM {prefix}clients WHERE id = ANY(%s) ORDER BY id FOR UPDATE',
+            ([survivor_id, *duplicate_ids],)
+        )
+        found = {row[0] for row in cursor.fetchall()}
+        if survivor_id not in found:
+            return None
+        missing = [client_id for client_id in duplicate_ids if client_id not in found]
+        if missing:
+            raise InvalidMergeRequest(f"Unknown duplicate ids: {', '.join(map(str, missing))}")
+
+        ids = {'survivor': survivor_id, 'duplicates': duplicate_ids}
+        # Основной контакт остаётся один: свой у оставшегося клиента, иначе самый новый из основных у дублей
+        cursor.execute(f"""
+            UPDATE {prefix}contacts ct
+            SET client_id = %(survivor)s,
+                is_primary = ct.is_primary AND ct.id = (
+                    SELECT p.id FROM {prefix}contacts p
+                    WHERE p.client_id = ANY(%(survivor)s || %(duplicates)s) AND p.is_primary
+                    ORDER BY p.client_id = %(survivor)s DESC, p.created_at DESC, p.id DESC
+                    LIMIT 1
+                )
+            WHERE ct.client_id = ANY(%(duplicates)s)
+        """, ids)
+        contacts = cursor.rowcount
+        cursor.execute(f"""
+            UPDATE {prefix}interactions SET client_id = %(survivor)s
+            WHERE client_id = ANY(%(duplicates)s)
+        """, ids)
+        interactions = cursor.rowcount
+
+        columns = ', '.join(MERGE_FILL_FIELDS)
+        cursor.execute(f"""
+            DELETE FROM {prefix}clients WHERE id = ANY(%(duplicates)s)
+            RETURNING id, {columns}
+        """, ids)
+        removed = sorted(cursor.fetchall())
+        # Дубль уже удалён, поэтому его email можно отдать оставшемуся клиенту без конфликта UNIQUE
+        fill = [
+            next((row[i] for row in removed if row[i] is not None), None)
+            for i in range(1, len(MERGE_FILL_FIELDS) + 1)
+        ]
+        assignments = ', '.join(f'{field} = COALESCE({field}, %s)' for field in MERGE_FILL_FIELDS)
+        cursor.execute(f"""
+            UPDATE {prefix}clients SET {assignments}
+            WHERE id = %s
+            RETURNING {serializer.select_list()}
+        """, (*fill, survivor_id))
+        survivor = cursor.fetchone()
+    return {
+        'survivor': serializer.to_dict(survivor),
+        'merged': duplicate_ids,
+        'moved': {'contacts': contacts, 'interactions': interactions}
+    }
@@ -0,0 +1,135 @@
+'''
+Business: Карточка клиента с контактами и последними взаимодействиями одним SQL-запросом
+Args: cursor - курсор psycopg2, client_ids - список id, schema - схема таблиц
+Returns: готовый JSON-текст, собранный в PostgreSQL через json_agg
+
+Строки собираются по схемам CLIENT_ROW, CONTACT_ROW и INTERACTION_ROW (Serializer.json_sql):
+ключи в порядке колонок и дата через пробел, как у списков clients и contacts.
+'''
+from typing import Any, Dict, List, Optional
+
+from shared import async_db
+from shared.prepared import execute_prepared
+from shared.serializers import CLIENT_ROW, CONTACT_ROW, INTERACTION_ROW
+
+DEFAULT_RECENT_INTERACTIONS = 10
+MAX_RECENT_INTERACTIONS = 50
+MAX_DETAIL_IDS = 100
+
+
+class InvalidDetailRequest(ValueError):
+    pass
+
+
+def parse_client_ids(value: str) -> List[int]:
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise InvalidDetailRequest('ids must be a comma-separated list of integers')
+    if not ids:
+        raise InvalidDetailRequest('ids must not be empty')
+    if len(ids) > MAX_DETAIL_IDS:
+        raise InvalidDetailRequest(f'At most {MAX_DETAIL_IDS} ids per request')
+    return list(dict.fromkeys(ids))
+
+
+def parse_interactions_limit(params: Dict[str, Any]) -> int:
+    try:
+        limit = int(params.get('interactions') or DEFAULT_RECENT_INTERACTIONS)
+    except (TypeError, ValueError):
+        raise InvalidDetailRequest('interactions must be an integer')
+    return max(0, min(limit, MAX_RECENT_INTERACTIONS))
+
+
+def _contacts_sql(prefix: str, client_id: str) -> str:
+    return f"""
+        COALESCE((
+            SELECT json_agg({CONTACT_ROW.json_sql('ct')} ORDER BY ct.is_primary DESC, ct.created_at DESC, ct.id DESC)
+            FROM {prefix}contacts ct
+            WHERE ct.client_id = {client_id}
+        ), '[]'::json)
+    """
+
+
+def _interactions_sql(prefix: str, client_id: str, limit: str) -> str:
+    return f"""
+        COALESCE((
+            SELECT json_agg({INTERACTION_ROW.json_sql('i')} ORDER BY i.interaction_date DESC, i.id DESC)
+            FROM (
+                SELECT * FROM {prefix}interactions
+                WHERE client_id = {client_id}
+                ORDER BY interaction_date DESC, id DESC
+                LIMIT {limit}
+            ) i
+        ), '[]'::json)
+    """
+
+
+def _detail_sql(prefix: str) -> str:
+    detail = CLIENT_ROW.json_sql('c', {
+        'contacts': _contacts_sql(prefix, 'c.id'),
+        'interactions': _interactions_sql(prefix, 'c.id', '%(interactions)s')
+    })
+    return f"""
+        SELECT c.id, {detail} AS detail
+        FROM {prefix}clients c
+        WHERE c.id = ANY(%(ids)s)
+    """
+
+
+def fetch_client_detail(cursor: Any, client_id: int, interactions: int, schema: str = '') -> Optional[str]:
+    prefix = f'{schema}.' if schema else ''
+    execute_prepared(
+        cursor,
+        f"SELECT d.detail::text AS body FROM ({_detail_sql(prefix)}) d",
+        {'ids': [client_id], 'interactions': interactions}
+    )
+    row = cursor.fetchone()
+    return row['body'] if row else None
+
+
+def fetch_client_details(cursor: Any, client_ids: List[int], interactions: int, schema: str = '') -> str:
+    '''
+    Список id отдаётся в порядке запроса; отсутствующие id просто пропускаются.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    execute_prepared(
+        cursor,
+        f"""
+        SELECT COALESCE(json_agg(d.detail ORDER BY array_position(%(ids)s, d.id)), '[]'::json)::text AS body
+        FROM ({_detail_sql(prefix)}) d
+        """,
+        {'ids': client_ids, 'interactions': interactions}
+    )
+    return cursor.fetchone()['body']
+
+
+async def fetch_client_detail_async(client_id: int, interactions: int, schema: str = '') -> Optional[str]:
+    '''
+    Клиент, контакты и взаимодействия - три независимых запроса через asyncio.gather,
+    JSON склеивается из готовых json-текстов. Запросы идут на разных соединениях,
+    поэтому карточка может попасть между двумя записями - для чтения это допустимо.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    client, contacts, recent = await async_db.gather(
+        async_db.fetchval(f"SELECT {CLIENT_ROW.json_sql('c')}::text FROM {prefix}clients c WHERE c.id = %s", (client_id,)),
+        async_db.fetchval(f"SELECT {_contacts_sql(prefix, '%s')}::text", (client_id,)),
+        async_db.fetchval(f"SELECT {_interactions_sql(prefix, '%s', '%s')}::text", (client_id, interactions))
+    )
+    if client is None:
+        return None
+    return f'{client[:-1]}, "contacts": {contacts}, "interactions": {recent}}}'
+
+
+async def fetch_client_details_async(client_ids: List[int], interactions: int, schema: str = '') -> str:
+    '''
+    Пакет карточек уже собирается одним запросом, параллелить в нём нечего.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    return await async_db.fetchval(
+        f"""
+        SELECT COALESCE(json_agg(d.detail ORDER BY array_position(%(ids)s, d.id)), '[]'::json)::text AS body
+        FROM ({_detail_sql(prefix)}) d
+        """,
+        {'ids': client_ids, 'interactions': interactions}
+    )
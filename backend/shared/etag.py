@@ -0,0 +1,131 @@
+'''
+Business: Условные GET: ETag по версиям таблиц из crm_versions (миграции V0004, V0011) и ответ 304
+Args: If-None-Match из заголовков запроса
+Returns: request_etag и conditional_response для Router - версии читаются курсором самого маршрута
+'''
+import hashlib
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+ETAG_HEADER = 'ETag'
+
+# Выгрузка собирается целиком и не повторяется браузером, импорт - это запись.
+# Дельта ленты зависит от xmin снимка, а не только от версий таблиц, дубли - от полного прохода,
+# окно таймлайна по умолчанию сдвигается с текущей датой без записи в таблицы
+UNCONDITIONAL_ACTIONS = {'export', 'import', 'changes', 'duplicates', 'timeline'}
+
+# Окна от CURRENT_DATE (новые клиенты и взаимодействия за 30 дней) меняются в полночь без записи:
+# дата базы входит в ETag наравне с версиями таблиц
+DATED_ACTIONS = {'stats'}
+
+
+def dependencies(entity: str, params: Dict[str, Any]) -> Tuple[str, ...]:
+    '''
+    Таблицы, от которых зависит ответ: список взаимодействий содержит имя клиента,
+    карточка клиента - его контакты и взаимодействия.
+    '''
+    if entity == 'clients':
+        if params.get('action') == 'stats':
+            return ('clients', 'interactions')
+        if params.get('id') or params.get('ids'):
+            return ('clients', 'contacts', 'interactions')
+        return ('clients',)
+    if entity == 'interactions':
+        return ('clients', 'interactions')
+    return (entity,)
+
+
+def versions_query(tables: Iterable[str], schema: str = '', dated: bool = False) -> Tuple[str, Tuple[Any, ...]]:
+    '''
+    dated=True - в версиях ещё и CURRENT_DATE базы как число YYYYMMDD под ключом date.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    date_sql = " UNION ALL SELECT 'date', to_char(CURRENT_DATE, 'YYYYMMDD')::bigint" if dated else ''
+    return (
+        f'SELECT entity, SUM(version)::bigint FROM {prefix}crm_versions WHERE entity = ANY(%s) GROUP BY entity{date_sql}',
+        (list(tables),)
+    )
+
+
+def fetch_versions(cursor: Any, tables: Iterable[str], schema: str = '', dated: bool = False) -> Dict[str, int]:
+    cursor.execute(*versions_query(tables, schema, dated))
+    return dict(cursor.fetchall())
+
+
+def compute_etag(namespace: str, entity: str, params: Dict[str, Any], versions: Dict[str, int]) -> str:
+    material = '|'.join([
+        namespace,
+        entity,
+        '&'.join(f'{k}={v}' for k, v in sorted(params.items())),
+        ','.join(f'{k}:{versions.get(k, 0)}' for k in sorted(versions))
+    ])
+    return 'W/"' + hashlib.sha1(material.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def etag_matches(event: Dict[str, Any], etag: Optional[str]) -> bool:
+    candidates = request_header(event, 'If-None-Match')
+    if not candidates or not etag:
+        return False
+    if candidates.strip() == '*':
+        return True
+    # Сравнение слабое: прокси могут снимать или добавлять префикс W/
+    weak = etag[2:] if etag.startswith('W/') else etag
+    return any((c.strip()[2:] if c.strip().startswith('W/') else c.strip()) == weak for c in candidates.split(','))
+
+
+def not_modified(etag: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {**headers, ETAG_HEADER: etag},
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def validator_headers(etag: str) -> Dict[str, str]:
+    return {
+        ETAG_HEADER: etag,
+        'Cache-Control': 'no-cache',
+        'Access-Control-Expose-Headers': 'ETag, X-Next-Cursor'
+    }
+
+
+def request_etag(
+    namespace: str, entity: str, event: Dict[str, Any], fetch: Callable[[Tuple[str, ...], bool], Dict[str, int]]
+) -> Optional[str]:
+    '''
+    fetch(tables, dated) - версии на соединении и узле, которые отдадут тело ответа: отдельное
+    соединение из пула на каждый GET не нужно, и версии с реплики не новее тела.
+    None - запрос не условный.
+    '''
+    if event.get('httpMethod', 'GET') != 'GET':
+        return None
+    params = event.get('queryStringParameters') or {}
+    if params.get('action') in UNCONDITIONAL_ACTIONS:
+        return None
+    versions = fetch(dependencies(entity, params), params.get('action') in DATED_ACTIONS)
+    return compute_etag(namespace, entity, params, versions)
+
+
+def conditional_response(
+    event: Dict[str, Any], etag: Optional[str], headers: Dict[str, str], handler: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    '''
+    304 без вызова handler, если клиент прислал тот же ETag, иначе ответ handler с ETag у 200.
+    '''
+    if etag is None:
+        return handler()
+    if etag_matches(event, etag):
+        return not_modified(etag, {**headers, **validator_headers(etag)})
+
+    response = handler()
+    if response.get('statusCode') == 200:
+        response['headers'] = {**response.get('headers', {}), **validator_headers(etag)}
+    return response
@@ -0,0 +1,144 @@
+'''
+Business: Выгрузка клиентов, контактов и взаимодействий в CSV или NDJSON с ограниченной памятью
+Args: conn - соединение из пула, entity - clients/contacts/interactions, data_format - csv/ndjson,
+      token - X-Next-Cursor предыдущей части; EXPORT_MAX_ROWS, EXPORT_MAX_BYTES - предел одного ответа
+Returns: тело ответа (при gzip - base64), Content-Type, имя файла и X-Next-Cursor, если выгрузка не закончена
+
+Один ответ - не больше EXPORT_MAX_ROWS строк и примерно EXPORT_MAX_BYTES несжатого текста
+(последняя строка может выйти за предел). Следующая часть запрашивается с cursor=X-Next-Cursor,
+как страницы списков; заголовок CSV есть только в первой части, поэтому части склеиваются
+в один файл подряд, а сжатые части - корректный gzip из нескольких членов.
+'''
+import base64
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.db import transaction
+from shared.pagination import InvalidCursor, decode_cursor, encode_cursor, page_headers
+
+EXPORT_CHUNK_SIZE = 2000
+DEFAULT_MAX_ROWS = 50000
+DEFAULT_MAX_BYTES = 3 * 1024 * 1024
+
+EXPORT_COLUMNS: Dict[str, List[str]] = {
+    'clients': ['id', 'name', 'company', 'email', 'phone', 'address', 'created_at', 'updated_at'],
+    'contacts': ['id', 'client_id', 'contact_person', 'position', 'email', 'phone', 'is_primary', 'created_at'],
+    'interactions': ['id', 'client_id', 'interaction_type', 'description', 'interaction_date', 'created_by', 'created_at']
+}
+
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+class InvalidExport(ValueError):
+    pass
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Sink:
+    '''
+    Принимает закодированные куски по мере чтения курсора; при gzip сразу их сжимает,
+    так что в памяти держится только сжатый результат и одна пачка строк.
+    '''
+
+    def __init__(self, compress: bool):
+        self.parts: List[bytes] = []
+        self.size = 0
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        if data:
+            self.parts.append(data)
+
+    def finish(self) -> bytes:
+        if self.compressor is not None:
+            self.parts.append(self.compressor.flush())
+        return b''.join(self.parts)
+
+
+def export_entity(
+    conn: Any,
+    entity: str,
+    data_format: str = 'csv',
+    compress: bool = False,
+    schema: str = '',
+    token: Optional[str] = None
+) -> Tuple[str, bool, Dict[str, str]]:
+    columns = EXPORT_COLUMNS.get(entity)
+    if columns is None:
+        raise InvalidExport(f'Unknown export entity: {entity}')
+    if data_format not in CONTENT_TYPES:
+        raise InvalidExport(f'Unsupported export format: {data_format}')
+    after = decode_cursor(token, 1)[0] if token else None
+    if after is not None and (not isinstance(after, int) or isinstance(after, bool)):
+        raise InvalidCursor('Invalid cursor')
+    max_rows = int(os.environ.get('EXPORT_MAX_ROWS', DEFAULT_MAX_ROWS))
+    max_bytes = int(os.environ.get('EXPORT_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+    prefix = f'{schema}.' if schema else ''
+    sink = _Sink(compress)
+    # write_through: байты строки сразу в raw, по raw.tell() видно размер части в UTF-8
+    raw = io.BytesIO()
+    buffer = io.TextIOWrapper(raw, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(buffer)
+    if data_format == 'csv' and after is None:
+        writer.writerow(columns)
+
+    exported = 0
+    last_id = None
+    next_cursor = None
+    # Именованный курсор живёт на сервере: строки приходят пачками по EXPORT_CHUNK_SIZE;
+    # лишняя строка сверх max_rows означает, что есть следующая часть
+    with transaction(conn), conn.cursor(name=f'export_{entity}') as cursor:
+        cursor.itersize = EXPORT_CHUNK_SIZE
+        where = 'WHERE id > %s' if after is not None else ''
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {prefix}{entity} {where} ORDER BY id LIMIT %s",
+            ([after] if after is not None else []) + [max_rows + 1]
+        )
+        while next_cursor is None:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if exported and (exported == max_rows or sink.size + raw.tell() >= max_bytes):
+                    next_cursor = encode_cursor([last_id])
+                    break
+                if data_format == 'csv':
+                    writer.writerow(['t' if v is True else 'f' if v is False else _plain(v) for v in row])
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False))
+                    buffer.write('\n')
+                exported += 1
+                last_id = row[0]
+            sink.write(raw.getvalue())
+            raw.seek(0)
+            raw.truncate()
+    sink.write(raw.getvalue())
+
+    payload = sink.finish()
+    filename = f'{entity}.{data_format}' + ('.gz' if compress else '')
+    headers = {
+        'Content-Type': 'application/gzip' if compress else CONTENT_TYPES[data_format],
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        **page_headers(next_cursor)
+    }
+    if compress:
+        return base64.b64encode(payload).decode('ascii'), True, headers
+    return payload.decode('utf-8'), False, headers
+
+
+def wants_gzip(params: Dict[str, Any]) -> bool:
+    return str(params.get('gzip', '')).lower() in ('1', 'true', 'yes')
@@ -0,0 +1,269 @@
+'''
+Business: Замеры SQL по каждому вызову функции - время, строки, байты ответа - и журнал медленных запросов
+Args: SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, REQUEST_LOG - переменные окружения
+Returns: InstrumentedConnection для пула, декоратор instrumented для handler и заголовок Server-Timing
+
+Курсоры оборачиваются на уровне соединения (ConnectionPool(connection_factory=...)),
+поэтому замеряются все курсоры обработчиков, включая RealDictCursor и именованные.
+Вызов целиком выполняется в одном потоке, так что текущий запрос хранится в threading.local.
+Журналы пишутся в stdout одной JSON-строкой на событие.
+'''
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+DEFAULT_SLOW_QUERY_MS = 200.0
+MAX_LOGGED_SQL = 2000
+
+SERVER_TIMING_HEADER = 'Server-Timing'
+REQUEST_ID_HEADER = 'X-Request-Id'
+
+_local = threading.local()
+
+logger = logging.getLogger('crm')
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _flag(name: str) -> bool:
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def _slow_threshold() -> float:
+    return float(os.environ.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)) / 1000
+
+
+def _log(event: str, **fields: Any) -> None:
+    logger.info(json.dumps({'event': event, **fields}, ensure_ascii=False, default=str))
+
+
+class RequestTrace:
+    def __init__(self, request_id: str, route: str):
+        self.request_id = request_id
+        self.route = route
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.slow_queries = 0
+        self.response_bytes = 0
+
+    def record(self, seconds: float, rows: int) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        if rows > 0:
+            self.rows += rows
+
+    def summary(self, status: int) -> Dict[str, Any]:
+        total = time.perf_counter() - self.started
+        return {
+            'requestId': self.request_id,
+            'route': self.route,
+            'status': status,
+            'durationMs': round(total * 1000, 2),
+            'queries': self.queries,
+            'dbMs': round(self.db_seconds * 1000, 2),
+            'rows': self.rows,
+            'bytes': self.response_bytes,
+            'slowQueries': self.slow_queries
+        }
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        db = self.db_seconds * 1000
+        return (
+            f'db;dur={db:.2f};desc="{self.queries} queries, {self.rows} rows", '
+            f'app;dur={max(total - db, 0.0):.2f}, total;dur={total:.2f}'
+        )
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return getattr(_local, 'trace', None)
+
+
+def _param_types(params: Any) -> str:
+    if isinstance(params, dict):
+        return ', '.join(f'{name}: {type(value).__name__}' for name, value in params.items())
+    return ', '.join(type(value).__name__ for value in params)
+
+
+def _statement_text(query: Any, params: Any) -> str:
+    '''
+    Текст с %s и типы параметров без значений: имена, email и телефоны клиентов в журнал не попадают.
+    '''
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = ' '.join(text.split())
+    if not params:
+        return text
+    try:
+        return f'{text} /* {len(params)} params: {_param_types(params)} */'
+    except TypeError:
+        return text
+
+
+def _explain(conn: Any, query: Any, params: Any) -> Optional[str]:
+    '''
+    EXPLAIN ANALYZE выполняет запрос ещё раз, поэтому план снимается в отдельной
+    транзакции или под точкой сохранения и всегда откатывается - записи не повторяются.
+    '''
+    statement = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    in_transaction = conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    cursor = psycopg2.extensions.connection.cursor(conn)
+    try:
+        cursor.execute('SAVEPOINT crm_explain' if in_transaction else 'BEGIN')
+        try:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) {statement}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        except psycopg2.Error as error:
+            plan = f'EXPLAIN failed: {error}'.strip()
+        if in_transaction:
+            cursor.execute('ROLLBACK TO SAVEPOINT crm_explain')
+            cursor.execute('RELEASE SAVEPOINT crm_explain')
+        else:
+            cursor.execute('ROLLBACK')
+        return plan
+    except psycopg2.Error:
+        return None
+    finally:
+        cursor.close()
+
+
+def record_query(
+    trace: Optional[RequestTrace], seconds: float, rows: int,
+    statement: Callable[[], str], plan: Optional[Callable[[], Optional[str]]] = None
+) -> None:
+    '''
+    Учёт запроса в трассировке и журнал медленных; текст SQL и план собираются только для медленных.
+    '''
+    if trace is not None:
+        trace.record(seconds, rows)
+    if seconds < _slow_threshold():
+        return
+    if trace is not None:
+        trace.slow_queries += 1
+    entry = {
+        'requestId': trace.request_id if trace else None,
+        'route': trace.route if trace else None,
+        'durationMs': round(seconds * 1000, 2),
+        'rows': rows,
+        'sql': statement()[:MAX_LOGGED_SQL]
+    }
+    # В плане EXPLAIN ANALYZE условия печатаются со значениями - флаг для диагностики, не для прода
+    if plan is not None and _flag('SLOW_QUERY_EXPLAIN'):
+        entry['plan'] = plan()
+    _log('slow_query', **entry)
+
+
+def _after_query(cursor: Any, query: Any, params: Any, seconds: float, explain: bool = True) -> None:
+    rows = cursor.rowcount if cursor.name is None else -1
+    plan = (lambda: _explain(cursor.connection, query, params)) if explain and cursor.name is None else None
+    record_query(current_trace(), seconds, rows, lambda: _statement_text(query, params), plan)
+
+
+_instrumented_classes: Dict[type, type] = {}
+_classes_lock = threading.Lock()
+
+
+def instrumented_cursor(cursor_class: type) -> type:
+    with _classes_lock:
+        if cursor_class in _instrumented_classes:
+            return _instrumented_classes[cursor_class]
+
+        def execute(self, query, vars=None):
+            started = time.perf_counter()
+            result = cursor_class.execute(self, query, vars)
+            _after_query(self, query, vars, time.perf_counter() - started)
+            return result
+
+        def executemany(self, query, vars_list):
+            started = time.perf_counter()
+            result = cursor_class.executemany(self, query, vars_list)
+            _after_query(self, query, None, time.perf_counter() - started, explain=False)
+            return result
+
+        def copy_expert(self, sql, file, size=8192):
+            started = time.perf_counter()
+            result = cursor_class.copy_expert(self, sql, file, size)
+            _after_query(self, sql, None, time.perf_counter() - started, explain=False)
+            return result
+
+        instrumented = type(
+            f'Instrumented{cursor_class.__name__}', (cursor_class,),
+            {'execute': execute, 'executemany': executemany, 'copy_expert': copy_expert}
+        )
+        _instrumented_classes[cursor_class] = instrumented
+        return instrumented
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs['cursor_factory'] = instrumented_cursor(kwargs.get('cursor_factory') or psycopg2.extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+
+def _request_id(event: Dict[str, Any], context: Any) -> str:
+    request_id = getattr(context, 'request_id', None)
+    if not request_id:
+        request_id = (event.get('requestContext') or {}).get('requestId')
+    return str(request_id or uuid.uuid4().hex)
+
+
+def route_name(method: str, entity: str, params: Dict[str, Any]) -> str:
+    action = params.get('action')
+    if not action:
+        action = 'item' if params.get('id') or params.get('ids') else 'list'
+    return f'{method} {entity}/{action}'
+
+
+def instrumented(namespace: str, entity: Optional[str] = None) -> Callable:
+    '''
+    Внешний декоратор handler: ответы из кэша тоже получают Server-Timing, а в кэш
+    заголовок одного вызова не попадает.
+    '''
+    def decorate(handler: Callable) -> Callable:
+        @wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            if method == 'OPTIONS':
+                return handler(event, context)
+
+            params = event.get('queryStringParameters') or {}
+            trace = RequestTrace(
+                _request_id(event, context),
+                f"{namespace}:{route_name(method, entity or params.get('entity', 'clients'), params)}"
+            )
+            _local.trace = trace
+            status = 500
+            try:
+                response = handler(event, context)
+                status = response.get('statusCode', 200)
+                trace.response_bytes = len((response.get('body') or '').encode('utf-8'))
+                headers = response.get('headers', {})
+                exposed = headers.get('Access-Control-Expose-Headers')
+                response['headers'] = {
+                    **headers,
+                    SERVER_TIMING_HEADER: trace.server_timing(),
+                    'Timing-Allow-Origin': '*',
+                    REQUEST_ID_HEADER: trace.request_id,
+                    'Access-Control-Expose-Headers': f'{exposed}, {REQUEST_ID_HEADER}' if exposed else REQUEST_ID_HEADER
+                }
+                return response
+            finally:
+                _local.trace = None
+                if _flag('REQUEST_LOG') or trace.slow_queries:
+                    _log('request', **trace.summary(status))
+        return wrapper
+    return decorate
@@ -0,0 +1,83 @@
+'''
+Business: Keyset-пагинация списков по (created_at, id) и аналогичным ключам
+Args: queryStringParameters с limit и непрозрачным cursor
+Returns: условие WHERE для следующей страницы и курсор для ответа
+'''
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    plain = [v.isoformat() if isinstance(v, (datetime, date)) else v for v in values]
+    raw = json.dumps(plain, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, key_size: int) -> List[Any]:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != key_size:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def parse_page(params: Dict[str, Any], key_size: int) -> Tuple[int, Optional[List[Any]]]:
+    try:
+        limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise InvalidCursor('limit must be an integer')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    token = params.get('cursor')
+    after = decode_cursor(token, key_size) if token else None
+    return limit, after
+
+
+def keyset_condition(
+    columns: Sequence[str], after: Optional[List[Any]], bound_leading: bool = False
+) -> Tuple[str, List[Any]]:
+    '''
+    Все ключевые колонки сортируются по убыванию, поэтому следующая страница -
+    это строки, чей кортеж ключей строго меньше последнего выданного. Ключевые колонки
+    NOT NULL (V0013): с NULL в кортеже сравнение даёт NULL, и страницы обрываются.
+    bound_leading добавляет избыточное "первая колонка <= значение": по сравнению
+    кортежей PostgreSQL секции не отсекает, а по простому условию - отсекает.
+    '''
+    if after is None:
+        return 'TRUE', []
+    placeholders = ', '.join(['%s'] * len(columns))
+    condition = f"({', '.join(columns)}) < ({placeholders})"
+    if bound_leading:
+        return f'{columns[0]} <= %s AND {condition}', [after[0], *after]
+    return condition, list(after)
+
+
+def split_page(rows: List[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> Tuple[List[Any], Optional[str]]:
+    '''
+    Запрос выбирает limit + 1 строку: лишняя строка означает, что есть следующая страница.
+    '''
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
+
+
+def page_headers(next_cursor: Optional[str]) -> Dict[str, str]:
+    headers = {'Access-Control-Expose-Headers': NEXT_CURSOR_HEADER}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return headers
@@ -0,0 +1,166 @@
+'''
+Business: Серверные prepared statements для горячих запросов фиксированной формы
+Args: PREPARED_STATEMENTS (on/off) - переменная окружения; off нужен за PgBouncer в режиме transaction
+Returns: execute_prepared(cursor, sql, params) - PREPARE на соединении при первом вызове, дальше EXECUTE
+
+Текст запроса пишется как обычно, с %s или %(name)s; имя statement - хэш текста, поэтому каждая
+форма запроса (например, первая страница и страница после курсора) готовится отдельно.
+Соединение из пула помнит свои statements, новое соединение после переподключения
+начинает с пустого набора. Если сервер statement потерял (DISCARD ALL, рестарт пула)
+или после ALTER TABLE изменился тип результата, statement готовится заново.
+'''
+import hashlib
+import os
+import re
+import threading
+import weakref
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+import psycopg2
+import psycopg2.extensions
+
+DEFAULT_MAX_STATEMENTS = 64
+
+_PLACEHOLDER_RE = re.compile(r'%%|%s|%\((\w+)\)s')
+
+# 26000 - statement не найден, 42P05 - уже существует, 0A000 - "cached plan must not change result type"
+_STALE_CODES = {'26000', '42P05'}
+
+
+Params = Union[Sequence[Any], Mapping[str, Any]]
+
+
+def _is_stale(error: psycopg2.Error) -> bool:
+    if error.pgcode in _STALE_CODES:
+        return True
+    return error.pgcode == '0A000' and 'cached plan' in str(error)
+
+
+def to_positional(sql: str) -> Tuple[str, List[Optional[str]]]:
+    '''
+    %s и %(name)s -> $1, $2 ... для PREPARE; %% -> %. Повторное %(name)s получает тот же номер.
+    Возвращает текст и порядок параметров: None для позиционного, имя для именованного.
+    '''
+    order: List[Optional[str]] = []
+
+    def replace(match: 're.Match[str]') -> str:
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is not None and name in order:
+            return f'${order.index(name) + 1}'
+        order.append(name)
+        return f'${len(order)}'
+
+    return _PLACEHOLDER_RE.sub(replace, sql), order
+
+
+class StatementRegistry:
+    def __init__(self, max_statements: int = DEFAULT_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._statements: Dict[str, Tuple[str, str, str, List[Optional[str]]]] = {}
+        self._prepared: 'weakref.WeakKeyDictionary[Any, Set[str]]' = weakref.WeakKeyDictionary()
+        self.prepares = 0
+        self.executions = 0
+        self.reprepares = 0
+
+    def statement(self, sql: str) -> Tuple[str, str, str, List[Optional[str]]]:
+        '''
+        (имя, текст для PREPARE, текст EXECUTE с %s, порядок параметров) - разбирается один раз на процесс.
+        '''
+        cached = self._statements.get(sql)
+        if cached is None:
+            text, order = to_positional(sql)
+            name = 'crm_' + hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+            execute_sql = f"EXECUTE {name}({', '.join(['%s'] * len(order))})" if order else f'EXECUTE {name}'
+            cached = (name, text, execute_sql, order)
+            with self._lock:
+                self._statements[sql] = cached
+        return cached
+
+    def _names(self, conn: Any) -> Set[str]:
+        with self._lock:
+            names = self._prepared.get(conn)
+            if names is None:
+                names = self._prepared[conn] = set()
+            return names
+
+    def _prepare(self, cursor: Any, names: Set[str], name: str, text: str) -> None:
+        if len(names) >= self.max_statements:
+            cursor.execute('DEALLOCATE ALL')
+            names.clear()
+        cursor.execute(f'PREPARE {name} AS {text}')
+        names.add(name)
+        with self._lock:
+            self.prepares += 1
+
+    def execute(self, cursor: Any, sql: str, params: Params = ()) -> None:
+        conn = cursor.connection
+        name, text, execute_sql, order = self.statement(sql)
+        if isinstance(params, Mapping):
+            params = [params[key] for key in order]
+        names = self._names(conn)
+        # Повторить после ошибки можно, только если до неё в транзакции ничего не было
+        retryable = conn.autocommit or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+        try:
+            if name not in names:
+                self._prepare(cursor, names, name, text)
+            cursor.execute(execute_sql, params)
+        except psycopg2.Error as error:
+            if not _is_stale(error):
+                raise
+            names.discard(name)
+            if not retryable:
+                raise
+            if not conn.autocommit:
+                conn.rollback()
+            self._deallocate(cursor, name)
+            self._prepare(cursor, names, name, text)
+            cursor.execute(execute_sql, params)
+            with self._lock:
+                self.reprepares += 1
+
+        with self._lock:
+            self.executions += 1
+
+    def _deallocate(self, cursor: Any, name: str) -> None:
+        conn = cursor.connection
+        try:
+            cursor.execute(f'DEALLOCATE {name}')
+        except psycopg2.Error:
+            if not conn.autocommit:
+                conn.rollback()
+        if not conn.autocommit:
+            # DEALLOCATE не транзакционный, но открытую им транзакцию надо закрыть до повтора
+            conn.rollback()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'prepares': self.prepares,
+                'executions': self.executions,
+                'reprepares': self.reprepares,
+                'shapes': len(self._statements)
+            }
+
+
+_registry: Optional[StatementRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> StatementRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = StatementRegistry(int(os.environ.get('PREPARED_MAX_STATEMENTS', DEFAULT_MAX_STATEMENTS)))
+    return _registry
+
+
+def execute_prepared(cursor: Any, sql: str, params: Params = ()) -> None:
+    if os.environ.get('PREPARED_STATEMENTS', 'on') == 'off':
+        cursor.execute(sql, params)
+        return
+    get_registry().execute(cursor, sql, params)
@@ -0,0 +1,292 @@
+'''
+Business: Чтение с реплик - GET уходят на реплики, запись и чтение сразу после неё остаются на основной базе
+Args: DATABASE_REPLICA_URLS (через запятую), REPLICA_MAX_LAG, REPLICA_RETRY_AFTER, REPLICA_CHECK_INTERVAL -
+      переменные окружения; X-Db-Lsn - позиция последней записи вызывающего из заголовка запроса
+Returns: node_for(event) - узел базы для вызова; mark_write - X-Db-Lsn в ответ на запись
+
+Без DATABASE_REPLICA_URLS всё идёт в основную базу, как раньше. Реплика берётся для GET,
+если она в восстановлении, отстаёт не больше REPLICA_MAX_LAG секунд и уже воспроизвела
+WAL до нужной позиции: до последней записи этого процесса и до X-Db-Lsn из запроса, который
+фронтенд возвращает после своей записи - так запись через другой тёплый контейнер тоже видна.
+Состояние реплики (позиция воспроизведения и отставание) читается не чаще раза в
+REPLICA_CHECK_INTERVAL, реплика без соединения выключается на REPLICA_RETRY_AFTER секунд.
+Узел выбирается один раз на вызов и запоминается в event: версии для ETag и тело ответа
+читаются с одного узла, поэтому ETag никогда не новее тела.
+Ограничение: кэш ответов в Redis общий, и ответ реплики из другого контейнера, не видевшего
+записи, может попасть в него после сброса тегов - такой ответ живёт не дольше CACHE_TTL.
+В DSN реплик стоит задать connect_timeout: без него недоступная реплика держит вызов до таймаута TCP.
+Проверка на двух локальных кластерах (основная база и реплика) - benchmarks/replica_check.py.
+'''
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+
+from shared.db import ConnectionPool, PoolExhausted, get_pool, DEFAULT_MAX_SIZE, DEFAULT_TIMEOUT
+from shared.etag import request_header
+from shared.instrumentation import InstrumentedConnection
+
+DEFAULT_MAX_LAG = 1.0
+DEFAULT_RETRY_AFTER = 30.0
+DEFAULT_CHECK_INTERVAL = 1.0
+# Реплика не догнала нужную позицию - перечитать её состояние, но не чаще этого
+MIN_RECHECK = 0.05
+
+LSN_HEADER = 'X-Db-Lsn'
+ROUTE_HEADER = 'X-Db-Route'
+
+# Отметка ленты - снимок основной базы, на реплике с отставанием дельта потеряла бы изменения.
+# Выгрузка держит курсор минутами, а долгий запрос на реплике отменяется конфликтом восстановления
+PRIMARY_ACTIONS = {'changes', 'export'}
+
+# Ошибки реплики, после которых GET повторяется на основной базе
+FAILOVER_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolExhausted)
+
+_MEMO_KEY = '_dbNode'
+
+
+def parse_lsn(text: Optional[str]) -> int:
+    '''
+    '16/B374D848' -> число для сравнения. Мусор в заголовке - 0, то есть без требований.
+    '''
+    try:
+        high, low = str(text).strip().split('/')
+        return (int(high, 16) << 32) + int(low, 16)
+    except (AttributeError, ValueError):
+        return 0
+
+
+def format_lsn(value: int) -> str:
+    return f'{value >> 32:X}/{value & 0xFFFFFFFF:X}'
+
+
+class Replica:
+    '''
+    Пул соединений одной реплики и её последнее известное состояние.
+    Состояние обновляет один поток, остальные в это время берут прежнее.
+    '''
+
+    def __init__(self, index: int, pool: ConnectionPool, max_lag: float, check_interval: float, retry_after: float):
+        self.name = f'replica:{index}'
+        self.pool = pool
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.replay_lsn = 0
+        self.lag = float('inf')
+        self.checked_at = float('-inf')
+        self.down_until = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def mark_down(self) -> None:
+        self.down_until = time.monotonic() + self.retry_after
+        self.checked_at = float('-inf')
+        # Соединения к упавшей реплике мертвы, к вернувшейся - открываются заново
+        self.pool.close_all()
+
+    def refresh(self) -> None:
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            with self.pool.connection(autocommit=True) as conn, conn.cursor() as cursor:
+                # Без входящего WAL now() - время последней транзакции растёт и на догнавшей реплике
+                cursor.execute("""
+                    SELECT pg_is_in_recovery(),
+                           pg_last_wal_replay_lsn()::text,
+                           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+                """)
+                in_recovery, replay_lsn, lag = cursor.fetchone()
+            if not in_recovery:
+                # Повышенная реплика - уже не копия основной базы, читать с неё нельзя
+                self.mark_down()
+                return
+            self.replay_lsn = parse_lsn(replay_lsn)
+            self.lag = float(lag) if lag is not None else float('inf')
+            self.checked_at = time.monotonic()
+        except FAILOVER_ERRORS:
+            self.mark_down()
+        finally:
+            self._refresh_lock.release()
+
+    def skip_reason(self, min_lsn: int) -> Optional[str]:
+        '''
+        None - реплика годится для чтения с позиции min_lsn, иначе причина: down, lag или lsn.
+        '''
+        now = time.monotonic()
+        if now < self.down_until:
+            return 'down'
+        age = now - self.checked_at
+        if age > self.check_interval or (self.replay_lsn < min_lsn and age > MIN_RECHECK):
+            self.refresh()
+            if time.monotonic() < self.down_until:
+                return 'down'
+        if self.lag > self.max_lag:
+            return 'lag'
+        if self.replay_lsn < min_lsn:
+            return 'lsn'
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'replayLsn': format_lsn(self.replay_lsn),
+            'lag': self.lag if self.lag != float('inf') else None,
+            'down': time.monotonic() < self.down_until,
+            'pool': self.pool.stats()
+        }
+
+
+class Node:
+    '''
+    Узел для одного вызова: пул, реплика (None - основная база) и заголовок X-Db-Route.
+    '''
+
+    def __init__(self, pool: ConnectionPool, replica: Optional[Replica] = None, route: str = 'primary'):
+        self.pool = pool
+        self.replica = replica
+        self.route = route
+
+
+class ReplicaSet:
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self.last_write_lsn = 0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failovers = 0
+        self.fallbacks: Dict[str, int] = {}
+
+    def remember_write(self, lsn: int) -> None:
+        with self._lock:
+            self.last_write_lsn = max(self.last_write_lsn, lsn)
+
+    def choose(self, min_lsn: int) -> Node:
+        min_lsn = max(min_lsn, self.last_write_lsn)
+        start = next(self._turn)
+        reasons = []
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            reason = replica.skip_reason(min_lsn)
+            if reason is None:
+                with self._lock:
+                    self.replica_reads += 1
+                return Node(replica.pool, replica, replica.name)
+            reasons.append(reason)
+        reason = ','.join(sorted(set(reasons)))
+        with self._lock:
+            self.primary_reads += 1
+            self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+        return Node(get_pool(), route=f'primary;fallback={reason}')
+
+    def fail_over(self, node: Node, lost: bool) -> Node:
+        '''
+        lost=True - до реплики не достучаться, она выключается на retry_after. Ошибка запроса
+        при живом соединении (например, отмена конфликтом восстановления) реплику не выключает.
+        '''
+        if lost and node.replica is not None:
+            node.replica.mark_down()
+        with self._lock:
+            self.failovers += 1
+        return Node(get_pool(), route=f'primary;failover={node.route}')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'replicaReads': self.replica_reads,
+                'primaryReads': self.primary_reads,
+                'failovers': self.failovers,
+                'fallbacks': dict(self.fallbacks),
+                'lastWriteLsn': format_lsn(self.last_write_lsn),
+                'replicas': [replica.stats() for replica in self.replicas]
+            }
+
+
+_replicas: Optional[ReplicaSet] = None
+_replicas_lock = threading.Lock()
+
+
+def get_replicas() -> Optional[ReplicaSet]:
+    global _replicas
+    urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    if not urls:
+        return None
+    if _replicas is None:
+        with _replicas_lock:
+            if _replicas is None:
+                max_lag = float(os.environ.get('REPLICA_MAX_LAG', DEFAULT_MAX_LAG))
+                check_interval = float(os.environ.get('REPLICA_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL))
+                retry_after = float(os.environ.get('REPLICA_RETRY_AFTER', DEFAULT_RETRY_AFTER))
+                _replicas = ReplicaSet([
+                    Replica(
+                        index,
+                        ConnectionPool(
+                            url,
+                            max_size=int(os.environ.get('DB_POOL_MAX_SIZE', DEFAULT_MAX_SIZE)),
+                            timeout=float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_TIMEOUT)),
+                            connection_factory=InstrumentedConnection
+                        ),
+                        max_lag, check_interval, retry_after
+                    )
+                    for index, url in enumerate(urls, 1)
+                ])
+    return _replicas
+
+
+def reads_from_replica(event: Dict[str, Any]) -> bool:
+    if event.get('httpMethod', 'GET') != 'GET':
+        return False
+    params = event.get('queryStringParameters') or {}
+    return params.get('action') not in PRIMARY_ACTIONS
+
+
+def node_for(event: Dict[str, Any]) -> Node:
+    '''
+    Узел выбирается при первом обращении за вызов (в Router.dispatch) и дальше не меняется.
+    '''
+    node = event.get(_MEMO_KEY)
+    if node is None:
+        replicas = get_replicas()
+        if replicas is None or not reads_from_replica(event):
+            node = Node(get_pool())
+        else:
+            node = replicas.choose(parse_lsn(request_header(event, LSN_HEADER)))
+        event[_MEMO_KEY] = node
+    return node
+
+
+def pool_for(event: Dict[str, Any]) -> ConnectionPool:
+    return node_for(event).pool
+
+
+def fail_over(event: Dict[str, Any], node: Node, lost: bool) -> Node:
+    node = get_replicas().fail_over(node, lost)
+    event[_MEMO_KEY] = node
+    return node
+
+
+def mark_write(response: Dict[str, Any], conn: Any) -> None:
+    '''
+    После успешной записи: позиция WAL основной базы - в X-Db-Lsn ответа и в последнюю запись
+    процесса. Без реплик лишний запрос не нужен. Запись уже зафиксирована, поэтому ошибка
+    чтения позиции не превращает ответ в 500 - теряется только защита чтения своей записи.
+    '''
+    replicas = get_replicas()
+    if replicas is None:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_current_wal_lsn()::text')
+            lsn = cursor.fetchone()[0]
+    except psycopg2.Error:
+        return
+    replicas.remember_write(parse_lsn(lsn))
+    headers = response['headers']
+    exposed = headers.get('Access-Control-Expose-Headers')
+    headers[LSN_HEADER] = lsn
+    headers['Access-Control-Expose-Headers'] = f'{exposed}, {LSN_HEADER}' if exposed else LSN_HEADER
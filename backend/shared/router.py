@@ -0,0 +1,280 @@
+'''
+Business: Общее ядро маршрутизации для crm-api, clients и contacts - таблица (метод, сущность, действие) -> обработчик
+Args: DB_SCHEMA - схема таблиц для всех функций (по умолчанию у каждой своя)
+Returns: Router с зарегистрированными маршрутами; router.handle - готовый handler(event, context)
+
+Соединение из пула, CORS, коды ошибок и закрытие курсоров живут здесь, маршрут
+получает Request и возвращает ответ. Одинаковые параллельные GET склеиваются в один
+вызов (shared.singleflight) до кэша ответов. Пул, кэш ответов и сериализаторы общие на процесс,
+поэтому одному тёплому контейнеру достаточно одного набора импортов на все маршруты.
+При ASYNC_DB=on маршрут из async_route подменяет обычный с тем же ключом и
+выполняется через shared.async_db. GET читают с реплики из DATABASE_REPLICA_URLS, если она
+успевает (shared.replicas), запись и асинхронные маршруты идут в основную базу.
+Версии для ETag (shared.etag) читаются на соединении маршрута, до тела ответа.
+'''
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from shared import async_db, etag, replicas
+from shared.db import PoolExhausted
+from shared.cache import cached_handler
+from shared.compression import compressed
+from shared.instrumentation import instrumented
+from shared.singleflight import single_flight
+from shared.pagination import InvalidCursor
+from shared.bulk_import import InvalidImport
+from shared.export import InvalidExport
+from shared.detail import InvalidDetailRequest
+from shared.batch import InvalidBatch
+from shared.bulk_clients import InvalidBulkRequest
+from shared.serializers import InvalidFields
+from shared.changes import InvalidChangesRequest
+from shared.dedup import InvalidMergeRequest
+from shared.timeline import InvalidTimelineRequest
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, If-None-Match, X-Db-Lsn',
+    'Access-Control-Max-Age': '86400'
+}
+
+
+class InvalidBody(ValueError):
+    pass
+
+
+# Ошибки разбора запроса - это 400, остальное - 500
+BAD_REQUEST_ERRORS = (
+    InvalidBody, InvalidCursor, InvalidImport, InvalidExport, InvalidDetailRequest, InvalidBatch,
+    InvalidBulkRequest, InvalidFields, InvalidChangesRequest, InvalidMergeRequest, InvalidTimelineRequest
+)
+
+DEFAULT_ACTIONS = {'POST': 'create', 'PUT': 'update', 'DELETE': 'delete'}
+
+ANY_ENTITY = '*'
+
+Route = Callable[['Request'], Dict[str, Any]]
+AsyncRoute = Callable[['Request'], Awaitable[Dict[str, Any]]]
+
+
+def respond(status: int, body: str, headers: Dict[str, str], is_base64: bool = False) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': headers,
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+
+class Request:
+    def __init__(
+        self, router: 'Router', event: Dict[str, Any], params: Dict[str, Any], entity: str, conn: Any,
+        headers: Dict[str, str]
+    ):
+        self.event = event
+        self.params = params
+        self.entity = entity
+        self.conn = conn
+        self.schema = router.schema
+        self.table = router.table
+        self.headers = headers
+        self._payload: Any = None
+        self._cursors: List[Any] = []
+
+    @property
+    def payload(self) -> Any:
+        '''
+        Тело JSON как есть - объект или массив, для маршрутов, которые принимают и то и другое.
+        '''
+        if self._payload is None:
+            try:
+                self._payload = json.loads(self.event.get('body') or '{}')
+            except ValueError:
+                raise InvalidBody('Body must be valid JSON')
+        return self._payload
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        payload = self.payload
+        if not isinstance(payload, dict):
+            raise InvalidBody('Body must be a JSON object')
+        return payload
+
+    def cursor(self, dict_rows: bool = False) -> Any:
+        '''
+        dict_rows=True - RealDictCursor для путей с dict(row); списки читают кортежи для сериализаторов.
+        '''
+        cursor = self.conn.cursor(cursor_factory=RealDictCursor) if dict_rows else self.conn.cursor()
+        self._cursors.append(cursor)
+        return cursor
+
+    def respond(self, status: int, body: str, headers: Optional[Dict[str, str]] = None, is_base64: bool = False) -> Dict[str, Any]:
+        return respond(status, body, {**self.headers, **(headers or {})}, is_base64)
+
+    def json(self, status: int, data: Any) -> Dict[str, Any]:
+        return self.respond(status, json.dumps(data, default=str))
+
+    def error(self, status: int, message: str) -> Dict[str, Any]:
+        return self.respond(status, json.dumps({'error': message}))
+
+    def close(self) -> None:
+        for cursor in self._cursors:
+            cursor.close()
+        self._cursors = []
+
+
+class Router:
+    '''
+    entity=None - сущность из параметра entity (crm-api), иначе функция обслуживает одну сущность.
+    item_params - параметры GET, по которым запрос считается чтением записи (действие item).
+    '''
+
+    def __init__(
+        self,
+        namespace: str,
+        entity: Optional[str] = None,
+        default_schema: str = '',
+        autocommit: bool = True,
+        item_params: Sequence[str] = (),
+        unrouted: Tuple[int, str] = (405, 'Method not allowed')
+    ):
+        self.namespace = namespace
+        self.entity = entity
+        self.schema = os.environ.get('DB_SCHEMA', default_schema)
+        self.autocommit = autocommit
+        self.item_params = tuple(item_params)
+        self.unrouted = unrouted
+        self.routes: Dict[Tuple[str, str, str], Route] = {}
+        self.async_routes: Dict[Tuple[str, str, str], AsyncRoute] = {}
+        self.handle = instrumented(namespace, entity)(
+            compressed(
+                single_flight(namespace, entity)(
+                    cached_handler(namespace, entity)(self.dispatch)
+                )
+            )
+        )
+
+    def table(self, name: str) -> str:
+        return f'{self.schema}.{name}' if self.schema else name
+
+    def route(self, method: str, entity: str, action: str) -> Callable[[Route], Route]:
+        def register(func: Route) -> Route:
+            self.routes[(method, entity, action)] = func
+            return func
+        return register
+
+    def async_route(self, method: str, entity: str, action: str) -> Callable[[AsyncRoute], AsyncRoute]:
+        '''
+        Асинхронный вариант уже зарегистрированного маршрута - ключ ищется по self.routes.
+        '''
+        def register(func: AsyncRoute) -> AsyncRoute:
+            self.async_routes[(method, entity, action)] = func
+            return func
+        return register
+
+    def default_action(self, method: str, params: Dict[str, Any]) -> str:
+        if method == 'GET':
+            return 'item' if any(params.get(name) for name in self.item_params) else 'list'
+        return DEFAULT_ACTIONS.get(method, '')
+
+    def resolve_key(self, method: str, entity: str, params: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+        '''
+        Незнакомое action, как и раньше в index.py, не ломает запрос - он идёт по обычному маршруту метода.
+        '''
+        default = self.default_action(method, params)
+        action = params.get('action') or default
+        for key in ((method, entity, action), (method, ANY_ENTITY, action), (method, entity, default)):
+            if key in self.routes:
+                return key
+        return None
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        method: str = event.get('httpMethod', 'GET')
+        if method == 'OPTIONS':
+            return respond(200, '', dict(CORS_HEADERS))
+
+        params = event.get('queryStringParameters') or {}
+        entity = self.entity or params.get('entity', 'clients')
+        headers = {'Content-Type': 'application/json', **CORS_HEADERS}
+        key = self.resolve_key(method, entity, params)
+        if key is None:
+            status, message = self.unrouted
+            return respond(status, json.dumps({'error': message}), headers)
+
+        if key in self.async_routes and async_db.enabled():
+            return self.dispatch_async(self.async_routes[key], Request(self, event, params, entity, None, headers))
+
+        return self.run(self.routes[key], event, params, entity, headers, replicas.node_for(event))
+
+    def run(
+        self, route: Route, event: Dict[str, Any], params: Dict[str, Any], entity: str, headers: Dict[str, str],
+        node: replicas.Node
+    ) -> Dict[str, Any]:
+        '''
+        Маршрут на соединении узла node. Чтение с реплики, упавшее на соединении или на запросе,
+        повторяется на основной базе: GET ничего не меняет, повтор безопасен.
+        '''
+        failover_errors = replicas.FAILOVER_ERRORS if node.replica is not None else ()
+        conn = None
+        request = None
+        try:
+            conn = node.pool.acquire(autocommit=self.autocommit)
+            headers['X-Db-Pool'] = node.pool.stats_header()
+            headers[replicas.ROUTE_HEADER] = node.route
+            request = Request(self, event, params, entity, conn, headers)
+            tag = etag.request_etag(
+                self.namespace, entity, event,
+                lambda tables, dated: etag.fetch_versions(request.cursor(), tables, self.schema, dated)
+            )
+            response = etag.conditional_response(event, tag, headers, lambda: route(request))
+            if event.get('httpMethod') != 'GET' and response['statusCode'] < 400:
+                replicas.mark_write(response, conn)
+            return response
+
+        except failover_errors as e:
+            lost = conn.closed if conn is not None else not isinstance(e, PoolExhausted)
+            fallback = replicas.fail_over(event, node, lost)
+
+        except BAD_REQUEST_ERRORS as e:
+            return respond(400, json.dumps({'error': str(e)}), headers)
+
+        except Exception as e:
+            if conn is not None and not self.autocommit:
+                conn.rollback()
+            return respond(500, json.dumps({'error': str(e)}), headers)
+
+        finally:
+            if request is not None:
+                request.close()
+            if conn is not None:
+                node.pool.release(conn)
+
+        return self.run(route, event, params, entity, headers, fallback)
+
+    def dispatch_async(self, route: AsyncRoute, request: Request) -> Dict[str, Any]:
+        '''
+        Асинхронные маршруты только читают, поэтому откатывать нечего - соединения
+        asyncpg берутся на каждый запрос внутри маршрута и сразу возвращаются в пул.
+        '''
+        try:
+            tag = etag.request_etag(
+                self.namespace, request.entity, request.event,
+                lambda tables, dated: dict(
+                    async_db.run(async_db.fetch(*etag.versions_query(tables, self.schema, dated)))
+                )
+            )
+            response = etag.conditional_response(
+                request.event, tag, request.headers, lambda: async_db.run(route(request))
+            )
+            response['headers']['X-Db-Pool'] = async_db.stats_header()
+            return response
+
+        except BAD_REQUEST_ERRORS as e:
+            return respond(400, json.dumps({'error': str(e)}), request.headers)
+
+        except Exception as e:
+            return respond(500, json.dumps({'error': str(e)}), request.headers)
@@ -0,0 +1,3 @@
+'''
+Таблицы маршрутов: api - crm-api (camelCase), clients и contacts - одноимённые функции (имена колонок)
+'''
@@ -0,0 +1,346 @@
+'''
+Business: Маршруты crm-api - клиенты, контакты и взаимодействия в camelCase, статистика, таймлайн взаимодействий, импорт, выгрузка, пакетная запись взаимодействий и слияние дублей клиентов
+Args: request - shared.router.Request, сущность из параметра entity
+Returns: HTTP response dict
+'''
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+import psycopg2.errors
+
+from shared.router import ANY_ENTITY, Request, Router
+from shared.pagination import parse_page, keyset_condition, split_page, page_headers
+from shared.prepared import execute_prepared
+from shared.search import search_clients, parse_search_limit
+from shared.stats import fetch_dashboard_stats, fetch_dashboard_stats_async
+from shared.bulk_import import read_records, import_clients, import_contacts
+from shared.export import export_entity, wants_gzip
+from shared.batch import read_batch, interaction_values, get_group_commit
+from shared.bulk_clients import read_selection, read_changes, delete_clients, update_clients
+from shared.changes import InvalidChangesRequest, parse_since, fetch_changes
+from shared.dedup import read_merge, find_duplicates, fetch_candidates, merge_clients
+from shared.timeline import fetch_timeline
+from shared.serializers import CLIENT, CONTACT, INTERACTION
+
+# crm-api открывает транзакцию на вызов и фиксирует записи явно
+router = Router('crm-api', autocommit=False, unrouted=(400, 'Invalid request'))
+
+CLIENTS = router.table('clients')
+CONTACTS = router.table('contacts')
+INTERACTIONS = router.table('interactions')
+
+INTERACTION_RETURNING = INTERACTION.select_list(
+    expressions={'client_name': f'(SELECT name FROM {CLIENTS} WHERE {CLIENTS}.id = {INTERACTIONS}.client_id)'}
+)
+
+# Сущность ленты изменений -> (сериализатор, таблица)
+CHANGE_FEEDS = {'clients': (CLIENT, CLIENTS), 'contacts': (CONTACT, CONTACTS)}
+
+
+@router.route('GET', ANY_ENTITY, 'export')
+def export(request: Request) -> Dict[str, Any]:
+    params = request.params
+    body, is_base64, export_headers = export_entity(
+        request.conn, request.entity, params.get('format', 'csv'), wants_gzip(params), request.schema,
+        params.get('cursor')
+    )
+    return request.respond(200, body, export_headers, is_base64)
+
+
+@router.route('GET', 'clients', 'stats')
+def stats(request: Request) -> Dict[str, Any]:
+    return request.respond(200, json.dumps(fetch_dashboard_stats(request.cursor(dict_rows=True), request.schema)))
+
+
+@router.async_route('GET', 'clients', 'stats')
+async def stats_async(request: Request) -> Dict[str, Any]:
+    return request.respond(200, json.dumps(await fetch_dashboard_stats_async(request.schema)))
+
+
+@router.route('GET', 'interactions', 'timeline')
+def timeline(request: Request) -> Dict[str, Any]:
+    return request.respond(200, fetch_timeline(request.cursor(), request.params, request.schema))
+
+
+@router.route('GET', ANY_ENTITY, 'changes')
+def changes(request: Request) -> Dict[str, Any]:
+    params = request.params
+    since = parse_since(params)
+    if request.entity == 'interactions':
+        serializer = INTERACTION.project(params.get('fields'), always=('id', 'client_id'))
+        # Имя клиента подзапросом, как в INTERACTION_RETURNING: строк дельты мало, JOIN уходил в Seq Scan по clients
+        rows_sql = f"""
+            SELECT {serializer.select_list('i', {'client_name': f'(SELECT name FROM {CLIENTS} c WHERE c.id = i.client_id)'})}
+            FROM {INTERACTIONS} i
+            WHERE i.id = ANY(%s)
+        """
+    elif request.entity in CHANGE_FEEDS:
+        base, table = CHANGE_FEEDS[request.entity]
+        serializer = base.project(params.get('fields'))
+        rows_sql = f'SELECT {serializer.select_list()} FROM {table} WHERE id = ANY(%s)'
+    else:
+        raise InvalidChangesRequest(f'Unknown entity: {request.entity}')
+    body = fetch_changes(request.cursor(), request.entity, since, rows_sql, serializer, request.schema)
+    return request.respond(200, body)
+
+
+@router.route('GET', 'clients', 'list')
+def list_clients(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    serializer = CLIENT.project(params.get('fields'), extra=('created_at',))
+    search = params.get('search', '')
+    if search:
+        clients = search_clients(cursor, CLIENTS, search, parse_search_limit(params), serializer.select_list('c'))
+        next_cursor = None
+    else:
+        limit, after = parse_page(params, 2)
+        page_where, page_params = keyset_condition(('created_at', 'id'), after)
+        execute_prepared(cursor, f"""
+            SELECT {serializer.select_list()} FROM {CLIENTS}
+            WHERE {page_where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """, (*page_params, limit + 1))
+        clients, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('created_at', 'id'))
+
+    return request.respond(200, serializer.dumps(clients), page_headers(next_cursor))
+
+
+@router.route('GET', 'contacts', 'list')
+def list_contacts(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    client_id = params.get('clientId')
+    serializer = CONTACT.project(params.get('fields'), extra=('is_primary', 'created_at'))
+    if client_id:
+        limit, after = parse_page(params, 3)
+        page_where, page_params = keyset_condition(('is_primary', 'created_at', 'id'), after)
+        execute_prepared(cursor, f"""
+            SELECT {serializer.select_list()} FROM {CONTACTS}
+            WHERE client_id = %s AND {page_where}
+            ORDER BY is_primary DESC, created_at DESC, id DESC
+            LIMIT %s
+        """, (client_id, *page_params, limit + 1))
+        contacts, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('is_primary', 'created_at', 'id'))
+    else:
+        limit, after = parse_page(params, 2)
+        page_where, page_params = keyset_condition(('created_at', 'id'), after)
+        execute_prepared(cursor, f"""
+            SELECT {serializer.select_list()} FROM {CONTACTS}
+            WHERE {page_where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """, (*page_params, limit + 1))
+        contacts, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('created_at', 'id'))
+
+    return request.respond(200, serializer.dumps(contacts), page_headers(next_cursor))
+
+
+@router.route('GET', 'interactions', 'list')
+def list_interactions(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    client_id = params.get('clientId')
+    # clientId остаётся в ответе всегда: по нему кэш сбрасывает список при правке клиента
+    serializer = INTERACTION.project(params.get('fields'), always=('id', 'client_id'), extra=('interaction_date',))
+    limit, after = parse_page(params, 2)
+    # interactions секционирована по interaction_date (V0005) - курсор отсекает более новые секции
+    page_where, page_params = keyset_condition(('i.interaction_date', 'i.id'), after, bound_leading=True)
+    if 'client_name' in serializer.columns:
+        source = f'{INTERACTIONS} i JOIN {CLIENTS} c ON i.client_id = c.id'
+    else:
+        # Без clientName JOIN не нужен: внешний ключ гарантирует клиента для любого непустого client_id
+        source = f'{INTERACTIONS} i'
+        page_where = f'i.client_id IS NOT NULL AND {page_where}'
+    columns = serializer.select_list('i', {'client_name': 'c.name'})
+    if client_id:
+        execute_prepared(cursor, f"""
+            SELECT {columns}
+            FROM {source}
+            WHERE i.client_id = %s AND {page_where}
+            ORDER BY i.interaction_date DESC, i.id DESC
+            LIMIT %s
+        """, (client_id, *page_params, limit + 1))
+    else:
+        execute_prepared(cursor, f"""
+            SELECT {columns}
+            FROM {source}
+            WHERE {page_where}
+            ORDER BY i.interaction_date DESC, i.id DESC
+            LIMIT %s
+        """, (*page_params, limit + 1))
+
+    interactions, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('interaction_date', 'id'))
+    return request.respond(200, serializer.dumps(interactions), page_headers(next_cursor))
+
+
+@router.route('POST', 'clients', 'import')
+def import_client_rows(request: Request) -> Dict[str, Any]:
+    result = import_clients(request.conn, read_records(request.event, request.params), request.schema)
+    return request.respond(200, json.dumps(result))
+
+
+@router.route('POST', 'contacts', 'import')
+def import_contact_rows(request: Request) -> Dict[str, Any]:
+    result = import_contacts(request.conn, read_records(request.event, request.params), request.schema)
+    return request.respond(200, json.dumps(result))
+
+
+@router.route('POST', 'clients', 'bulk-delete')
+def bulk_delete_clients(request: Request) -> Dict[str, Any]:
+    where, where_params = read_selection(request.body, request.schema)
+    return request.respond(200, json.dumps(delete_clients(request.conn, where, where_params, request.schema)))
+
+
+@router.route('POST', 'clients', 'bulk-update')
+def bulk_update_clients(request: Request) -> Dict[str, Any]:
+    where, where_params = read_selection(request.body, request.schema)
+    changes = read_changes(request.body)
+    return request.respond(200, json.dumps(update_clients(request.conn, where, where_params, changes, request.schema)))
+
+
+@router.route('GET', 'clients', 'duplicates')
+def list_duplicates(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    if params.get('id'):
+        return request.respond(200, find_duplicates(cursor, int(params['id']), CLIENT, request.schema))
+    body, next_cursor = fetch_candidates(cursor, params, CLIENT, request.schema)
+    return request.respond(200, body, page_headers(next_cursor))
+
+
+@router.route('POST', 'clients', 'merge')
+def merge(request: Request) -> Dict[str, Any]:
+    survivor_id, duplicate_ids = read_merge(request.body)
+    result = merge_clients(request.conn, survivor_id, duplicate_ids, CLIENT, request.schema)
+    if result is None:
+        return request.error(404, 'Client not found')
+    return request.respond(200, json.dumps(result))
+
+
+@router.route('POST', 'clients', 'create')
+def create_client(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    cursor = request.cursor()
+    try:
+        execute_prepared(cursor, f"""
+            INSERT INTO {CLIENTS} (name, company, email, phone, address)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING {CLIENT.select_list()}
+        """, (
+            body_data.get('name'),
+            body_data.get('company'),
+            body_data.get('email'),
+            body_data.get('phone'),
+            body_data.get('address')
+        ))
+    except psycopg2.errors.UniqueViolation:
+        request.conn.rollback()
+        return request.error(409, 'Client with this email already exists')
+    request.conn.commit()
+    return request.respond(201, CLIENT.dumps_one(cursor.fetchone()))
+
+
+@router.route('POST', 'contacts', 'create')
+def create_contact(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    cursor = request.cursor()
+    execute_prepared(cursor, f"""
+        INSERT INTO {CONTACTS} (client_id, contact_person, position, email, phone, is_primary)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING {CONTACT.select_list()}
+    """, (
+        body_data.get('clientId'),
+        body_data.get('contactPerson'),
+        body_data.get('position'),
+        body_data.get('email'),
+        body_data.get('phone'),
+        body_data.get('isPrimary') or False
+    ))
+    request.conn.commit()
+    return request.respond(201, CONTACT.dumps_one(cursor.fetchone()))
+
+
+def insert_interactions(cursor: Any, rows: Sequence[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    '''
+    Любое число строк одним INSERT из массивов - форма запроса одна, поэтому он готовится один раз.
+    Строки возвращаются в порядке входа: id выдаются последовательностью в порядке ORDER BY n.
+    '''
+    client_ids, types, descriptions, authors = (list(column) for column in zip(*rows))
+    execute_prepared(cursor, f"""
+        INSERT INTO {INTERACTIONS} (client_id, interaction_type, description, created_by)
+        SELECT client_id, interaction_type, description, created_by
+        FROM unnest(%s::integer[], %s::varchar[], %s::text[], %s::varchar[])
+            WITH ORDINALITY AS u(client_id, interaction_type, description, created_by, n)
+        ORDER BY n
+        RETURNING {INTERACTION_RETURNING}
+    """, (client_ids, types, descriptions, authors))
+    return sorted(cursor.fetchall(), key=INTERACTION.key('id'))
+
+
+@router.route('POST', 'interactions', 'create')
+def create_interaction(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    group_commit = get_group_commit()
+    if group_commit is not None:
+        row = group_commit.submit(request.conn, interaction_values(body_data), insert_interactions)
+        return request.respond(201, INTERACTION.dumps_one(row))
+
+    cursor = request.cursor()
+    execute_prepared(cursor, f"""
+        INSERT INTO {INTERACTIONS} (client_id, interaction_type, description, created_by)
+        VALUES (%s, %s, %s, %s)
+        RETURNING {INTERACTION_RETURNING}
+    """, (
+        body_data.get('clientId'),
+        body_data.get('interactionType'),
+        body_data.get('description'),
+        body_data.get('createdBy', 'System')
+    ))
+    request.conn.commit()
+    return request.respond(201, INTERACTION.dumps_one(cursor.fetchone()))
+
+
+@router.route('POST', 'interactions', 'batch')
+def create_interactions(request: Request) -> Dict[str, Any]:
+    rows = read_batch(request.payload)
+    cursor = request.cursor()
+    try:
+        created = insert_interactions(cursor, rows)
+    except psycopg2.errors.ForeignKeyViolation:
+        request.conn.rollback()
+        return request.error(400, 'Unknown clientId in batch')
+    request.conn.commit()
+    return request.respond(201, INTERACTION.dumps(created))
+
+
+@router.route('PUT', 'clients', 'update')
+def update_client(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    client_id = body_data.get('id')
+    if client_id:
+        cursor = request.cursor()
+        try:
+            execute_prepared(cursor, f"""
+                UPDATE {CLIENTS}
+                SET name = %s, company = %s, email = %s, phone = %s, address = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                RETURNING {CLIENT.select_list()}
+            """, (
+                body_data.get('name'),
+                body_data.get('company'),
+                body_data.get('email'),
+                body_data.get('phone'),
+                body_data.get('address'),
+                client_id
+            ))
+        except psycopg2.errors.UniqueViolation:
+            request.conn.rollback()
+            return request.error(409, 'Client with this email already exists')
+        request.conn.commit()
+        updated_client = cursor.fetchone()
+        if updated_client:
+            return request.respond(200, CLIENT.dumps_one(updated_client))
+
+    return request.error(400, 'Invalid request')
@@ -0,0 +1,215 @@
+'''
+Business: Маршруты функции clients - создание, чтение, обновление и удаление клиентов, в том числе массовые, поиск и слияние дублей
+Args: request - shared.router.Request; id/ids в GET - карточка клиента, иначе список или поиск
+Returns: HTTP response dict с данными клиента или списка клиентов
+'''
+import json
+from typing import Any, Dict
+
+import psycopg2.errors
+
+from shared.router import Request, Router
+from shared.pagination import parse_page, keyset_condition, split_page, page_headers
+from shared.prepared import execute_prepared
+from shared.bulk_import import read_records, import_clients
+from shared.bulk_clients import read_selection, read_changes, delete_clients, update_clients
+from shared.changes import parse_since, fetch_changes
+from shared.dedup import read_merge, find_duplicates, fetch_candidates, merge_clients
+from shared.serializers import CLIENT_ROW
+from shared.search import search_clients, parse_search_limit
+from shared.detail import (
+    parse_client_ids, parse_interactions_limit, fetch_client_detail, fetch_client_details,
+    fetch_client_detail_async, fetch_client_details_async
+)
+
+router = Router('clients', entity='clients', default_schema='t_p65639980_client_contact_manag', item_params=('id', 'ids'))
+
+CLIENTS = router.table('clients')
+
+
+@router.route('GET', 'clients', 'item')
+def get_clients(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor(dict_rows=True)
+    if params.get('ids'):
+        body = fetch_client_details(
+            cursor, parse_client_ids(params['ids']), parse_interactions_limit(params), request.schema
+        )
+        return request.respond(200, body)
+
+    body = fetch_client_detail(cursor, int(params['id']), parse_interactions_limit(params), request.schema)
+    if body:
+        return request.respond(200, body)
+    return request.error(404, 'Client not found')
+
+
+@router.async_route('GET', 'clients', 'item')
+async def get_clients_async(request: Request) -> Dict[str, Any]:
+    params = request.params
+    if params.get('ids'):
+        body = await fetch_client_details_async(
+            parse_client_ids(params['ids']), parse_interactions_limit(params), request.schema
+        )
+        return request.respond(200, body)
+
+    body = await fetch_client_detail_async(int(params['id']), parse_interactions_limit(params), request.schema)
+    if body:
+        return request.respond(200, body)
+    return request.error(404, 'Client not found')
+
+
+@router.route('GET', 'clients', 'list')
+def list_clients(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    serializer = CLIENT_ROW.project(params.get('fields'), extra=('created_at',))
+    search = params.get('search', '')
+    if search:
+        clients = search_clients(cursor, CLIENTS, search, parse_search_limit(params), serializer.select_list('c'))
+        next_cursor = None
+    else:
+        limit, after = parse_page(params, 2)
+        page_where, page_params = keyset_condition(('created_at', 'id'), after)
+        execute_prepared(
+            cursor,
+            f"""
+            SELECT {serializer.select_list()} FROM {CLIENTS}
+            WHERE {page_where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+            """,
+            (*page_params, limit + 1)
+        )
+        clients, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('created_at', 'id'))
+
+    return request.respond(200, serializer.dumps(clients), page_headers(next_cursor))
+
+
+@router.route('GET', 'clients', 'changes')
+def list_changes(request: Request) -> Dict[str, Any]:
+    params = request.params
+    serializer = CLIENT_ROW.project(params.get('fields'))
+    body = fetch_changes(
+        request.cursor(), 'clients', parse_since(params),
+        f'SELECT {serializer.select_list()} FROM {CLIENTS} WHERE id = ANY(%s)', serializer, request.schema
+    )
+    return request.respond(200, body)
+
+
+@router.route('POST', 'clients', 'import')
+def import_rows(request: Request) -> Dict[str, Any]:
+    result = import_clients(request.conn, read_records(request.event, request.params), request.schema)
+    return request.respond(200, json.dumps(result))
+
+
+@router.route('POST', 'clients', 'create')
+def create_client(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+
+    name = body_data.get('name', '').strip()
+    company = body_data.get('company', '').strip()
+    email = body_data.get('email', '').strip()
+    phone = body_data.get('phone', '').strip()
+    address = body_data.get('address', '').strip()
+
+    if not name:
+        return request.error(400, 'Name is required')
+
+    cursor = request.cursor(dict_rows=True)
+    try:
+        execute_prepared(
+            cursor,
+            f"""
+            INSERT INTO {CLIENTS}
+            (name, company, email, phone, address)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING *
+            """,
+            (name, company or None, email or None, phone or None, address or None)
+        )
+    except psycopg2.errors.UniqueViolation:
+        return request.error(409, 'Client with this email already exists')
+    return request.json(201, dict(cursor.fetchone()))
+
+
+@router.route('PUT', 'clients', 'update')
+def update_client(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    client_id = body_data.get('id')
+
+    if not client_id:
+        return request.error(400, 'Client ID is required')
+
+    name = body_data.get('name', '').strip()
+    company = body_data.get('company', '').strip()
+    email = body_data.get('email', '').strip()
+    phone = body_data.get('phone', '').strip()
+    address = body_data.get('address', '').strip()
+
+    cursor = request.cursor(dict_rows=True)
+    try:
+        execute_prepared(
+            cursor,
+            f"""
+            UPDATE {CLIENTS}
+            SET name = %s, company = %s, email = %s, phone = %s,
+                address = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            RETURNING *
+            """,
+            (name, company or None, email or None, phone or None, address or None, int(client_id))
+        )
+    except psycopg2.errors.UniqueViolation:
+        return request.error(409, 'Client with this email already exists')
+
+    updated_client = cursor.fetchone()
+    if updated_client:
+        return request.json(200, dict(updated_client))
+    return request.error(404, 'Client not found')
+
+
+@router.route('POST', 'clients', 'bulk-delete')
+def bulk_delete(request: Request) -> Dict[str, Any]:
+    where, where_params = read_selection(request.body, request.schema)
+    return request.json(200, delete_clients(request.conn, where, where_params, request.schema))
+
+
+@router.route('POST', 'clients', 'bulk-update')
+def bulk_update(request: Request) -> Dict[str, Any]:
+    where, where_params = read_selection(request.body, request.schema)
+    changes = read_changes(request.body)
+    return request.json(200, update_clients(request.conn, where, where_params, changes, request.schema))
+
+
+@router.route('GET', 'clients', 'duplicates')
+def list_duplicates(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    if params.get('id'):
+        return request.respond(200, find_duplicates(cursor, int(params['id']), CLIENT_ROW, request.schema))
+    body, next_cursor = fetch_candidates(cursor, params, CLIENT_ROW, request.schema)
+    return request.respond(200, body, page_headers(next_cursor))
+
+
+@router.route('POST', 'clients', 'merge')
+def merge(request: Request) -> Dict[str, Any]:
+    survivor_id, duplicate_ids = read_merge(request.body)
+    result = merge_clients(request.conn, survivor_id, duplicate_ids, CLIENT_ROW, request.schema)
+    if result is None:
+        return request.error(404, 'Client not found')
+    return request.json(200, result)
+
+
+@router.route('DELETE', 'clients', 'delete')
+def delete_client(request: Request) -> Dict[str, Any]:
+    client_id = request.params.get('id')
+
+    if not client_id:
+        return request.error(400, 'Client ID is required')
+
+    # Контакты и взаимодействия удаляются тем же оператором, что и клиент
+    result = delete_clients(request.conn, 'c.id = ANY(%s)', [[int(client_id)]], request.schema)
+
+    if result['deleted']['clients']:
+        return request.json(200, {'message': 'Client deleted successfully'})
+    return request.error(404, 'Client not found')
@@ -0,0 +1,158 @@
+'''
+Business: Маршруты функции contacts - CRUD операции с контактными лицами клиентов
+Args: request - shared.router.Request; id в GET - один контакт, client_id - контакты клиента
+Returns: HTTP response с данными контактов
+'''
+import json
+from typing import Any, Dict
+
+from shared.router import Request, Router
+from shared.pagination import parse_page, keyset_condition, split_page, page_headers
+from shared.prepared import execute_prepared
+from shared.bulk_import import read_records, import_contacts
+from shared.changes import parse_since, fetch_changes
+from shared.serializers import CONTACT_ROW
+
+router = Router('contacts', entity='contacts', default_schema='t_p65639980_client_contact_manag', item_params=('id',))
+
+CONTACTS = router.table('contacts')
+
+
+@router.route('GET', 'contacts', 'item')
+def get_contact(request: Request) -> Dict[str, Any]:
+    cursor = request.cursor(dict_rows=True)
+    execute_prepared(cursor, f"SELECT * FROM {CONTACTS} WHERE id = %s", (int(request.params['id']),))
+    contact = cursor.fetchone()
+    if contact:
+        return request.json(200, dict(contact))
+    return request.error(404, 'Contact not found')
+
+
+@router.route('GET', 'contacts', 'list')
+def list_contacts(request: Request) -> Dict[str, Any]:
+    params = request.params
+    cursor = request.cursor()
+    client_id = params.get('client_id')
+    serializer = CONTACT_ROW.project(params.get('fields'), extra=('is_primary', 'created_at'))
+    if client_id:
+        limit, after = parse_page(params, 3)
+        page_where, page_params = keyset_condition(('is_primary', 'created_at', 'id'), after)
+        execute_prepared(
+            cursor,
+            f"""
+            SELECT {serializer.select_list()} FROM {CONTACTS}
+            WHERE client_id = %s AND {page_where}
+            ORDER BY is_primary DESC, created_at DESC, id DESC
+            LIMIT %s
+            """,
+            (int(client_id), *page_params, limit + 1)
+        )
+        contacts, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('is_primary', 'created_at', 'id'))
+    else:
+        limit, after = parse_page(params, 2)
+        page_where, page_params = keyset_condition(('created_at', 'id'), after)
+        execute_prepared(
+            cursor,
+            f"""
+            SELECT {serializer.select_list()} FROM {CONTACTS}
+            WHERE {page_where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+            """,
+            (*page_params, limit + 1)
+        )
+        contacts, next_cursor = split_page(cursor.fetchall(), limit, serializer.key('created_at', 'id'))
+
+    return request.respond(200, serializer.dumps(contacts), page_headers(next_cursor))
+
+
+@router.route('GET', 'contacts', 'changes')
+def list_changes(request: Request) -> Dict[str, Any]:
+    params = request.params
+    serializer = CONTACT_ROW.project(params.get('fields'))
+    body = fetch_changes(
+        request.cursor(), 'contacts', parse_since(params),
+        f'SELECT {serializer.select_list()} FROM {CONTACTS} WHERE id = ANY(%s)', serializer, request.schema
+    )
+    return request.respond(200, body)
+
+
+@router.route('POST', 'contacts', 'import')
+def import_rows(request: Request) -> Dict[str, Any]:
+    result = import_contacts(request.conn, read_records(request.event, request.params), request.schema)
+    return request.respond(200, json.dumps(result))
+
+
+@router.route('POST', 'contacts', 'create')
+def create_contact(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+
+    client_id = body_data.get('client_id')
+    contact_person = body_data.get('contact_person', '').strip()
+    position = body_data.get('position', '').strip()
+    email = body_data.get('email', '').strip()
+    phone = body_data.get('phone', '').strip()
+    is_primary = body_data.get('is_primary') or False
+
+    if not client_id or not contact_person:
+        return request.error(400, 'client_id and contact_person are required')
+
+    cursor = request.cursor(dict_rows=True)
+    execute_prepared(
+        cursor,
+        f"""
+        INSERT INTO {CONTACTS}
+        (client_id, contact_person, position, email, phone, is_primary)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING *
+        """,
+        (int(client_id), contact_person, position or None, email or None, phone or None, is_primary)
+    )
+    return request.json(201, dict(cursor.fetchone()))
+
+
+@router.route('PUT', 'contacts', 'update')
+def update_contact(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    contact_id = body_data.get('id')
+
+    if not contact_id:
+        return request.error(400, 'Contact ID is required')
+
+    contact_person = body_data.get('contact_person', '').strip()
+    position = body_data.get('position', '').strip()
+    email = body_data.get('email', '').strip()
+    phone = body_data.get('phone', '').strip()
+    is_primary = body_data.get('is_primary') or False
+
+    cursor = request.cursor(dict_rows=True)
+    execute_prepared(
+        cursor,
+        f"""
+        UPDATE {CONTACTS}
+        SET contact_person = %s, position = %s, email = %s, phone = %s, is_primary = %s
+        WHERE id = %s
+        RETURNING *
+        """,
+        (contact_person, position or None, email or None, phone or None, is_primary, int(contact_id))
+    )
+
+    updated_contact = cursor.fetchone()
+    if updated_contact:
+        return request.json(200, dict(updated_contact))
+    return request.error(404, 'Contact not found')
+
+
+@router.route('DELETE', 'contacts', 'delete')
+def delete_contact(request: Request) -> Dict[str, Any]:
+    contact_id = request.params.get('id')
+
+    if not contact_id:
+        return request.error(400, 'Contact ID is required')
+
+    cursor = request.cursor(dict_rows=True)
+    execute_prepared(cursor, f"DELETE FROM {CONTACTS} WHERE id = %s RETURNING id", (int(contact_id),))
+
+    if cursor.fetchone():
+        return request.json(200, {'message': 'Contact deleted successfully'})
+    return request.error(404, 'Contact not found')
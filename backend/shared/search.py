@@ -0,0 +1,82 @@
+'''
+Business: Ранжированный поиск клиентов по имени, компании и email через индексы из V0002
+Args: cursor - курсор psycopg2, table - имя таблицы клиентов, search - строка поиска
+Returns: до limit строк клиентов, отсортированных по релевантности
+'''
+import re
+from typing import Any, Dict, List
+
+from shared.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+
+# Те же границы, что у страницы списка: поиск в интерфейсе - тот же список клиентов
+DEFAULT_SEARCH_LIMIT = DEFAULT_PAGE_SIZE
+MAX_SEARCH_LIMIT = MAX_PAGE_SIZE
+MAX_SEARCH_LENGTH = 100
+
+# Триграммный индекс обслуживает LIKE только для образцов от трёх символов
+MIN_TRIGRAM_LENGTH = 3
+
+SEARCH_TEXT_SQL = "lower(coalesce(c.name, '') || ' ' || coalesce(c.company, '') || ' ' || coalesce(c.email, ''))"
+SEARCH_VECTOR_SQL = "to_tsvector('simple', coalesce(c.name, '') || ' ' || coalesce(c.company, '') || ' ' || coalesce(c.email, ''))"
+
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def normalize_search(search: str) -> str:
+    return ' '.join(search.lower().split())[:MAX_SEARCH_LENGTH]
+
+
+def prefix_tsquery(term: str) -> str:
+    return ' & '.join(f'{word}:*' for word in _WORD_RE.findall(term))
+
+
+def like_pattern(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def parse_search_limit(params: Dict[str, Any]) -> int:
+    try:
+        limit = int(params.get('limit') or DEFAULT_SEARCH_LIMIT)
+    except (TypeError, ValueError):
+        raise InvalidCursor('limit must be an integer')
+    return max(1, min(limit, MAX_SEARCH_LIMIT))
+
+
+def search_clients(
+    cursor: Any, table: str, search: str, limit: int = DEFAULT_SEARCH_LIMIT, columns: str = 'c.*'
+) -> List[Any]:
+    term = normalize_search(search)
+    tsquery = prefix_tsquery(term)
+    use_trigram = len(term) >= MIN_TRIGRAM_LENGTH
+    if not term or not (tsquery or use_trigram):
+        return []
+
+    conditions = []
+    if tsquery:
+        conditions.append(f"{SEARCH_VECTOR_SQL} @@ to_tsquery('simple', %(tsquery)s)")
+    if use_trigram:
+        conditions.append(f'{SEARCH_TEXT_SQL} LIKE %(pattern)s')
+
+    rank = [f'similarity({SEARCH_TEXT_SQL}, %(term)s)']
+    if tsquery:
+        rank.append(f"ts_rank({SEARCH_VECTOR_SQL}, to_tsquery('simple', %(tsquery)s))")
+    # Совпадение начала имени важнее любого совпадения в середине строки
+    rank.append("CASE WHEN lower(c.name) LIKE %(prefix)s THEN 1 ELSE 0 END")
+
+    cursor.execute(
+        f"""
+        SELECT {columns} FROM {table} c
+        WHERE {' OR '.join(conditions)}
+        ORDER BY ({' + '.join(rank)}) DESC, c.created_at DESC, c.id DESC
+        LIMIT %(limit)s
+        """,
+        {
+            'tsquery': tsquery,
+            'pattern': like_pattern(term),
+            'prefix': like_pattern(term)[1:],
+            'term': term,
+            'limit': limit
+        }
+    )
+    return cursor.fetchall()
@@ -0,0 +1,196 @@
+'''
+Business: Сериализация строк PostgreSQL в JSON по заранее собранным схемам сущностей
+Args: rows - кортежи из обычного курсора psycopg2 в порядке Serializer.columns
+Returns: JSON-текст ответа; orjson используется, если установлен
+
+Одна схема на сущность задаёт и список колонок для SELECT, и ключи ответа:
+camelCase для crm-api, имена колонок для clients и contacts. Параметр fields списков
+сужает схему через Serializer.project - и SELECT, и ответ.
+'''
+import json
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# (колонка, ключ в camelCase, это дата/время)
+Field = Tuple[str, str, bool]
+
+CLIENT_FIELDS: Sequence[Field] = (
+    ('id', 'id', False),
+    ('name', 'name', False),
+    ('company', 'company', False),
+    ('email', 'email', False),
+    ('phone', 'phone', False),
+    ('address', 'address', False),
+    ('created_at', 'createdAt', True),
+    ('updated_at', 'updatedAt', True)
+)
+
+CONTACT_FIELDS: Sequence[Field] = (
+    ('id', 'id', False),
+    ('client_id', 'clientId', False),
+    ('contact_person', 'contactPerson', False),
+    ('position', 'position', False),
+    ('email', 'email', False),
+    ('phone', 'phone', False),
+    ('is_primary', 'isPrimary', False),
+    ('created_at', 'createdAt', True),
+    ('updated_at', 'updatedAt', True)
+)
+
+INTERACTION_FIELDS: Sequence[Field] = (
+    ('id', 'id', False),
+    ('client_id', 'clientId', False),
+    ('client_name', 'clientName', False),
+    ('interaction_type', 'interactionType', False),
+    ('description', 'description', False),
+    ('interaction_date', 'interactionDate', True),
+    ('created_by', 'createdBy', False),
+    ('updated_at', 'updatedAt', True)
+)
+
+# Строка таблицы interactions целиком - для карточки клиента в clients
+INTERACTION_TABLE_FIELDS: Sequence[Field] = (
+    ('id', 'id', False),
+    ('client_id', 'clientId', False),
+    ('interaction_type', 'interactionType', False),
+    ('description', 'description', False),
+    ('interaction_date', 'interactionDate', True),
+    ('created_by', 'createdBy', False),
+    ('created_at', 'createdAt', True),
+    ('updated_at', 'updatedAt', True)
+)
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+class Serializer:
+    '''
+    camel=False повторяет прежний формат clients и contacts (json.dumps(default=str)):
+    ключи - имена колонок, дата и время через пробел.
+    hidden - колонки в конце SELECT, которых нет в ответе: zip по ключам их отбрасывает.
+    '''
+
+    def __init__(self, fields: Sequence[Field], camel: bool = True, hidden: Sequence[Field] = ()):
+        self.fields = tuple(fields)
+        self.camel = camel
+        self.columns = tuple(column for column, _, _ in (*fields, *hidden))
+        self.keys = tuple(key if camel else column for column, key, _ in fields)
+        self.temporal = tuple(i for i, (_, _, is_temporal) in enumerate(fields) if is_temporal)
+        self.datetime_sep = 'T' if camel else ' '
+        self._index = {column: i for i, column in enumerate(self.columns)}
+        self._projections: Dict[Tuple[Any, ...], 'Serializer'] = {}
+
+    def project(self, names: Optional[str], always: Sequence[str] = ('id',), extra: Sequence[str] = ()) -> 'Serializer':
+        '''
+        Сериализатор для ?fields=a,b: только запрошенные поля плюс always - по ним
+        считаются теги кэша. extra - колонки курсора страницы: выбираются, но не выводятся.
+        '''
+        if not names:
+            return self
+        requested = {name.strip() for name in names.split(',') if name.strip()}
+        by_key = dict(zip(self.keys, self.columns))
+        unknown = sorted(requested - set(by_key))
+        if unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(self.keys)}")
+        wanted = {by_key[key] for key in requested} | set(always)
+        projection_key = (frozenset(wanted), tuple(extra))
+        projection = self._projections.get(projection_key)
+        if projection is None:
+            projection = Serializer(
+                [field for field in self.fields if field[0] in wanted],
+                self.camel,
+                [field for field in self.fields if field[0] in extra and field[0] not in wanted]
+            )
+            self._projections[projection_key] = projection
+        return projection
+
+    def select_list(self, alias: str = '', expressions: Optional[Mapping[str, str]] = None) -> str:
+        expressions = expressions or {}
+        prefix = f'{alias}.' if alias else ''
+        return ', '.join(
+            f'{expressions[column]} AS {column}' if column in expressions else f'{prefix}{column}'
+            for column in self.columns
+        )
+
+    def json_sql(self, alias: str, extra: Optional[Mapping[str, str]] = None) -> str:
+        '''
+        Тот же объект, собранный в PostgreSQL: json, а не jsonb, чтобы ключи шли в порядке схемы,
+        дата и время - как в isoformat(sep) у _plain_rows, без дробной части на целой секунде.
+        extra - ключи после полей схемы со своими SQL-выражениями (вложенные списки).
+        '''
+        sep = '"T"' if self.datetime_sep == 'T' else ' '
+        pairs = []
+        for (column, _, is_temporal), key in zip(self.fields, self.keys):
+            value = f'{alias}.{column}'
+            if is_temporal:
+                value = (
+                    f"to_char({value}, 'YYYY-MM-DD{sep}HH24:MI:SS') || "
+                    f"CASE WHEN {value} = date_trunc('second', {value}) THEN '' ELSE to_char({value}, '.US') END"
+                )
+            pairs.append(f"'{key}', {value}")
+        pairs.extend(f"'{key}', {value}" for key, value in (extra or {}).items())
+        return f"json_build_object({', '.join(pairs)})"
+
+    def key(self, *columns: str) -> Callable[[Sequence[Any]], Tuple[Any, ...]]:
+        getter = itemgetter(*(self._index[column] for column in columns))
+        if len(columns) == 1:
+            return lambda row: (getter(row),)
+        return getter
+
+    def _plain_rows(self, rows: Iterable[Sequence[Any]]) -> Iterable[Sequence[Any]]:
+        if not self.temporal:
+            return rows
+        temporal = self.temporal
+        sep = self.datetime_sep
+        converted = []
+        for row in rows:
+            row = list(row)
+            for i in temporal:
+                value = row[i]
+                if value is not None:
+                    row[i] = value.isoformat(sep) if isinstance(value, datetime) else value.isoformat()
+            converted.append(row)
+        return converted
+
+    def to_dicts(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        keys = self.keys
+        return [dict(zip(keys, row)) for row in self._plain_rows(rows)]
+
+    def to_dict(self, row: Sequence[Any]) -> Dict[str, Any]:
+        return self.to_dicts([row])[0]
+
+    def from_mapping(self, record: Mapping[str, Any]) -> Tuple[Any, ...]:
+        return tuple(record.get(column) for column in self.columns)
+
+    def dumps(self, rows: Iterable[Sequence[Any]]) -> str:
+        if orjson is not None and self.datetime_sep == 'T':
+            # orjson сам пишет datetime в ISO 8601 без обратных вызовов в Python
+            keys = self.keys
+            return orjson.dumps([dict(zip(keys, row)) for row in rows]).decode('utf-8')
+        return dumps(self.to_dicts(rows))
+
+    def dumps_one(self, row: Sequence[Any]) -> str:
+        return dumps(self.to_dict(row))
+
+
+def dumps(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data)
+
+
+CLIENT = Serializer(CLIENT_FIELDS)
+CONTACT = Serializer(CONTACT_FIELDS)
+INTERACTION = Serializer(INTERACTION_FIELDS)
+
+CLIENT_ROW = Serializer(CLIENT_FIELDS, camel=False)
+CONTACT_ROW = Serializer(CONTACT_FIELDS, camel=False)
+INTERACTION_ROW = Serializer(INTERACTION_TABLE_FIELDS, camel=False)
@@ -0,0 +1,163 @@
+'''
+Business: Склейка одинаковых параллельных GET в тёплом процессе - один запрос в базу и одно тело ответа на всех
+Args: SINGLE_FLIGHT (on/off), SINGLE_FLIGHT_TIMEOUT - переменные окружения
+Returns: декоратор single_flight для handler; X-Single-Flight (leader/follower) и X-Single-Flight-Stats в ответе
+
+Ключ - функция + сущность + отсортированные параметры, как у кэша ответов, плюс If-None-Match
+и X-Db-Lsn: от них зависит, будет ли ответ 304 и с какого узла базы он читается. Первый вызов
+с ключом (ведущий) выполняет handler, остальные ждут его и получают копию ответа со своими
+заголовками. Декоратор стоит снаружи кэша: промах кэша у десятка одинаковых вызовов
+превращается в один запрос к базе и одну запись в кэш.
+Ведомый присоединяется только к вызову, начатому после последней записи этого процесса, -
+иначе он мог бы получить снимок без своей только что зафиксированной записи.
+'''
+import os
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+from shared.cache import cache_key
+from shared.etag import request_header
+
+DEFAULT_TIMEOUT = 10.0
+
+SINGLE_FLIGHT_HEADER = 'X-Single-Flight'
+SINGLE_FLIGHT_STATS_HEADER = 'X-Single-Flight-Stats'
+
+# Выгрузку не держим в памяти дважды и не раздаём одним телом: она большая и редкая
+EXCLUDED_ACTIONS = {'export'}
+
+
+def enabled() -> bool:
+    return os.environ.get('SINGLE_FLIGHT', 'on') != 'off'
+
+
+class _Flight:
+    __slots__ = ('done', 'response')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[Dict[str, Any]] = None
+
+
+class SingleFlight:
+    '''
+    Таблица вызовов в полёте. Ведущий убирает свой ключ до того, как разбудить ведомых,
+    поэтому пришедший позже вызов начинает новый полёт, а не читает готовый ответ.
+    '''
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._write_epoch = 0
+        self.leaders = 0
+        self.collapsed = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def note_write(self) -> None:
+        with self._lock:
+            self._write_epoch += 1
+
+    def run(self, key: str, call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            key = f'{self._write_epoch}|{key}'
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            try:
+                flight.response = call()
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return _tagged(flight.response, 'leader', self.stats_header())
+
+        # Ведущий упал или завис - ведомый выполняет свой вызов сам
+        if not flight.done.wait(self.timeout) or flight.response is None:
+            with self._lock:
+                if flight.done.is_set():
+                    self.failures += 1
+                else:
+                    self.timeouts += 1
+            return call()
+        with self._lock:
+            self.collapsed += 1
+        return _tagged(flight.response, 'follower', self.stats_header())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.leaders + self.collapsed
+            return {
+                'leaders': self.leaders,
+                'collapsed': self.collapsed,
+                'collapseRatio': round(self.collapsed / calls, 4) if calls else 0.0,
+                'timeouts': self.timeouts,
+                'failures': self.failures,
+                'inFlight': len(self._flights)
+            }
+
+    def stats_header(self) -> str:
+        stats = self.stats()
+        return ';'.join(f'{key}={stats[key]}' for key in ('leaders', 'collapsed', 'collapseRatio', 'inFlight'))
+
+
+def _tagged(response: Dict[str, Any], role: str, stats: str) -> Dict[str, Any]:
+    '''
+    Копия ответа для одного вызова: внешние декораторы пишут в неё свои заголовки.
+    '''
+    return {
+        **response,
+        'headers': {**response.get('headers', {}), SINGLE_FLIGHT_HEADER: role, SINGLE_FLIGHT_STATS_HEADER: stats}
+    }
+
+
+_flights: Optional[SingleFlight] = None
+_flights_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _flights
+    if _flights is None:
+        with _flights_lock:
+            if _flights is None:
+                _flights = SingleFlight(float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', DEFAULT_TIMEOUT)))
+    return _flights
+
+
+def single_flight(namespace: str, entity: Optional[str] = None) -> Callable:
+    '''
+    entity=None - сущность берётся из параметра entity, как в crm-api.
+    '''
+    def decorate(handler: Callable) -> Callable:
+        @wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            if not enabled() or method == 'OPTIONS':
+                return handler(event, context)
+
+            flights = get_single_flight()
+            params = event.get('queryStringParameters') or {}
+            if method != 'GET':
+                try:
+                    return handler(event, context)
+                finally:
+                    flights.note_write()
+            if params.get('action') in EXCLUDED_ACTIONS:
+                return handler(event, context)
+
+            key = '|'.join([
+                cache_key(namespace, entity or params.get('entity', 'clients'), params),
+                request_header(event, 'If-None-Match') or '',
+                request_header(event, 'X-Db-Lsn') or ''
+            ])
+            return flights.run(key, lambda: handler(event, context))
+        return wrapper
+    return decorate
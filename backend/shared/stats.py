@@ -0,0 +1,71 @@
+'''
+Business: Чтение счётчиков дашборда из crm_stats и crm_stats_daily (миграции V0003, V0010)
+Args: cursor - курсор psycopg2 с RealDictCursor
+Returns: dict со статистикой в формате ответа action=stats
+'''
+from typing import Any, Dict
+
+from shared import async_db
+
+STATS_WINDOW_DAYS = 30
+
+
+def fetch_dashboard_stats(cursor: Any, schema: str = '') -> Dict[str, int]:
+    '''
+    Сумма полос счётчиков (V0010) плюс дневные корзины за окно - время ответа
+    не зависит от размера clients и interactions.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    cursor.execute(f"""
+        SELECT
+            s.total_clients,
+            s.clients_with_email,
+            COALESCE(w.new_clients, 0) AS new_clients,
+            COALESCE(w.interactions, 0) AS recent_interactions
+        FROM (
+            SELECT SUM(total_clients) AS total_clients, SUM(clients_with_email) AS clients_with_email
+            FROM {prefix}crm_stats
+        ) s
+        CROSS JOIN (
+            SELECT SUM(new_clients) AS new_clients, SUM(interactions) AS interactions
+            FROM {prefix}crm_stats_daily
+            WHERE day >= CURRENT_DATE - %s
+        ) w
+    """, (STATS_WINDOW_DAYS,))
+    row = cursor.fetchone()
+    if row is None or row['total_clients'] is None:
+        return {'totalClients': 0, 'newClients': 0, 'clientsWithEmail': 0, 'totalInteractions': 0}
+    return {
+        'totalClients': int(row['total_clients']),
+        'newClients': int(row['new_clients']),
+        'clientsWithEmail': int(row['clients_with_email']),
+        'totalInteractions': int(row['recent_interactions'])
+    }
+
+
+async def fetch_dashboard_stats_async(schema: str = '') -> Dict[str, int]:
+    '''
+    Те же два агрегата отдельными запросами на двух соединениях через asyncio.gather.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    totals, window = await async_db.gather(
+        async_db.fetchrow(f"""
+            SELECT SUM(total_clients) AS total_clients, SUM(clients_with_email) AS clients_with_email
+            FROM {prefix}crm_stats
+        """),
+        async_db.fetchrow(f"""
+            SELECT
+                COALESCE(SUM(new_clients), 0) AS new_clients,
+                COALESCE(SUM(interactions), 0) AS recent_interactions
+            FROM {prefix}crm_stats_daily
+            WHERE day >= CURRENT_DATE - %s::integer
+        """, (STATS_WINDOW_DAYS,))
+    )
+    if totals is None or totals['total_clients'] is None:
+        return {'totalClients': 0, 'newClients': 0, 'clientsWithEmail': 0, 'totalInteractions': 0}
+    return {
+        'totalClients': int(totals['total_clients']),
+        'newClients': int(window['new_clients']),
+        'clientsWithEmail': int(totals['clients_with_email']),
+        'totalInteractions': int(window['recent_interactions'])
+    }
@@ -0,0 +1,143 @@
+'''
+Business: Таймлайн взаимодействий для графиков - число взаимодействий по дням, неделям или месяцам с разбивкой по типу и автору
+Args: bucket (day/week/month), from и to (YYYY-MM-DD, включительно), clientId - только взаимодействия клиента
+Returns: {"bucket", "from", "to", "clientId", "total", "buckets": [{"start", "total", "byType", "byCreator"}]}
+
+Границы выравниваются по корзинам: from - на начало своей корзины, to - на конец. Неделя
+начинается с понедельника, как date_trunc('week'). Пустые корзины тоже приходят, с нулями,
+чтобы ось графика была непрерывной. Общий таймлайн читается из дневных счётчиков
+crm_interactions_daily (миграции V0009, V0012 - полосы суммируются группировкой), таймлайн клиента - из interactions по индексу клиента.
+'''
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.serializers import dumps
+
+BUCKETS = ('day', 'week', 'month')
+DEFAULT_BUCKET = 'day'
+# Окно по умолчанию, в корзинах: месяц по дням, квартал по неделям, год по месяцам
+DEFAULT_SPAN = {'day': 30, 'week': 13, 'month': 12}
+MAX_BUCKETS = 400
+
+
+class InvalidTimelineRequest(ValueError):
+    pass
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, bucket: str) -> date:
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def _parse_date(params: Dict[str, Any], name: str) -> Optional[date]:
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidTimelineRequest(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def read_range(params: Dict[str, Any], today: date) -> Tuple[str, List[date], date]:
+    '''
+    Корзина, начала всех корзин диапазона и конец диапазона (не включительно).
+    '''
+    bucket = params.get('bucket') or DEFAULT_BUCKET
+    if bucket not in BUCKETS:
+        raise InvalidTimelineRequest(f"bucket must be one of: {', '.join(BUCKETS)}")
+    last = bucket_start(_parse_date(params, 'to') or today, bucket)
+    first = _parse_date(params, 'from')
+    if first is None:
+        first = last
+        for _ in range(DEFAULT_SPAN[bucket] - 1):
+            first = bucket_start(first - timedelta(days=1), bucket)
+    first = bucket_start(first, bucket)
+    if first > last:
+        raise InvalidTimelineRequest('from must not be later than to')
+
+    starts = [first]
+    while starts[-1] < last:
+        if len(starts) == MAX_BUCKETS:
+            raise InvalidTimelineRequest(f'Timeline is limited to {MAX_BUCKETS} buckets, use a larger bucket')
+        starts.append(next_bucket(starts[-1], bucket))
+    return bucket, starts, next_bucket(last, bucket)
+
+
+def read_client_id(params: Dict[str, Any]) -> Optional[int]:
+    value = params.get('clientId') or params.get('client_id')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidTimelineRequest('clientId must be an integer')
+
+
+def _breakdown(counts: Dict[Optional[str], int], name: str) -> List[Dict[str, Any]]:
+    return [
+        {name: key, 'count': count}
+        for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0] or ''))
+    ]
+
+
+def fetch_timeline(cursor: Any, params: Dict[str, Any], schema: str = '') -> str:
+    '''
+    Одна группировка (корзина, тип, автор) в SQL, разбивки по типу и по автору складываются здесь.
+    '''
+    prefix = f'{schema}.' if schema else ''
+    client_id = read_client_id(params)
+    cursor.execute('SELECT CURRENT_DATE')
+    bucket, starts, end = read_range(params, cursor.fetchone()[0])
+
+    if client_id is None:
+        cursor.execute(f"""
+            SELECT date_trunc(%s, day)::date, interaction_type, NULLIF(created_by, ''), SUM(interactions)
+            FROM {prefix}crm_interactions_daily
+            WHERE day >= %s AND day < %s
+            GROUP BY 1, 2, 3
+            HAVING SUM(interactions) > 0
+        """, (bucket, starts[0], end))
+    else:
+        cursor.execute(f"""
+            SELECT date_trunc(%s, interaction_date)::date, interaction_type, created_by, COUNT(*)
+            FROM {prefix}interactions
+            WHERE client_id = %s AND interaction_date >= %s AND interaction_date < %s
+            GROUP BY 1, 2, 3
+        """, (bucket, client_id, starts[0], end))
+
+    by_type: Dict[date, Dict[str, int]] = {start: {} for start in starts}
+    by_creator: Dict[date, Dict[Optional[str], int]] = {start: {} for start in starts}
+    for start, interaction_type, created_by, count in cursor.fetchall():
+        count = int(count)
+        by_type[start][interaction_type] = by_type[start].get(interaction_type, 0) + count
+        by_creator[start][created_by] = by_creator[start].get(created_by, 0) + count
+
+    buckets = [
+        {
+            'start': start.isoformat(),
+            'total': sum(by_type[start].values()),
+            'byType': _breakdown(by_type[start], 'interactionType'),
+            'byCreator': _breakdown(by_creator[start], 'createdBy')
+        }
+        for start in starts
+    ]
+    return dumps({
+        'bucket': bucket,
+        'from': starts[0].isoformat(),
+        'to': (end - timedelta(days=1)).isoformat(),
+        'clientId': client_id,
+        'total': sum(item['total'] for item in buckets),
+        'buckets': buckets
+    })
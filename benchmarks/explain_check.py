@@ -0,0 +1,295 @@
+'''
+Business: Проверка планов - каждый SQL обработчиков crm-api, clients и contacts идёт по индексу, без Seq Scan и Sort
+Args: --dsn (или BENCH_DATABASE_URL) - база после benchmarks/seed.py --clients 10000 и больше; --verbose - печатать все планы
+Returns: код выхода 1 и список запросов с Seq Scan или Sort в плане, 0 - если все планы чистые
+
+SQL не выписывается вручную: скрипт вызывает handler каждой функции типовыми событиями
+(списки, карточки, поиск, статистика, создание, правка, удаление, пакетные операции) и
+берёт запросы с планами из журнала медленных запросов shared.instrumentation:
+SLOW_QUERY_MS=0 и SLOW_QUERY_EXPLAIN=1 пишут в журнал каждый запрос вместе с
+EXPLAIN ANALYZE. Новый маршрут попадает в проверку, как только для него добавлено событие.
+Записи создают и удаляют свои строки, а EXPLAIN ANALYZE откатывается.
+'''
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import psycopg2
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from seed import bench_dsn
+
+# Строка узла плана: "Limit  (cost=...", "  ->  Seq Scan on clients c  (cost=..."
+NODE_RE = re.compile(r'^(\s*(?:->\s+)?)(\S.*?)\s+\(cost=')
+
+# Сортировка вычисленных строк (массивы запроса, результат CTE) от индекса не зависит
+COMPUTED_INPUTS = ('CTE Scan', 'Function Scan', 'Values Scan', 'Result')
+
+# Таблицы по строке на сущность и временные таблицы импорта: полный просмотр и есть самый дешёвый
+EXEMPT_TABLES = {'crm_stats', 'crm_versions', 'import_clients_staging', 'import_contacts_staging'}
+
+# Секция interactions меньше этого - несколько страниц, Seq Scan по ней не считается нарушением
+SMALL_PARTITION_ROWS = 500
+
+# Маршрут -> узлы, которые в его планах ожидаемы, и почему
+EXPECTED = {
+    'GET clients/export': ({'Seq Scan'}, 'выгрузка читает таблицу целиком'),
+    'GET contacts/export': ({'Seq Scan'}, 'выгрузка читает таблицу целиком'),
+    'GET interactions/export': ({'Seq Scan'}, 'выгрузка читает таблицу целиком'),
+    'GET clients/list?search': ({'Sort'}, 'порядок по релевантности считается по найденным строкам'),
+    'GET clients/item?ids': ({'Sort'}, 'карточки идут в порядке ids из запроса'),
+    'GET clients/changes': ({'Sort'}, 'строки ленты с отметки группируются по row_id - сортируется окно изменений, а не таблица'),
+    'GET contacts/changes': ({'Sort'}, 'строки ленты с отметки группируются по row_id - сортируется окно изменений, а не таблица'),
+    'GET interactions/changes': ({'Sort'}, 'строки ленты с отметки группируются по row_id - сортируется окно изменений, а не таблица'),
+    'GET clients/duplicates?id': ({'Sort'}, 'кандидаты сортируются по score, который считает crm_client_duplicates'),
+    'POST clients/merge': ({'Sort'}, 'основной контакт выбирается среди основных контактов сливаемых клиентов'),
+    'GET interactions/timeline': ({'Sort'}, 'группировка по корзине date_trunc сортирует строки диапазона, а не таблицу'),
+    'GET interactions/timeline?clientId': ({'Sort'}, 'группировка по корзине date_trunc сортирует строки клиента за диапазон'),
+}
+
+Event = Dict[str, Any]
+
+
+def get(params: Dict[str, Any]) -> Event:
+    return {'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {}, 'body': ''}
+
+
+def send(method: str, body: Any, params: Optional[Dict[str, Any]] = None) -> Event:
+    return {'httpMethod': method, 'queryStringParameters': params or {}, 'headers': {}, 'body': json.dumps(body)}
+
+
+def load_handler(function: str) -> Callable:
+    path = os.path.join(BACKEND_DIR, function, 'index.py')
+    spec = importlib.util.spec_from_file_location(f"explain_{function.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+class Collector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.entries: List[Dict[str, Any]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        entry = json.loads(record.getMessage())
+        if entry.get('event') == 'slow_query':
+            self.entries.append(entry)
+
+
+def sample_ids(dsn: str) -> Tuple[int, int]:
+    with psycopg2.connect(bench_dsn(dsn)) as conn, conn.cursor() as cursor:
+        cursor.execute('SELECT client_id FROM contacts ORDER BY id LIMIT 1')
+        client_id = cursor.fetchone()[0]
+        cursor.execute('SELECT id FROM contacts WHERE client_id = %s ORDER BY id LIMIT 1', (client_id,))
+        return client_id, cursor.fetchone()[0]
+
+
+def run_events(handlers: Dict[str, Callable], client_id: int, contact_id: int, collector: Collector) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    '''
+    События идут по порядку: записи в конце удаляют то, что создали.
+    Возвращает (метка события, записи журнала этого события).
+    '''
+    results: List[Tuple[str, List[Dict[str, Any]]]] = []
+
+    def call(label: str, function: str, event: Event) -> Dict[str, Any]:
+        start = len(collector.entries)
+        response = handlers[function](event, None)
+        if response['statusCode'] >= 400:
+            raise RuntimeError(f"{label}: HTTP {response['statusCode']} {response['body'][:200]}")
+        results.append((label, collector.entries[start:]))
+        return response
+
+    cid, tid = str(client_id), str(contact_id)
+    after_client = call('crm-api GET clients/list', 'crm-api', get({'entity': 'clients', 'limit': '5'}))
+    call('crm-api GET clients/list?cursor', 'crm-api', get({
+        'entity': 'clients', 'limit': '5', 'cursor': after_client['headers']['X-Next-Cursor']
+    }))
+    call('crm-api GET clients/list?search', 'crm-api', get({'entity': 'clients', 'search': 'Лебедев 7'}))
+    call('crm-api GET clients/stats', 'crm-api', get({'entity': 'clients', 'action': 'stats'}))
+    call('crm-api GET contacts/list', 'crm-api', get({'entity': 'contacts', 'limit': '5'}))
+    call('crm-api GET contacts/list?clientId', 'crm-api', get({'entity': 'contacts', 'clientId': cid}))
+    after_interaction = call('crm-api GET interactions/list', 'crm-api', get({'entity': 'interactions', 'limit': '5'}))
+    call('crm-api GET interactions/list?cursor', 'crm-api', get({
+        'entity': 'interactions', 'limit': '5', 'cursor': after_interaction['headers']['X-Next-Cursor']
+    }))
+    # Страница меньше истории клиента: иначе планировщик честно сортирует все его строки
+    call('crm-api GET interactions/list?clientId', 'crm-api', get({
+        'entity': 'interactions', 'clientId': cid, 'limit': '5'
+    }))
+    call('crm-api GET interactions/list?fields', 'crm-api', get({
+        'entity': 'interactions', 'limit': '5', 'fields': 'interactionType'
+    }))
+    call('crm-api GET interactions/timeline', 'crm-api', get({
+        'entity': 'interactions', 'action': 'timeline', 'bucket': 'week'
+    }))
+    call('crm-api GET interactions/timeline?clientId', 'crm-api', get({
+        'entity': 'interactions', 'action': 'timeline', 'bucket': 'month', 'clientId': cid
+    }))
+    for entity in ('clients', 'contacts', 'interactions'):
+        call(f'crm-api GET {entity}/export', 'crm-api', get({'entity': entity, 'action': 'export'}))
+
+    call('clients GET clients/list', 'clients', get({'limit': '5'}))
+    call('clients GET clients/list?search', 'clients', get({'search': 'Компания 42'}))
+    call('clients GET clients/item', 'clients', get({'id': cid}))
+    call('clients GET clients/item?ids', 'clients', get({'ids': f'{cid},{client_id + 1},{client_id + 2}'}))
+    call('contacts GET contacts/list', 'contacts', get({'limit': '5'}))
+    call('contacts GET contacts/list?client_id', 'contacts', get({'client_id': cid}))
+    call('contacts GET contacts/item', 'contacts', get({'id': tid}))
+
+    mark = json.loads(call('crm-api GET clients/changes?since=0', 'crm-api', get({
+        'entity': 'clients', 'action': 'changes', 'since': '0'
+    }))['body'])['next']
+    created = json.loads(call('crm-api POST clients/create', 'crm-api', send('POST', {
+        'name': 'Explain Check', 'company': 'Explain Check Ltd', 'email': 'explain-check@example.com'
+    }, {'entity': 'clients'}))['body'])
+    new_id = created['id']
+    call('crm-api PUT clients/update', 'crm-api', send('PUT', {**created, 'phone': '+70000000000'}, {'entity': 'clients'}))
+    call('clients PUT clients/update', 'clients', send('PUT', {'id': new_id, 'name': 'Explain Check', 'company': 'Explain Check Ltd'}))
+    contact = json.loads(call('crm-api POST contacts/create', 'crm-api', send('POST', {
+        'clientId': new_id, 'contactPerson': 'Explain Contact'
+    }, {'entity': 'contacts'}))['body'])
+    call('contacts PUT contacts/update', 'contacts', send('PUT', {'id': contact['id'], 'contact_person': 'Explain Contact'}))
+    call('contacts POST contacts/create', 'contacts', send('POST', {'client_id': new_id, 'contact_person': 'Second'}))
+    call('crm-api POST interactions/create', 'crm-api', send('POST', {
+        'clientId': new_id, 'interactionType': 'note'
+    }, {'entity': 'interactions'}))
+    call('crm-api POST interactions/batch', 'crm-api', send('POST', [
+        {'clientId': new_id, 'interactionType': 'call'}, {'clientId': new_id, 'interactionType': 'email'}
+    ], {'entity': 'interactions', 'action': 'batch'}))
+    call('contacts DELETE contacts/delete', 'contacts', {
+        'httpMethod': 'DELETE', 'queryStringParameters': {'id': str(contact['id'])}, 'headers': {}, 'body': ''
+    })
+    twin = json.loads(call('clients POST clients/create', 'clients', send('POST', {
+        'name': 'Explain Check Twin', 'phone': '+7 000 000-00-00'
+    }))['body'])
+    call('crm-api GET clients/duplicates?id', 'crm-api', get({'entity': 'clients', 'action': 'duplicates', 'id': str(new_id)}))
+    call('clients GET clients/duplicates', 'clients', get({'action': 'duplicates', 'limit': '5'}))
+    call('crm-api POST clients/merge', 'crm-api', send('POST', {
+        'survivorId': new_id, 'duplicateIds': [twin['id']]
+    }, {'entity': 'clients', 'action': 'merge'}))
+    # Дельта ленты после записей выше: окно отметки и дочитывание строк по id
+    for entity in ('clients', 'contacts', 'interactions'):
+        call(f'crm-api GET {entity}/changes', 'crm-api', get({'entity': entity, 'action': 'changes', 'since': str(mark)}))
+    call('clients GET clients/changes', 'clients', get({'action': 'changes', 'since': str(mark)}))
+    call('contacts GET contacts/changes', 'contacts', get({'action': 'changes', 'since': str(mark)}))
+    call('crm-api POST clients/bulk-update', 'crm-api', send('POST', {
+        'filter': {'company': 'Explain Check Ltd'}, 'set': {'address': 'Explain street'}
+    }, {'entity': 'clients', 'action': 'bulk-update'}))
+    call('clients POST clients/bulk-delete?filter', 'clients', send('POST', {
+        'filter': {'created_before': '2000-01-01'}
+    }, {'action': 'bulk-delete'}))
+    call('clients DELETE clients/delete', 'clients', {
+        'httpMethod': 'DELETE', 'queryStringParameters': {'id': str(new_id)}, 'headers': {}, 'body': ''
+    })
+    return results
+
+
+def plan_nodes(plan: str) -> List[Tuple[int, str]]:
+    '''
+    (отступ, узел) в порядке плана; потомки узла идут за ним с большим отступом.
+    '''
+    nodes = []
+    for line in plan.splitlines():
+        match = NODE_RE.match(line)
+        if match:
+            nodes.append((len(match.group(1)), match.group(2)))
+    return nodes
+
+
+def violations(label: str, plan: str, small_tables: Set[str]) -> List[str]:
+    route = label.split(' ', 1)[1]
+    allowed, _ = EXPECTED.get(route, (set(), ''))
+    nodes = plan_nodes(plan)
+    found = []
+    for position, (indent, node) in enumerate(nodes):
+        if node.startswith('Seq Scan on '):
+            table = node.split()[3]
+            # Пустые секции interactions на месяцы вперёд и крошечные секции планировщик
+            # честно читает целиком - это дешевле индекса и от формы запроса не зависит
+            if 'Seq Scan' not in allowed and table not in EXEMPT_TABLES and table not in small_tables:
+                found.append(node)
+        elif node in ('Sort', 'Incremental Sort') and 'Sort' not in allowed:
+            child = next((name for depth, name in nodes[position + 1:] if depth > indent), '')
+            if not child.startswith(COMPUTED_INPUTS):
+                found.append(f'{node} over {child}')
+    return found
+
+
+def small_tables(dsn: str) -> Set[str]:
+    '''
+    Пустые таблицы и секции interactions меньше SMALL_PARTITION_ROWS строк (по reltuples после
+    VACUUM ANALYZE в seed.py). Снимок берётся до событий: их записи попадают в секцию
+    текущего месяца, которая после seed.py пуста.
+    '''
+    with psycopg2.connect(bench_dsn(dsn)) as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_class c
+            JOIN pg_class parent ON parent.oid = 'clients'::regclass
+            WHERE c.relkind = 'r'
+              AND c.relnamespace = parent.relnamespace
+              AND (pg_relation_size(c.oid) = 0 OR (c.relispartition AND c.reltuples < %s))
+        """, (SMALL_PARTITION_ROWS,))
+        return {name for (name,) in cursor.fetchall()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL is required')
+
+    os.environ.update({
+        'DATABASE_URL': bench_dsn(args.dsn),
+        'SLOW_QUERY_MS': '0',
+        'SLOW_QUERY_EXPLAIN': '1',
+        # Без PREPARE в журнал попадает сам текст запроса, а не EXECUTE crm_<хэш>
+        'PREPARED_STATEMENTS': 'off',
+        'CACHE_BACKEND': 'off',
+        'ASYNC_DB': 'off',
+        'INTERACTIONS_GROUP_COMMIT_MS': '0'
+    })
+    handlers = {function: load_handler(function) for function in ('crm-api', 'clients', 'contacts')}
+    # Журнал нужен только сборщику: обработчик stdout из shared.instrumentation заменяется
+    collector = Collector()
+    logging.getLogger('crm').handlers = [collector]
+    client_id, contact_id = sample_ids(args.dsn)
+    small = small_tables(args.dsn)
+
+    events = run_events(handlers, client_id, contact_id, collector)
+
+    failed = 0
+    checked = 0
+    for label, entries in events:
+        for entry in entries:
+            plan = entry.get('plan') or ''
+            if plan.startswith('EXPLAIN failed') or not plan:
+                # COPY и служебные команды EXPLAIN не принимает
+                continue
+            checked += 1
+            bad = violations(label, plan, small)
+            if bad or args.verbose:
+                print(f"{'FAIL' if bad else 'ok  '} {label}: {', '.join(bad)}")
+                print(f"     {entry['sql'][:300]}")
+                print('\n'.join(f'     {line}' for line in plan.splitlines()))
+            failed += bool(bad)
+
+    print(f'{checked} statements checked, {failed} with Seq Scan or Sort')
+    if EXPECTED:
+        print('expected: ' + '; '.join(f'{route} - {reason}' for route, (_, reason) in EXPECTED.items()))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
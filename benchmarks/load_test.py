@@ -0,0 +1,314 @@
+'''
+Business: Нагрузочный прогон обработчиков crm-api, clients и contacts в процессе против одноразовой базы
+Args: --dsn, --scale (10k/100k/1m или число клиентов), --concurrency, --requests, --scenarios, --seed, --output
+Returns: JSON с p50/p95/p99, пропускной способностью, числом запросов к БД на вызов и пиковым RSS по каждому сценарию
+
+Каждый сценарий идёт в отдельном подпроцессе, чтобы пиковый RSS и тёплый пул относились только к нему.
+Кэш ответов по умолчанию выключен (--cache lru, чтобы включить) - иначе замеряется только LRU.
+Сравнение двух прогонов: python benchmarks/load_test.py --compare before.json after.json
+'''
+import argparse
+import importlib.util
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+SCALES = {'10k': 10000, '100k': 100000, '1m': 1000000}
+
+SEARCH_TERMS = ['Иван', 'Анна Попов', 'Компания 42', 'client12', 'Смирнов', 'Лебедев 7']
+
+EventBuilder = Callable[[random.Random, int], Dict[str, Any]]
+
+
+def _get(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {}, 'body': ''}
+
+
+def _post(body: Dict[str, Any], params: Dict[str, Any] = None) -> Dict[str, Any]:
+    return {'httpMethod': 'POST', 'queryStringParameters': params or {}, 'headers': {}, 'body': json.dumps(body)}
+
+
+# сценарий -> (функция, построитель события, пишет ли в базу)
+SCENARIOS: Dict[str, Tuple[str, EventBuilder, bool]] = {
+    'crm-api.clients.page': ('crm-api', lambda r, n: _get({'entity': 'clients', 'limit': '100'}), False),
+    'crm-api.clients.search': (
+        'crm-api', lambda r, n: _get({'entity': 'clients', 'search': r.choice(SEARCH_TERMS)}), False
+    ),
+    'crm-api.stats': ('crm-api', lambda r, n: _get({'entity': 'clients', 'action': 'stats'}), False),
+    'crm-api.contacts.by-client': (
+        'crm-api', lambda r, n: _get({'entity': 'contacts', 'clientId': str(r.randint(1, n))}), False
+    ),
+    'crm-api.interactions.page': ('crm-api', lambda r, n: _get({'entity': 'interactions', 'limit': '100'}), False),
+    'crm-api.interactions.by-client': (
+        'crm-api', lambda r, n: _get({'entity': 'interactions', 'clientId': str(r.randint(1, n))}), False
+    ),
+    'clients.page': ('clients', lambda r, n: _get({'limit': '100'}), False),
+    'clients.detail': ('clients', lambda r, n: _get({'id': str(r.randint(1, n))}), False),
+    'clients.hydrate': (
+        'clients', lambda r, n: _get({'ids': ','.join(str(r.randint(1, n)) for _ in range(20))}), False
+    ),
+    'contacts.by-client': ('contacts', lambda r, n: _get({'client_id': str(r.randint(1, n))}), False),
+    'contacts.page': ('contacts', lambda r, n: _get({'limit': '100'}), False),
+    'crm-api.interactions.create': (
+        'crm-api',
+        lambda r, n: _post({
+            'clientId': r.randint(1, n), 'interactionType': 'call',
+            'description': 'Нагрузочный тест', 'createdBy': 'bench'
+        }, {'entity': 'interactions'}),
+        True
+    ),
+    'crm-api.interactions.batch': (
+        'crm-api',
+        lambda r, n: _post([
+            {'clientId': r.randint(1, n), 'interactionType': 'call', 'description': 'Нагрузочный тест', 'createdBy': 'bench'}
+            for _ in range(50)
+        ], {'entity': 'interactions', 'action': 'batch'}),
+        True
+    ),
+}
+
+
+def load_handler(function: str) -> Callable:
+    path = os.path.join(BACKEND_DIR, function, 'index.py')
+    spec = importlib.util.spec_from_file_location(f"bench_{function.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+def install_counting_pool(dsn: str, max_size: int) -> threading.local:
+    '''
+    Каждый вызов обработчика целиком выполняется в одном потоке, поэтому счётчик
+    в threading.local даёт число запросов к БД на конкретный вызов.
+    '''
+    import psycopg2.extensions
+    from shared import db
+    from shared.instrumentation import InstrumentedConnection
+
+    counter = threading.local()
+    counting_classes: Dict[type, type] = {}
+
+    def counted(cursor_class: type) -> type:
+        if cursor_class not in counting_classes:
+            def execute(self, *args, **kwargs):
+                counter.queries = getattr(counter, 'queries', 0) + 1
+                return cursor_class.execute(self, *args, **kwargs)
+
+            def copy_expert(self, *args, **kwargs):
+                counter.queries = getattr(counter, 'queries', 0) + 1
+                return cursor_class.copy_expert(self, *args, **kwargs)
+
+            counting_classes[cursor_class] = type(
+                f'Counting{cursor_class.__name__}', (cursor_class,),
+                {'execute': execute, 'copy_expert': copy_expert}
+            )
+        return counting_classes[cursor_class]
+
+    class CountingConnection(InstrumentedConnection):
+        def cursor(self, *args, **kwargs):
+            kwargs['cursor_factory'] = counted(kwargs.get('cursor_factory') or psycopg2.extensions.cursor)
+            return super().cursor(*args, **kwargs)
+
+    db._pool = db.ConnectionPool(dsn, max_size=max_size, connection_factory=CountingConnection)
+    return counter
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(name: str, dsn: str, clients: int, concurrency: int, requests: int, warmup: int, seed: int) -> Dict[str, Any]:
+    function, build_event, _ = SCENARIOS[name]
+    sys.path.insert(0, BACKEND_DIR)
+    counter = install_counting_pool(dsn, concurrency)
+    handler = load_handler(function)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    def call() -> Tuple[float, int, int]:
+        with rng_lock:
+            event = build_event(rng, clients)
+        counter.queries = 0
+        started = time.perf_counter()
+        try:
+            status = handler(event, None).get('statusCode', 500)
+        except Exception:
+            status = 599
+        return time.perf_counter() - started, status, counter.queries
+
+    for _ in range(warmup):
+        call()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda _: call(), range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+    errors = sum(1 for _, status, _ in results if status >= 500)
+    queries = [count for _, _, count in results]
+    return {
+        'scenario': name,
+        'requests': requests,
+        'errors': errors,
+        'statusCodes': {str(s): sum(1 for _, status, _ in results if status == s) for s in sorted({r[1] for r in results})},
+        'p50Ms': round(percentile(latencies, 0.50), 2),
+        'p95Ms': round(percentile(latencies, 0.95), 2),
+        'p99Ms': round(percentile(latencies, 0.99), 2),
+        'maxMs': round(latencies[-1], 2) if latencies else 0.0,
+        'throughputRps': round(requests / wall, 1) if wall else 0.0,
+        'queriesPerRequest': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'peakRssMb': peak_rss_mb()
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def spawn_scenario(name: str, args: argparse.Namespace, dsn: str, clients: int) -> Dict[str, Any]:
+    env = {
+        **os.environ,
+        'DATABASE_URL': dsn,
+        'CACHE_BACKEND': args.cache,
+        'DB_POOL_MAX_SIZE': str(args.concurrency)
+    }
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker', name, '--dsn', dsn, '--clients', str(clients),
+        '--concurrency', str(args.concurrency), '--requests', str(args.requests), '--warmup', str(args.warmup),
+        '--random-seed', str(args.random_seed)
+    ]
+    completed = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        return {'scenario': name, 'failed': True, 'returnCode': completed.returncode}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path, encoding='utf-8') as f:
+        before = {r['scenario']: r for r in json.load(f)['results']}
+    with open(after_path, encoding='utf-8') as f:
+        after = {r['scenario']: r for r in json.load(f)['results']}
+
+    print(f"{'scenario':34} {'p50':>16} {'p99':>16} {'rps':>16} {'q/req':>12}")
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name], after[name]
+        if old.get('failed') or new.get('failed'):
+            print(f'{name:34} failed')
+            continue
+        cells = []
+        for key, width in (('p50Ms', 16), ('p99Ms', 16), ('throughputRps', 16), ('queriesPerRequest', 12)):
+            delta = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f'{new[key]:>8} ({delta:+.0f}%)'.rjust(width))
+        print(f'{name:34} ' + ' '.join(cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--scale', default='10k', help='10k, 100k, 1m или число клиентов')
+    parser.add_argument('--seed', action='store_true', help='пересоздать схему и данные перед прогоном')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scenarios', default='read', help='read, all или имена через запятую')
+    parser.add_argument('--cache', default='off', choices=['off', 'lru', 'redis'])
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--output', help='путь к JSON; по умолчанию benchmarks/results/<время>-<коммит>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--clients', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.worker:
+        result = run_scenario(
+            args.worker, args.dsn, args.clients, args.concurrency, args.requests, args.warmup, args.random_seed
+        )
+        print(json.dumps(result))
+        return
+
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL is required')
+
+    import seed as seeding
+
+    clients = SCALES.get(args.scale.lower()) or int(args.scale)
+    if args.seed:
+        seeding.prepare(args.dsn, clients)
+
+    if args.scenarios == 'read':
+        names = [name for name, (_, _, writes) in SCENARIOS.items() if not writes]
+    elif args.scenarios == 'all':
+        names = list(SCENARIOS)
+    else:
+        names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    dsn = seeding.bench_dsn(args.dsn)
+    results = []
+    for name in names:
+        result = spawn_scenario(name, args, dsn, clients)
+        results.append(result)
+        if result.get('failed'):
+            print(f'{name:34} failed (exit {result["returnCode"]})', file=sys.stderr)
+        else:
+            print(
+                f"{name:34} p50={result['p50Ms']}ms p95={result['p95Ms']}ms p99={result['p99Ms']}ms "
+                f"rps={result['throughputRps']} q/req={result['queriesPerRequest']} rss={result['peakRssMb']}MB",
+                file=sys.stderr
+            )
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'startedAt': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'clients': clients,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'cache': args.cache,
+        'results': results
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}-{args.scale}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Results written to {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+Business: Бенчмарк JOIN взаимодействий из crm-api - обычный execute против PREPARE/EXECUTE из shared.prepared
+Args: --dsn (или BENCH_DATABASE_URL) - база после benchmarks/seed.py, --iterations - число вызовов на вариант
+Returns: задержка в микросекундах (среднее, p50, p95) и ускорение для каждой формы запроса
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from shared.pagination import keyset_condition
+from shared.prepared import StatementRegistry
+from shared.serializers import INTERACTION
+
+from seed import bench_dsn
+
+COLUMNS = INTERACTION.select_list('i', {'client_name': 'c.name'})
+
+
+def interactions_sql(by_client: bool, after: bool) -> str:
+    page_where, _ = keyset_condition(('i.interaction_date', 'i.id'), [None, None] if after else None, bound_leading=True)
+    client_filter = 'i.client_id = %s AND ' if by_client else ''
+    return f"""
+        SELECT {COLUMNS}
+        FROM interactions i
+        JOIN clients c ON i.client_id = c.id
+        WHERE {client_filter}{page_where}
+        ORDER BY i.interaction_date DESC, i.id DESC
+        LIMIT %s
+    """
+
+
+def measure(run, iterations: int):
+    for _ in range(min(50, iterations)):
+        run()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.fmean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL is required')
+
+    conn = psycopg2.connect(bench_dsn(args.dsn))
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute('SELECT max(id) FROM clients')
+    max_client = cursor.fetchone()[0]
+    cursor.execute('SELECT interaction_date, id FROM interactions ORDER BY interaction_date DESC, id DESC OFFSET 500 LIMIT 1')
+    after = cursor.fetchone()
+    registry = StatementRegistry()
+    rng = random.Random(1)
+
+    shapes = {
+        'interactions first page (LIMIT 101)': (interactions_sql(False, False), lambda: (101,)),
+        'interactions after cursor (LIMIT 101)': (interactions_sql(False, True), lambda: (after[0], *after, 101)),
+        'interactions by client (LIMIT 101)': (interactions_sql(True, False), lambda: (rng.randint(1, max_client), 101)),
+    }
+
+    print(f"{'query':40} {'plain mean/p50/p95 us':>26} {'prepared mean/p50/p95 us':>28} {'speedup':>8}")
+    for label, (sql, make_params) in shapes.items():
+        def plain():
+            cursor.execute(sql, make_params())
+            cursor.fetchall()
+
+        def prepared():
+            registry.execute(cursor, sql, make_params())
+            cursor.fetchall()
+
+        p_mean, p50, p95 = measure(plain, args.iterations)
+        s_mean, s50, s95 = measure(prepared, args.iterations)
+        print(
+            f'{label:40} {p_mean:8.0f} {p50:8.0f} {p95:8.0f} {s_mean:9.0f} {s50:8.0f} {s95:8.0f}'
+            f' {p_mean / s_mean:7.2f}x'
+        )
+    print(registry.stats())
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
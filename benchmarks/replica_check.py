@@ -0,0 +1,214 @@
+'''
+Business: Проверка чтения с реплик на двух локальных PostgreSQL - основная база и реплика из pg_basebackup
+Args: --pg-bin - каталог с initdb, pg_ctl и pg_basebackup (по умолчанию из PATH), --port - порт основной базы
+      (реплика - на следующем), --clients - размер seed.py, --keep - не удалять каталог кластеров
+Returns: код выхода 1 и список несработавших проверок, 0 - если все проверки прошли
+
+Скрипт сам поднимает оба кластера во временном каталоге: initdb, реплика через pg_basebackup -R
+с потоковой репликацией, схема и данные - benchmarks/seed.py на основной базе. Обработчики
+вызываются в процессе с DATABASE_URL и DATABASE_REPLICA_URLS, маршрут читается из X-Db-Route.
+Проверяется: GET идёт на реплику, лента изменений - на основную базу; после записи при
+остановленном воспроизведении WAL чтение этого процесса и чтение с X-Db-Lsn из другого
+контейнера уходят на основную базу и видят запись, а после воспроизведения - снова на реплику;
+остановленная реплика заменяется основной базой, вернувшаяся - снова получает чтения.
+pg_ctl не запускается от root - скрипт запускается от обычного пользователя.
+'''
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+
+from explain_check import load_handler
+from seed import SCHEMA, prepare
+from shared import replicas
+
+# Отставание по времени здесь не проверяется: при паузе воспроизведения реплика упиралась бы
+# в REPLICA_MAX_LAG раньше, чем в позицию записи
+MAX_LAG = 3600
+CHECK_INTERVAL = 0.2
+RETRY_AFTER = 2.0
+CATCH_UP_TIMEOUT = 30.0
+
+
+class Cluster:
+    def __init__(self, pg_bin: str, root: str, name: str, port: int):
+        self.pg_bin = pg_bin
+        self.data = os.path.join(root, name)
+        self.log = os.path.join(root, f'{name}.log')
+        self.socket_dir = root
+        self.port = port
+        self.dsn = f'postgresql://postgres@/postgres?host={root}&port={port}&connect_timeout=2'
+
+    def tool(self, name: str) -> str:
+        return os.path.join(self.pg_bin, name) if self.pg_bin else name
+
+    def run(self, *args: str) -> None:
+        subprocess.run(args, check=True, capture_output=True)
+
+    def start(self) -> None:
+        self.run(
+            self.tool('pg_ctl'), '-D', self.data, '-l', self.log, '-w',
+            '-o', f"-p {self.port} -k {self.socket_dir} -c listen_addresses=''", 'start'
+        )
+
+    def stop(self) -> None:
+        self.run(self.tool('pg_ctl'), '-D', self.data, '-m', 'fast', '-w', 'stop')
+
+    def query(self, sql: str) -> Any:
+        with psycopg2.connect(self.dsn) as conn, conn.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()[0] if cursor.description else None
+
+
+def create_clusters(pg_bin: str, root: str, port: int) -> List[Cluster]:
+    primary = Cluster(pg_bin, root, 'primary', port)
+    replica = Cluster(pg_bin, root, 'replica', port + 1)
+    # trust в pg_hba по умолчанию разрешает и локальную репликацию
+    primary.run(primary.tool('initdb'), '-D', primary.data, '-U', 'postgres', '-A', 'trust')
+    primary.start()
+    replica.run(
+        replica.tool('pg_basebackup'), '-h', root, '-p', str(port), '-U', 'postgres',
+        '-D', replica.data, '-R', '-X', 'stream'
+    )
+    replica.start()
+    return [primary, replica]
+
+
+def wait_replayed(primary: Cluster, replica: Cluster, lsn: Optional[str] = None) -> None:
+    lsn = lsn or primary.query('SELECT pg_current_wal_lsn()::text')
+    deadline = time.monotonic() + CATCH_UP_TIMEOUT
+    while not replica.query(f"SELECT pg_last_wal_replay_lsn() >= '{lsn}'::pg_lsn"):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'replica did not replay {lsn} in {CATCH_UP_TIMEOUT}s')
+        time.sleep(0.05)
+    # Состояние реплики в процессе обработчиков обновляется раз в CHECK_INTERVAL
+    time.sleep(CHECK_INTERVAL * 2)
+
+
+def call(handler: Callable, method: str, params: Dict[str, Any], body: Any = None,
+         headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return handler({
+        'httpMethod': method,
+        'queryStringParameters': params,
+        'headers': headers or {},
+        'body': json.dumps(body) if body is not None else ''
+    }, None)
+
+
+def run_checks(primary: Cluster, replica: Cluster) -> List[str]:
+    api, clients = load_handler('crm-api'), load_handler('clients')
+    failures: List[str] = []
+
+    def check(label: str, response: Dict[str, Any], route: str, contains: Optional[str] = None) -> None:
+        actual = response['headers'].get(replicas.ROUTE_HEADER, '')
+        problems = []
+        if response['statusCode'] != 200:
+            problems.append(f"HTTP {response['statusCode']}")
+        if not actual.startswith(route):
+            problems.append(f'route {actual!r}, expected {route!r}')
+        if contains is not None and contains not in response['body']:
+            problems.append(f'{contains!r} not in body')
+        print(f"{'FAIL' if problems else 'ok  '} {label}: {actual} {'; '.join(problems)}")
+        if problems:
+            failures.append(f"{label}: {'; '.join(problems)}")
+
+    wait_replayed(primary, replica)
+    check('list reads from replica', call(api, 'GET', {'entity': 'clients', 'limit': '5'}), 'replica:1')
+    check('change feed stays on primary', call(api, 'GET', {'entity': 'clients', 'action': 'changes'}), 'primary')
+
+    # Запись этого процесса: ответ несёт X-Db-Lsn, чтения до воспроизведения - с основной базы
+    replica.query('SELECT pg_wal_replay_pause()')
+    created = call(api, 'POST', {'entity': 'clients'}, {'name': 'Replica check own write'})
+    own_lsn = created['headers'].get(replicas.LSN_HEADER)
+    if created['statusCode'] != 201 or not own_lsn:
+        failures.append(f"write: HTTP {created['statusCode']}, {replicas.LSN_HEADER}={own_lsn!r}")
+        return failures
+    client_id = str(json.loads(created['body'])['id'])
+    check('own write, replay paused', call(clients, 'GET', {'id': client_id}), 'primary;fallback=lsn', 'own write')
+
+    # Запись другого контейнера: процесс о ней не знает, позицию приносит только X-Db-Lsn
+    with psycopg2.connect(primary.dsn) as conn, conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SCHEMA}.clients (name) VALUES ('Replica check foreign write') RETURNING id")
+        foreign_id = str(cursor.fetchone()[0])
+        conn.commit()
+        cursor.execute('SELECT pg_current_wal_lsn()::text')
+        foreign_lsn = cursor.fetchone()[0]
+    if replica.query(f'SELECT count(*) FROM {SCHEMA}.clients WHERE id = {foreign_id}'):
+        failures.append('replay pause: replica already has the foreign write, fallback checks prove nothing')
+    check('X-Db-Lsn from another container, replay paused',
+          call(clients, 'GET', {'id': foreign_id}, headers={replicas.LSN_HEADER: foreign_lsn}),
+          'primary;fallback=lsn', 'foreign write')
+
+    replica.query('SELECT pg_wal_replay_resume()')
+    wait_replayed(primary, replica, foreign_lsn)
+    check('X-Db-Lsn after replay',
+          call(clients, 'GET', {'id': foreign_id}, headers={replicas.LSN_HEADER: foreign_lsn}),
+          'replica:1', 'foreign write')
+
+    replica.stop()
+    check('replica stopped', call(api, 'GET', {'entity': 'clients', 'limit': '5'}), 'primary')
+    check('replica still down', call(api, 'GET', {'entity': 'clients', 'limit': '5'}), 'primary;fallback=down')
+    replica.start()
+    wait_replayed(primary, replica)
+    time.sleep(RETRY_AFTER)
+    check('replica back', call(api, 'GET', {'entity': 'clients', 'limit': '5'}), 'replica:1')
+
+    for record_id in (client_id, foreign_id):
+        call(clients, 'DELETE', {'id': record_id})
+    print(json.dumps(replicas.get_replicas().stats(), default=str))
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pg-bin', default=os.environ.get('PG_BIN', ''))
+    parser.add_argument('--port', type=int, default=55432)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--keep', action='store_true')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='crm-replica-')
+    clusters: List[Cluster] = []
+    try:
+        clusters = create_clusters(args.pg_bin, root, args.port)
+        primary, replica = clusters
+        prepare(primary.dsn, args.clients)
+        os.environ.update({
+            'DATABASE_URL': primary.dsn,
+            'DATABASE_REPLICA_URLS': replica.dsn,
+            # Запятая в search_path не даёт передать его в DSN: DATABASE_REPLICA_URLS делится по запятым
+            'PGOPTIONS': f'-c search_path={SCHEMA},public',
+            'REPLICA_MAX_LAG': str(MAX_LAG),
+            'REPLICA_CHECK_INTERVAL': str(CHECK_INTERVAL),
+            'REPLICA_RETRY_AFTER': str(RETRY_AFTER),
+            'CACHE_BACKEND': 'off',
+            'SINGLE_FLIGHT': 'off',
+            'ASYNC_DB': 'off'
+        })
+        failures = run_checks(primary, replica)
+    finally:
+        for cluster in clusters:
+            try:
+                cluster.stop()
+            except subprocess.CalledProcessError:
+                pass
+        if args.keep:
+            print(f'clusters kept in {root}')
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{len(failures)} replica checks failed" if failures else 'all replica checks passed')
+    for failure in failures:
+        print(f'  {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
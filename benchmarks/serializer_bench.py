@@ -0,0 +1,81 @@
+'''
+Business: Микро-бенчмарк сериализации списков клиентов: прежний код обработчиков против shared.serializers
+Args: --rows - размер списка, --repeat - число прогонов
+Returns: строки в секунду для каждого варианта
+'''
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from shared import serializers
+from shared.serializers import CLIENT, CLIENT_ROW
+
+
+def make_rows(count: int):
+    base = datetime(2024, 1, 1, 9, 30, 15, 123456)
+    return [
+        (i, f'Клиент {i}', f'ООО Компания {i % 500}', f'client{i}@example.com', f'+7 900 {i:07d}',
+         f'г. Москва, ул. Тестовая, д. {i % 300}', base + timedelta(minutes=i), base + timedelta(minutes=i, seconds=5))
+        for i in range(count)
+    ]
+
+
+def legacy_camel(rows):
+    dict_rows = [dict(zip(CLIENT.columns, row)) for row in rows]
+
+    def run():
+        clients_list = []
+        for client in dict_rows:
+            clients_list.append({
+                'id': client['id'],
+                'name': client['name'],
+                'company': client['company'],
+                'email': client['email'],
+                'phone': client['phone'],
+                'address': client['address'],
+                'createdAt': client['created_at'].isoformat() if client['created_at'] else None,
+                'updatedAt': client['updated_at'].isoformat() if client['updated_at'] else None
+            })
+        return json.dumps(clients_list)
+    return run
+
+
+def legacy_snake(rows):
+    dict_rows = [dict(zip(CLIENT.columns, row)) for row in rows]
+
+    def run():
+        return json.dumps([dict(row) for row in dict_rows], default=str)
+    return run
+
+
+def measure(name: str, func, rows: int, repeat: int) -> None:
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f'{name:<40} {rows / best:>12,.0f} rows/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    # RealDictCursor строит словарь на каждую строку ещё до сериализации; в legacy-варианты это не входит
+    measure('crm-api: hand-built dicts', legacy_camel(rows), args.rows, args.repeat)
+    measure('crm-api: CLIENT.dumps', lambda: CLIENT.dumps(rows), args.rows, args.repeat)
+    measure('clients: dict(row) + default=str', legacy_snake(rows), args.rows, args.repeat)
+    measure('clients: CLIENT_ROW.dumps', lambda: CLIENT_ROW.dumps(rows), args.rows, args.repeat)
+
+    orjson = serializers.orjson
+    serializers.orjson = None
+    measure('crm-api: CLIENT.dumps (no orjson)', lambda: CLIENT.dumps(rows), args.rows, args.repeat)
+    measure('clients: CLIENT_ROW.dumps (no orjson)', lambda: CLIENT_ROW.dumps(rows), args.rows, args.repeat)
+    serializers.orjson = orjson
+
+
+if __name__ == '__main__':
+    main()
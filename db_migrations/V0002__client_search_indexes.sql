@@ -0,0 +1,9 @@
+-- Поиск клиентов: триграммы для подстрок и tsvector для префиксного поиска по словам
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Выражения должны совпадать с backend/shared/search.py, иначе индексы не будут использованы
+CREATE INDEX IF NOT EXISTS idx_clients_search_trgm ON clients
+    USING gin ((lower(coalesce(name, '') || ' ' || coalesce(company, '') || ' ' || coalesce(email, ''))) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_clients_search_tsv ON clients
+    USING gin ((to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(company, '') || ' ' || coalesce(email, ''))));
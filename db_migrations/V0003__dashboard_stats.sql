@@ -0,0 +1,204 @@
+-- Счётчики дашборда, которые поддерживаются триггерами вместо полного COUNT(*) на каждый запрос
+CREATE TABLE IF NOT EXISTS crm_stats (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    total_clients BIGINT NOT NULL DEFAULT 0,
+    clients_with_email BIGINT NOT NULL DEFAULT 0,
+    total_interactions BIGINT NOT NULL DEFAULT 0
+);
+
+-- Дневные корзины для окон "за последние 30 дней"
+CREATE TABLE IF NOT EXISTS crm_stats_daily (
+    day DATE PRIMARY KEY,
+    new_clients BIGINT NOT NULL DEFAULT 0,
+    interactions BIGINT NOT NULL DEFAULT 0
+);
+
+-- Полный пересчёт: начальное заполнение и исправление после ручных правок данных
+CREATE OR REPLACE FUNCTION crm_stats_rebuild() RETURNS VOID
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    LOCK TABLE crm_stats, crm_stats_daily IN EXCLUSIVE MODE;
+    LOCK TABLE clients, interactions IN SHARE MODE;
+
+    INSERT INTO crm_stats (id, total_clients, clients_with_email, total_interactions)
+    SELECT 1,
+           (SELECT COUNT(*) FROM clients),
+           (SELECT COUNT(email) FROM clients),
+           (SELECT COUNT(*) FROM interactions)
+    ON CONFLICT (id) DO UPDATE SET
+        total_clients = EXCLUDED.total_clients,
+        clients_with_email = EXCLUDED.clients_with_email,
+        total_interactions = EXCLUDED.total_interactions;
+
+    DELETE FROM crm_stats_daily;
+    INSERT INTO crm_stats_daily (day, new_clients, interactions)
+    SELECT day, SUM(new_clients), SUM(interactions)
+    FROM (
+        SELECT created_at::date AS day, COUNT(*) AS new_clients, 0 AS interactions
+        FROM clients WHERE created_at IS NOT NULL GROUP BY 1
+        UNION ALL
+        SELECT interaction_date::date, 0, COUNT(*)
+        FROM interactions WHERE interaction_date IS NOT NULL GROUP BY 1
+    ) buckets
+    GROUP BY day;
+END;
+$$;
+
+-- Триггеры уровня оператора с переходными таблицами: один UPDATE счётчиков на весь оператор,
+-- поэтому пакетные вставки и удаления не превращаются в тысячи обновлений одной строки.
+-- Инкремент "x = x + delta" берёт блокировку строки и корректен при параллельных транзакциях.
+CREATE OR REPLACE FUNCTION crm_stats_apply_clients(delta_sign INTEGER, rows_total BIGINT, rows_with_email BIGINT)
+RETURNS VOID LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats SET
+        total_clients = total_clients + delta_sign * rows_total,
+        clients_with_email = clients_with_email + delta_sign * rows_with_email
+    WHERE id = 1;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_clients_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_stats_apply_clients(1, (SELECT COUNT(*) FROM new_rows), (SELECT COUNT(email) FROM new_rows));
+    INSERT INTO crm_stats_daily (day, new_clients)
+    SELECT created_at::date, COUNT(*) FROM new_rows WHERE created_at IS NOT NULL GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET new_clients = crm_stats_daily.new_clients + EXCLUDED.new_clients;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_clients_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_stats_apply_clients(-1, (SELECT COUNT(*) FROM old_rows), (SELECT COUNT(email) FROM old_rows));
+    UPDATE crm_stats_daily d SET new_clients = d.new_clients - o.cnt
+    FROM (SELECT created_at::date AS day, COUNT(*) AS cnt FROM old_rows WHERE created_at IS NOT NULL GROUP BY 1) o
+    WHERE d.day = o.day;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_clients_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+DECLARE
+    email_delta BIGINT := (SELECT COUNT(email) FROM new_rows) - (SELECT COUNT(email) FROM old_rows);
+BEGIN
+    -- Обычное редактирование карточки не трогает email, и тогда строку счётчиков не блокируем
+    IF email_delta <> 0 THEN
+        UPDATE crm_stats SET clients_with_email = clients_with_email + email_delta WHERE id = 1;
+    END IF;
+
+    -- created_at меняется редко, но тогда клиент переезжает в другую дневную корзину
+    UPDATE crm_stats_daily d SET new_clients = d.new_clients - o.cnt
+    FROM (
+        SELECT o.created_at::date AS day, COUNT(*) AS cnt
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE o.created_at IS DISTINCT FROM n.created_at AND o.created_at IS NOT NULL
+        GROUP BY 1
+    ) o
+    WHERE d.day = o.day;
+    INSERT INTO crm_stats_daily (day, new_clients)
+    SELECT n.created_at::date, COUNT(*)
+    FROM old_rows o JOIN new_rows n ON n.id = o.id
+    WHERE o.created_at IS DISTINCT FROM n.created_at AND n.created_at IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET new_clients = crm_stats_daily.new_clients + EXCLUDED.new_clients;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_interactions_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats SET total_interactions = total_interactions + (SELECT COUNT(*) FROM new_rows) WHERE id = 1;
+    INSERT INTO crm_stats_daily (day, interactions)
+    SELECT interaction_date::date, COUNT(*) FROM new_rows WHERE interaction_date IS NOT NULL GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET interactions = crm_stats_daily.interactions + EXCLUDED.interactions;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_interactions_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats SET total_interactions = total_interactions - (SELECT COUNT(*) FROM old_rows) WHERE id = 1;
+    UPDATE crm_stats_daily d SET interactions = d.interactions - o.cnt
+    FROM (SELECT interaction_date::date AS day, COUNT(*) AS cnt FROM old_rows WHERE interaction_date IS NOT NULL GROUP BY 1) o
+    WHERE d.day = o.day;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_interactions_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats_daily d SET interactions = d.interactions - o.cnt
+    FROM (
+        SELECT o.interaction_date::date AS day, COUNT(*) AS cnt
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE o.interaction_date IS DISTINCT FROM n.interaction_date AND o.interaction_date IS NOT NULL
+        GROUP BY 1
+    ) o
+    WHERE d.day = o.day;
+    INSERT INTO crm_stats_daily (day, interactions)
+    SELECT n.interaction_date::date, COUNT(*)
+    FROM old_rows o JOIN new_rows n ON n.id = o.id
+    WHERE o.interaction_date IS DISTINCT FROM n.interaction_date AND n.interaction_date IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET interactions = crm_stats_daily.interactions + EXCLUDED.interactions;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_truncate() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_stats_rebuild();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_crm_stats_clients_insert ON clients;
+CREATE TRIGGER trg_crm_stats_clients_insert AFTER INSERT ON clients
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_clients_insert();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_clients_delete ON clients;
+CREATE TRIGGER trg_crm_stats_clients_delete AFTER DELETE ON clients
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_clients_delete();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_clients_update ON clients;
+CREATE TRIGGER trg_crm_stats_clients_update AFTER UPDATE ON clients
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_clients_update();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_interactions_insert ON interactions;
+CREATE TRIGGER trg_crm_stats_interactions_insert AFTER INSERT ON interactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_interactions_insert();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_interactions_delete ON interactions;
+CREATE TRIGGER trg_crm_stats_interactions_delete AFTER DELETE ON interactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_interactions_delete();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_interactions_update ON interactions;
+CREATE TRIGGER trg_crm_stats_interactions_update AFTER UPDATE ON interactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_interactions_update();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_clients_truncate ON clients;
+CREATE TRIGGER trg_crm_stats_clients_truncate AFTER TRUNCATE ON clients
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_truncate();
+
+DROP TRIGGER IF EXISTS trg_crm_stats_interactions_truncate ON interactions;
+CREATE TRIGGER trg_crm_stats_interactions_truncate AFTER TRUNCATE ON interactions
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_truncate();
+
+SELECT crm_stats_rebuild();
@@ -0,0 +1,55 @@
+-- updated_at для контактов и взаимодействий, которых не было в V0001
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE interactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+UPDATE contacts SET updated_at = created_at;
+UPDATE interactions SET updated_at = created_at;
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_clients_updated_at ON clients;
+CREATE TRIGGER trg_clients_updated_at BEFORE UPDATE ON clients
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_contacts_updated_at ON contacts;
+CREATE TRIGGER trg_contacts_updated_at BEFORE UPDATE ON contacts
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_interactions_updated_at ON interactions;
+CREATE TRIGGER trg_interactions_updated_at BEFORE UPDATE ON interactions
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Версия таблицы для ETag: растёт в той же транзакции, что и изменение данных,
+-- поэтому читатель не увидит новую версию раньше самих данных
+CREATE TABLE IF NOT EXISTS crm_versions (
+    entity VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO crm_versions (entity) VALUES ('clients'), ('contacts'), ('interactions')
+ON CONFLICT (entity) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION crm_versions_bump() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_versions SET version = version + 1 WHERE entity = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_clients_version ON clients;
+CREATE TRIGGER trg_clients_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON clients
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_versions_bump();
+
+DROP TRIGGER IF EXISTS trg_contacts_version ON contacts;
+CREATE TRIGGER trg_contacts_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON contacts
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_versions_bump();
+
+DROP TRIGGER IF EXISTS trg_interactions_version ON interactions;
+CREATE TRIGGER trg_interactions_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON interactions
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_versions_bump();
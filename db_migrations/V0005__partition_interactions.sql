@@ -0,0 +1,127 @@
+-- История взаимодействий секционируется по месяцам interaction_date: запросы "последние N"
+-- читают только свежие секции, а старые месяцы отсоединяются и уходят в архив целиком
+-- (maintenance/partitions.py archive) вместо DELETE миллионов строк.
+
+-- Имя месячной секции: interactions_y2025m01
+CREATE OR REPLACE FUNCTION crm_interactions_partition_name(month_start DATE) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT 'interactions_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM')
+$$;
+
+-- Создаёт секцию месяца, если её нет. Строки этого месяца, уже попавшие в DEFAULT,
+-- переносятся в новую таблицу до ATTACH - иначе ATTACH откажет из-за пересечения с DEFAULT.
+-- DELETE и INSERT идут по секциям напрямую, поэтому триггеры счётчиков и версий на
+-- interactions не срабатывают: строки остаются в таблице, меняется только секция.
+CREATE OR REPLACE FUNCTION crm_interactions_create_partition(month_start DATE) RETURNS BOOLEAN
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+DECLARE
+    part TEXT := crm_interactions_partition_name(month_start);
+    month_end DATE := (month_start + INTERVAL '1 month')::date;
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE interactions INCLUDING DEFAULTS)', part);
+    IF to_regclass('interactions_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM interactions_default WHERE interaction_date >= %L AND interaction_date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            month_start, month_end, part
+        );
+    END IF;
+    EXECUTE format('ALTER TABLE interactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, month_start, month_end);
+    RETURN TRUE;
+END;
+$$;
+
+-- Секции на months_ahead месяцев вперёд и для всех месяцев, строки которых лежат в DEFAULT.
+-- Запускается по расписанию (maintenance/partitions.py ensure); DEFAULT страхует вставку,
+-- если запуск пропущен, и пустеет при следующем запуске.
+CREATE OR REPLACE FUNCTION crm_interactions_ensure_partitions(months_ahead INTEGER DEFAULT 3) RETURNS INTEGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+DECLARE
+    month_start DATE;
+    created INTEGER := 0;
+BEGIN
+    FOR month_start IN
+        SELECT DISTINCT date_trunc('month', interaction_date)::date FROM interactions_default
+        UNION
+        SELECT (date_trunc('month', CURRENT_DATE) + make_interval(months => n))::date
+        FROM generate_series(0, months_ahead) n
+        ORDER BY 1
+    LOOP
+        IF crm_interactions_create_partition(month_start) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Ключ секционирования должен входить в первичный ключ, поэтому PK - (id, interaction_date),
+-- а interaction_date становится NOT NULL. Последовательность id остаётся прежней.
+UPDATE interactions SET interaction_date = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE interaction_date IS NULL;
+
+ALTER TABLE interactions RENAME TO interactions_unpartitioned;
+ALTER INDEX interactions_pkey RENAME TO interactions_unpartitioned_pkey;
+ALTER TABLE interactions_unpartitioned RENAME CONSTRAINT interactions_client_id_fkey TO interactions_unpartitioned_client_id_fkey;
+DROP INDEX IF EXISTS idx_interactions_client_id;
+
+CREATE TABLE interactions (
+    id INTEGER NOT NULL DEFAULT nextval('interactions_id_seq'),
+    client_id INTEGER REFERENCES clients(id),
+    interaction_type VARCHAR(50) NOT NULL,
+    description TEXT,
+    interaction_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_by VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, interaction_date)
+) PARTITION BY RANGE (interaction_date);
+
+ALTER SEQUENCE interactions_id_seq OWNED BY interactions.id;
+
+CREATE TABLE interactions_default PARTITION OF interactions DEFAULT;
+
+-- Карточка клиента и список по clientId: последние взаимодействия клиента без сортировки
+CREATE INDEX idx_interactions_client_date ON interactions (client_id, interaction_date DESC);
+-- Лента crm-api: ORDER BY interaction_date DESC, id DESC LIMIT n
+CREATE INDEX idx_interactions_date ON interactions (interaction_date DESC, id DESC);
+
+SELECT crm_interactions_create_partition(month_start)
+FROM (
+    SELECT DISTINCT date_trunc('month', interaction_date)::date AS month_start
+    FROM interactions_unpartitioned
+    ORDER BY 1
+) months;
+
+-- Счётчики crm_stats уже учитывают эти строки, триггеры на новой таблице создаются ниже
+INSERT INTO interactions (id, client_id, interaction_type, description, interaction_date, created_by, created_at, updated_at)
+SELECT id, client_id, interaction_type, description, interaction_date, created_by, created_at, updated_at
+FROM interactions_unpartitioned;
+
+DROP TABLE interactions_unpartitioned;
+
+SELECT crm_interactions_ensure_partitions();
+
+-- Триггеры из V0003 и V0004 создаются заново на секционированной таблице
+CREATE TRIGGER trg_crm_stats_interactions_insert AFTER INSERT ON interactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_interactions_insert();
+
+CREATE TRIGGER trg_crm_stats_interactions_delete AFTER DELETE ON interactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_interactions_delete();
+
+CREATE TRIGGER trg_crm_stats_interactions_update AFTER UPDATE ON interactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_interactions_update();
+
+CREATE TRIGGER trg_crm_stats_interactions_truncate AFTER TRUNCATE ON interactions
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_stats_truncate();
+
+CREATE TRIGGER trg_interactions_updated_at BEFORE UPDATE ON interactions
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+CREATE TRIGGER trg_interactions_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON interactions
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_versions_bump();
@@ -0,0 +1,28 @@
+-- Индексы под формы запросов обработчиков: ключ индекса повторяет WHERE и ORDER BY запроса,
+-- поэтому страница читается из индекса по порядку, без Seq Scan и без Sort.
+-- Проверка планов всех запросов - benchmarks/explain_check.py.
+
+-- UNIQUE (email) из V0001 уже создал индекс clients_email_key, второй только замедляет запись
+DROP INDEX IF EXISTS idx_clients_email;
+
+-- Списки клиентов: ORDER BY created_at DESC, id DESC и курсор (created_at, id) < (...);
+-- по нему же фильтр created_before массового удаления и изменения
+CREATE INDEX IF NOT EXISTS idx_clients_created ON clients (created_at DESC, id DESC);
+
+-- Фильтр company массового изменения и удаления
+CREATE INDEX IF NOT EXISTS idx_clients_company ON clients (company);
+
+-- Лента контактов: ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_contacts_created ON contacts (created_at DESC, id DESC);
+
+-- Контакты клиента (список по client_id и карточка): WHERE client_id = ... ORDER BY is_primary DESC,
+-- created_at DESC, id DESC. Индекс по одному client_id становится его префиксом и удаляется.
+CREATE INDEX IF NOT EXISTS idx_contacts_client_order ON contacts (client_id, is_primary DESC, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_contacts_client_id;
+
+-- Взаимодействия клиента: ORDER BY interaction_date DESC, id DESC. Без id в ключе из V0005
+-- страница клиента шла через Incremental Sort по всем месячным секциям. Индекс покрывает и
+-- проверку "не было взаимодействий с даты" массового удаления - она идёт Index Only Scan.
+-- Индекс на секционированной таблице создаётся и на всех секциях, включая будущие.
+CREATE INDEX IF NOT EXISTS idx_interactions_client_order ON interactions (client_id, interaction_date DESC, id DESC);
+DROP INDEX IF EXISTS idx_interactions_client_date;
@@ -0,0 +1,123 @@
+-- Лента изменений для action=changes: вкладка получает список один раз, дальше опрашивает
+-- дельту с прошлой отметки, и цена опроса зависит от числа изменений, а не от размера таблицы.
+-- По строке на изменённую запись: сущность, id и операция. Сами данные читаются из таблиц.
+
+-- Отметка ленты - номер транзакции (xid8), а не seq: seq выдаётся при записи, а видна строка
+-- после COMMIT, и поздно зафиксированная транзакция с меньшим seq потерялась бы за курсором.
+-- Дельта отдаёт только транзакции ниже xmin текущего снимка - все они уже завершены.
+CREATE TABLE IF NOT EXISTS crm_changes (
+    seq BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    entity VARCHAR(32) NOT NULL,
+    row_id INTEGER,
+    op CHAR(1) NOT NULL CHECK (op IN ('I', 'U', 'D', 'T')),
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_crm_changes_entity_txid ON crm_changes (entity, txid);
+
+-- Граница очистки (maintenance/changes.py prune): отметка ниже неё получает reset
+CREATE TABLE IF NOT EXISTS crm_changes_horizon (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    pruned_before XID8 NOT NULL
+);
+
+INSERT INTO crm_changes_horizon (id, pruned_before) VALUES (1, pg_current_xact_id())
+ON CONFLICT (id) DO NOTHING;
+
+-- Триггеры уровня оператора с переходными таблицами, как счётчики V0003: массовое удаление
+-- пишет ленту одним INSERT. NOTIFY уходит при COMMIT, одинаковые уведомления транзакции
+-- PostgreSQL склеивает в одно - слушателю приходит имя таблицы, дальше он читает дельту.
+CREATE OR REPLACE FUNCTION crm_changes_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_changes (entity, row_id, op) SELECT TG_TABLE_NAME, id, 'I' FROM new_rows;
+    PERFORM pg_notify('crm_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_changes_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_changes (entity, row_id, op) SELECT TG_TABLE_NAME, id, 'U' FROM new_rows;
+    PERFORM pg_notify('crm_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_changes_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_changes (entity, row_id, op) SELECT TG_TABLE_NAME, id, 'D' FROM old_rows;
+    PERFORM pg_notify('crm_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
+-- TRUNCATE не перечисляет строки: дельта через такую запись отвечает reset
+CREATE OR REPLACE FUNCTION crm_changes_truncate() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_changes (entity, op) VALUES (TG_TABLE_NAME, 'T');
+    PERFORM pg_notify('crm_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_clients_changes_insert ON clients;
+CREATE TRIGGER trg_clients_changes_insert AFTER INSERT ON clients
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_insert();
+
+DROP TRIGGER IF EXISTS trg_clients_changes_update ON clients;
+CREATE TRIGGER trg_clients_changes_update AFTER UPDATE ON clients
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_update();
+
+DROP TRIGGER IF EXISTS trg_clients_changes_delete ON clients;
+CREATE TRIGGER trg_clients_changes_delete AFTER DELETE ON clients
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_delete();
+
+DROP TRIGGER IF EXISTS trg_clients_changes_truncate ON clients;
+CREATE TRIGGER trg_clients_changes_truncate AFTER TRUNCATE ON clients
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_truncate();
+
+DROP TRIGGER IF EXISTS trg_contacts_changes_insert ON contacts;
+CREATE TRIGGER trg_contacts_changes_insert AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_insert();
+
+DROP TRIGGER IF EXISTS trg_contacts_changes_update ON contacts;
+CREATE TRIGGER trg_contacts_changes_update AFTER UPDATE ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_update();
+
+DROP TRIGGER IF EXISTS trg_contacts_changes_delete ON contacts;
+CREATE TRIGGER trg_contacts_changes_delete AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_delete();
+
+DROP TRIGGER IF EXISTS trg_contacts_changes_truncate ON contacts;
+CREATE TRIGGER trg_contacts_changes_truncate AFTER TRUNCATE ON contacts
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_truncate();
+
+DROP TRIGGER IF EXISTS trg_interactions_changes_insert ON interactions;
+CREATE TRIGGER trg_interactions_changes_insert AFTER INSERT ON interactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_insert();
+
+DROP TRIGGER IF EXISTS trg_interactions_changes_update ON interactions;
+CREATE TRIGGER trg_interactions_changes_update AFTER UPDATE ON interactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_update();
+
+DROP TRIGGER IF EXISTS trg_interactions_changes_delete ON interactions;
+CREATE TRIGGER trg_interactions_changes_delete AFTER DELETE ON interactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_delete();
+
+DROP TRIGGER IF EXISTS trg_interactions_changes_truncate ON interactions;
+CREATE TRIGGER trg_interactions_changes_truncate AFTER TRUNCATE ON interactions
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_changes_truncate();
@@ -0,0 +1,121 @@
+-- Поиск дублей клиентов без сравнения каждого с каждым: кандидаты ищутся только внутри
+-- блоков - одинаковый нормализованный телефон, одинаковый email без учёта регистра или
+-- один домен email и похожее имя. Каждый блок - индекс, поэтому на клиента уходит
+-- несколько индексных поисков, и полный проход (maintenance/dedup.py) растёт линейно.
+
+-- Телефон как ключ: только цифры, российские 8XXXXXXXXXX и XXXXXXXXXX (10 цифр) приводятся
+-- к 7XXXXXXXXXX. Короче 7 цифр - не телефон (добавочный, мусор), ключа нет.
+-- Выражение без FROM, чтобы планировщик встраивал функцию одинаково в индекс и в запрос.
+CREATE OR REPLACE FUNCTION crm_normalize_phone(phone TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT NULLIF(regexp_replace(regexp_replace(regexp_replace(regexp_replace(
+        phone, '\D', '', 'g'), '^8(\d{10})$', '7\1'), '^(\d{10})$', '7\1'), '^\d{0,6}$', ''), '')
+$$;
+
+CREATE OR REPLACE FUNCTION crm_normalize_email(email TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT NULLIF(lower(btrim(email)), '')
+$$;
+
+-- Email нормализуется при записи из любого пути - crm-api, clients, импорт, PUT:
+-- UNIQUE (email) из V0001 начинает ловить и "Ivan@Mail.ru" против "ivan@mail.ru".
+-- Старые строки не переписываются - два адреса, различающиеся регистром, нарушили бы UNIQUE;
+-- такие пары находит блок по email ниже. Телефон хранится как введён, ключ живёт в индексе.
+CREATE OR REPLACE FUNCTION crm_clients_normalize() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    NEW.email := crm_normalize_email(NEW.email);
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_clients_normalize ON clients;
+CREATE TRIGGER trg_clients_normalize BEFORE INSERT OR UPDATE OF email ON clients
+    FOR EACH ROW EXECUTE FUNCTION crm_clients_normalize();
+
+-- Блоки: телефон, email, имя (триграммы) - домен email сверяется уже внутри найденных по имени
+CREATE INDEX IF NOT EXISTS idx_clients_phone_key ON clients (crm_normalize_phone(phone))
+    WHERE crm_normalize_phone(phone) IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_clients_email_key ON clients (crm_normalize_email(email))
+    WHERE crm_normalize_email(email) IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_clients_name_trgm ON clients USING gin (lower(name) gin_trgm_ops);
+
+-- Кандидаты в дубли для клиентов source_ids: не больше per_client на клиента в каждом блоке,
+-- так общий телефон офиса не превращается в тысячи пар. Совпадение телефона или email -
+-- score 1, похожее имя - similarity по триграммам, лучшие первыми. У точных блоков нет
+-- ORDER BY c.id: с ним LIMIT уводил планировщик в обход первичного ключа по всей таблице.
+-- Условие только c.id <> s.id: "c.id > s.id" планировщик добавлял к индексу блока через
+-- BitmapAnd по первичному ключу, и каждый поиск читал бы половину таблицы. Пара находится
+-- с обеих сторон, полный проход сворачивает её в (меньший id, больший id).
+-- После пяти вызовов кэш планов перешёл бы на общий план без значений source_ids и per_client,
+-- а с ним пачка шла в десятки раз медленнее - план строится под каждый вызов. ROWS - оценка
+-- для карточки одного клиента: с умолчанием 1000 строк JOIN с clients шёл через Seq Scan.
+CREATE OR REPLACE FUNCTION crm_client_duplicates(source_ids INTEGER[], per_client INTEGER)
+RETURNS TABLE (client_id INTEGER, duplicate_id INTEGER, reasons TEXT[], score DOUBLE PRECISION)
+LANGUAGE sql STABLE
+ROWS 20
+SET search_path FROM CURRENT
+SET pg_trgm.similarity_threshold = 0.6
+SET plan_cache_mode = force_custom_plan
+AS $$
+    WITH source AS (
+        SELECT id, lower(name) AS name_key, crm_normalize_phone(phone) AS phone_key,
+               crm_normalize_email(email) AS email_key
+        FROM clients
+        WHERE id = ANY(source_ids)
+    ), pairs AS (
+        SELECT s.id, d.id AS duplicate_id, 'phone' AS reason, 1::DOUBLE PRECISION AS score
+        FROM source s
+        CROSS JOIN LATERAL (
+            SELECT c.id FROM clients c
+            WHERE crm_normalize_phone(c.phone) = s.phone_key
+              AND c.id <> s.id
+            LIMIT per_client
+        ) d
+        WHERE s.phone_key IS NOT NULL
+        UNION ALL
+        SELECT s.id, d.id, 'email', 1::DOUBLE PRECISION
+        FROM source s
+        CROSS JOIN LATERAL (
+            SELECT c.id FROM clients c
+            WHERE crm_normalize_email(c.email) = s.email_key
+              AND c.id <> s.id
+            LIMIT per_client
+        ) d
+        WHERE s.email_key IS NOT NULL
+        UNION ALL
+        SELECT s.id, d.id, 'name', d.score
+        FROM source s
+        CROSS JOIN LATERAL (
+            SELECT c.id, similarity(lower(c.name), s.name_key)::DOUBLE PRECISION AS score FROM clients c
+            WHERE lower(c.name) % s.name_key
+              AND split_part(crm_normalize_email(c.email), '@', 2) = split_part(s.email_key, '@', 2)
+              AND c.id <> s.id
+            ORDER BY score DESC, c.id
+            LIMIT per_client
+        ) d
+        WHERE s.email_key IS NOT NULL
+    )
+    SELECT id, duplicate_id, array_agg(reason ORDER BY reason), max(score)
+    FROM pairs
+    GROUP BY id, duplicate_id
+$$;
+
+-- Результат полного прохода: пара хранится один раз, меньший id первым.
+-- Удаление или слияние клиента убирает его пары каскадом. score в DOUBLE PRECISION:
+-- курсор очереди проходит через JSON, и REAL не совпал бы с собой после округления.
+CREATE TABLE IF NOT EXISTS crm_duplicate_candidates (
+    client_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+    duplicate_id INTEGER NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+    reasons TEXT[] NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    found_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (client_id, duplicate_id),
+    CHECK (client_id < duplicate_id)
+);
+
+-- Очередь на просмотр: ORDER BY score DESC, client_id DESC, duplicate_id DESC и курсор по ним же
+CREATE INDEX IF NOT EXISTS idx_duplicate_candidates_score
+    ON crm_duplicate_candidates (score DESC, client_id DESC, duplicate_id DESC);
+-- Каскад при удалении клиента по второй колонке пары
+CREATE INDEX IF NOT EXISTS idx_duplicate_candidates_duplicate ON crm_duplicate_candidates (duplicate_id);
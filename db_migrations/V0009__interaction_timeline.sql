@@ -0,0 +1,112 @@
+-- Таймлайн взаимодействий для action=timeline: дневные счётчики по типу и автору, которые
+-- поддерживаются триггерами, как crm_stats_daily из V0003. Корзина дня, недели или месяца -
+-- сумма не больше 31 дневной строки на тип и автора, поэтому график за год не читает interactions.
+-- Таймлайн одного клиента считается по самим строкам: у клиента их мало, а индекс
+-- idx_interactions_client_order (V0006) отдаёт их диапазоном по дате.
+
+-- Автор без имени хранится пустой строкой: NULL не может входить в первичный ключ
+CREATE TABLE IF NOT EXISTS crm_interactions_daily (
+    day DATE NOT NULL,
+    interaction_type VARCHAR(50) NOT NULL,
+    created_by VARCHAR(100) NOT NULL DEFAULT '',
+    interactions BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, interaction_type, created_by)
+);
+
+-- Полный пересчёт: начальное заполнение, TRUNCATE и исправление после ручных правок данных
+CREATE OR REPLACE FUNCTION crm_timeline_rebuild() RETURNS VOID
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    LOCK TABLE crm_interactions_daily IN EXCLUSIVE MODE;
+    LOCK TABLE interactions IN SHARE MODE;
+
+    DELETE FROM crm_interactions_daily;
+    INSERT INTO crm_interactions_daily (day, interaction_type, created_by, interactions)
+    SELECT interaction_date::date, interaction_type, COALESCE(created_by, ''), COUNT(*)
+    FROM interactions
+    GROUP BY 1, 2, 3;
+END;
+$$;
+
+-- Триггеры уровня оператора: одна вставка с ON CONFLICT на весь оператор. Строки
+-- обновляются в порядке ключа, поэтому параллельные пакеты не ловят взаимную блокировку.
+CREATE OR REPLACE FUNCTION crm_timeline_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_interactions_daily AS d (day, interaction_type, created_by, interactions)
+    SELECT interaction_date::date, interaction_type, COALESCE(created_by, ''), COUNT(*)
+    FROM new_rows
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (day, interaction_type, created_by) DO UPDATE SET interactions = d.interactions + EXCLUDED.interactions;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_timeline_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_interactions_daily d SET interactions = d.interactions - o.cnt
+    FROM (
+        SELECT interaction_date::date AS day, interaction_type, COALESCE(created_by, '') AS created_by, COUNT(*) AS cnt
+        FROM old_rows
+        GROUP BY 1, 2, 3
+    ) o
+    WHERE d.day = o.day AND d.interaction_type = o.interaction_type AND d.created_by = o.created_by;
+    RETURN NULL;
+END;
+$$;
+
+-- Правка описания или перенос к другому клиенту счётчики не трогает - только смена дня, типа или автора
+CREATE OR REPLACE FUNCTION crm_timeline_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_interactions_daily AS d (day, interaction_type, created_by, interactions)
+    SELECT day, interaction_type, created_by, SUM(delta)
+    FROM (
+        SELECT o.interaction_date::date AS day, o.interaction_type, COALESCE(o.created_by, '') AS created_by, -1 AS delta
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE (o.interaction_date::date, o.interaction_type, o.created_by)
+              IS DISTINCT FROM (n.interaction_date::date, n.interaction_type, n.created_by)
+        UNION ALL
+        SELECT n.interaction_date::date, n.interaction_type, COALESCE(n.created_by, ''), 1
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE (o.interaction_date::date, o.interaction_type, o.created_by)
+              IS DISTINCT FROM (n.interaction_date::date, n.interaction_type, n.created_by)
+    ) moved
+    GROUP BY 1, 2, 3
+    HAVING SUM(delta) <> 0
+    ORDER BY 1, 2, 3
+    ON CONFLICT (day, interaction_type, created_by) DO UPDATE SET interactions = d.interactions + EXCLUDED.interactions;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_timeline_truncate() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_timeline_rebuild();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_crm_timeline_insert ON interactions;
+CREATE TRIGGER trg_crm_timeline_insert AFTER INSERT ON interactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_timeline_insert();
+
+DROP TRIGGER IF EXISTS trg_crm_timeline_delete ON interactions;
+CREATE TRIGGER trg_crm_timeline_delete AFTER DELETE ON interactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_timeline_delete();
+
+DROP TRIGGER IF EXISTS trg_crm_timeline_update ON interactions;
+CREATE TRIGGER trg_crm_timeline_update AFTER UPDATE ON interactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_timeline_update();
+
+DROP TRIGGER IF EXISTS trg_crm_timeline_truncate ON interactions;
+CREATE TRIGGER trg_crm_timeline_truncate AFTER TRUNCATE ON interactions
+    FOR EACH STATEMENT EXECUTE FUNCTION crm_timeline_truncate();
+
+SELECT crm_timeline_rebuild();
@@ -0,0 +1,164 @@
+-- Полосы счётчиков дашборда: вместо одной строки crm_stats и одной строки дня в crm_stats_daily
+-- у каждого счётчика crm_stats_slots() строк. Транзакция пишет в полосу по своему xid, поэтому
+-- параллельные записи в clients и interactions не ждут друг друга на блокировке одной строки
+-- до фиксации. Чтение складывает полосы: не больше 16 строк итогов и 16 * 31 дневных.
+-- Значение одной полосы может быть отрицательным (удаление в другой полосе, чем вставка) - смысл имеет только сумма.
+
+CREATE OR REPLACE FUNCTION crm_stats_slots() RETURNS SMALLINT
+LANGUAGE sql IMMUTABLE AS $$ SELECT 16::smallint $$;
+
+-- Внутри транзакции полоса одна и та же: оператор за оператором блокируют ту же строку, а не новые
+CREATE OR REPLACE FUNCTION crm_stats_slot() RETURNS SMALLINT
+LANGUAGE sql VOLATILE AS $$
+    SELECT (1 + pg_current_xact_id()::text::bigint % crm_stats_slots())::smallint
+$$;
+
+ALTER TABLE crm_stats DROP CONSTRAINT IF EXISTS crm_stats_id_check;
+ALTER TABLE crm_stats ADD CONSTRAINT crm_stats_id_check CHECK (id BETWEEN 1 AND 16);
+INSERT INTO crm_stats (id)
+SELECT generate_series(1, crm_stats_slots())
+ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE crm_stats_daily ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE crm_stats_daily DROP CONSTRAINT IF EXISTS crm_stats_daily_pkey;
+ALTER TABLE crm_stats_daily ADD PRIMARY KEY (day, slot);
+
+-- Полный пересчёт кладёт всё в полосу 1, остальные полосы обнуляются
+CREATE OR REPLACE FUNCTION crm_stats_rebuild() RETURNS VOID
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    LOCK TABLE crm_stats, crm_stats_daily IN EXCLUSIVE MODE;
+    LOCK TABLE clients, interactions IN SHARE MODE;
+
+    UPDATE crm_stats SET total_clients = 0, clients_with_email = 0, total_interactions = 0;
+    UPDATE crm_stats SET
+        total_clients = (SELECT COUNT(*) FROM clients),
+        clients_with_email = (SELECT COUNT(email) FROM clients),
+        total_interactions = (SELECT COUNT(*) FROM interactions)
+    WHERE id = 1;
+
+    DELETE FROM crm_stats_daily;
+    INSERT INTO crm_stats_daily (day, slot, new_clients, interactions)
+    SELECT day, 1, SUM(new_clients), SUM(interactions)
+    FROM (
+        SELECT created_at::date AS day, COUNT(*) AS new_clients, 0 AS interactions
+        FROM clients WHERE created_at IS NOT NULL GROUP BY 1
+        UNION ALL
+        SELECT interaction_date::date, 0, COUNT(*)
+        FROM interactions WHERE interaction_date IS NOT NULL GROUP BY 1
+    ) buckets
+    GROUP BY day;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_apply_clients(delta_sign INTEGER, rows_total BIGINT, rows_with_email BIGINT)
+RETURNS VOID LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats SET
+        total_clients = total_clients + delta_sign * rows_total,
+        clients_with_email = clients_with_email + delta_sign * rows_with_email
+    WHERE id = crm_stats_slot();
+END;
+$$;
+
+-- Изменение дневных счётчиков - вставка с ON CONFLICT в полосу транзакции: при удалении
+-- строки дня в этой полосе может ещё не быть, тогда она появляется с отрицательным значением
+CREATE OR REPLACE FUNCTION crm_stats_apply_daily(days DATE[], client_deltas BIGINT[], interaction_deltas BIGINT[])
+RETURNS VOID LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_stats_daily AS d (day, slot, new_clients, interactions)
+    SELECT day, crm_stats_slot(), SUM(new_clients), SUM(interactions)
+    FROM unnest(days, client_deltas, interaction_deltas) AS u(day, new_clients, interactions)
+    WHERE day IS NOT NULL
+    GROUP BY day
+    HAVING SUM(new_clients) <> 0 OR SUM(interactions) <> 0
+    ORDER BY day
+    ON CONFLICT (day, slot) DO UPDATE SET
+        new_clients = d.new_clients + EXCLUDED.new_clients,
+        interactions = d.interactions + EXCLUDED.interactions;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_clients_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_stats_apply_clients(1, (SELECT COUNT(*) FROM new_rows), (SELECT COUNT(email) FROM new_rows));
+    PERFORM crm_stats_apply_daily(array_agg(d), array_agg(n), array_agg(0::bigint))
+    FROM (SELECT created_at::date AS d, COUNT(*) AS n FROM new_rows GROUP BY 1) x;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_clients_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_stats_apply_clients(-1, (SELECT COUNT(*) FROM old_rows), (SELECT COUNT(email) FROM old_rows));
+    PERFORM crm_stats_apply_daily(array_agg(d), array_agg(-n), array_agg(0::bigint))
+    FROM (SELECT created_at::date AS d, COUNT(*) AS n FROM old_rows GROUP BY 1) x;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_clients_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+DECLARE
+    email_delta BIGINT := (SELECT COUNT(email) FROM new_rows) - (SELECT COUNT(email) FROM old_rows);
+BEGIN
+    -- Обычное редактирование карточки не трогает email, и тогда строку счётчиков не блокируем
+    IF email_delta <> 0 THEN
+        UPDATE crm_stats SET clients_with_email = clients_with_email + email_delta WHERE id = crm_stats_slot();
+    END IF;
+
+    -- created_at меняется редко, но тогда клиент переезжает в другую дневную корзину
+    PERFORM crm_stats_apply_daily(array_agg(d), array_agg(n), array_agg(0::bigint))
+    FROM (
+        SELECT o.created_at::date AS d, -1::bigint AS n
+        FROM old_rows o JOIN new_rows nr ON nr.id = o.id
+        WHERE o.created_at IS DISTINCT FROM nr.created_at
+        UNION ALL
+        SELECT nr.created_at::date, 1
+        FROM old_rows o JOIN new_rows nr ON nr.id = o.id
+        WHERE o.created_at IS DISTINCT FROM nr.created_at
+    ) x;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_interactions_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats SET total_interactions = total_interactions + (SELECT COUNT(*) FROM new_rows)
+    WHERE id = crm_stats_slot();
+    PERFORM crm_stats_apply_daily(array_agg(d), array_agg(0::bigint), array_agg(n))
+    FROM (SELECT interaction_date::date AS d, COUNT(*) AS n FROM new_rows GROUP BY 1) x;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_interactions_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_stats SET total_interactions = total_interactions - (SELECT COUNT(*) FROM old_rows)
+    WHERE id = crm_stats_slot();
+    PERFORM crm_stats_apply_daily(array_agg(d), array_agg(0::bigint), array_agg(-n))
+    FROM (SELECT interaction_date::date AS d, COUNT(*) AS n FROM old_rows GROUP BY 1) x;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_stats_interactions_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_stats_apply_daily(array_agg(d), array_agg(0::bigint), array_agg(n))
+    FROM (
+        SELECT o.interaction_date::date AS d, -1::bigint AS n
+        FROM old_rows o JOIN new_rows nr ON nr.id = o.id
+        WHERE o.interaction_date IS DISTINCT FROM nr.interaction_date
+        UNION ALL
+        SELECT nr.interaction_date::date, 1
+        FROM old_rows o JOIN new_rows nr ON nr.id = o.id
+        WHERE o.interaction_date IS DISTINCT FROM nr.interaction_date
+    ) x;
+    RETURN NULL;
+END;
+$$;
@@ -0,0 +1,23 @@
+-- Полосы версий для ETag: у каждой сущности crm_stats_slots() строк (V0010), оператор записи
+-- прибавляет 1 в полосе своей транзакции, версия сущности - сумма полос. Сумма растёт с каждой
+-- зафиксированной транзакцией, поэтому ETag меняется при любой записи, а параллельные писатели
+-- не ждут друг друга на одной строке версии до фиксации. Максимум полос для этого не годится:
+-- транзакция, зафиксированная позже с меньшим номером, не сдвинула бы его.
+
+ALTER TABLE crm_versions ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE crm_versions DROP CONSTRAINT IF EXISTS crm_versions_pkey;
+ALTER TABLE crm_versions ADD PRIMARY KEY (entity, slot);
+
+INSERT INTO crm_versions (entity, slot)
+SELECT entity, slot
+FROM (VALUES ('clients'), ('contacts'), ('interactions')) e(entity)
+CROSS JOIN generate_series(1, crm_stats_slots()) slot
+ON CONFLICT (entity, slot) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION crm_versions_bump() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    UPDATE crm_versions SET version = version + 1 WHERE entity = TG_TABLE_NAME AND slot = crm_stats_slot();
+    RETURN NULL;
+END;
+$$;
@@ -0,0 +1,82 @@
+-- Полосы дневных счётчиков таймлайна (V0009), как у crm_stats_daily в V0010: строка дня
+-- по типу и автору теперь на полосу транзакции, иначе все записи взаимодействий одного типа
+-- за сегодня ждали бы друг друга на одной строке до фиксации. Таймлайн уже суммирует строки.
+
+ALTER TABLE crm_interactions_daily ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE crm_interactions_daily DROP CONSTRAINT IF EXISTS crm_interactions_daily_pkey;
+ALTER TABLE crm_interactions_daily ADD PRIMARY KEY (day, interaction_type, created_by, slot);
+
+-- Все изменения - одна упорядоченная вставка с ON CONFLICT в полосу транзакции;
+-- удаление тоже вставка, с отрицательным числом, если строки в этой полосе ещё нет
+CREATE OR REPLACE FUNCTION crm_timeline_apply(days DATE[], types VARCHAR[], creators VARCHAR[], deltas BIGINT[])
+RETURNS VOID LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    INSERT INTO crm_interactions_daily AS d (day, interaction_type, created_by, slot, interactions)
+    SELECT day, interaction_type, created_by, crm_stats_slot(), SUM(delta)
+    FROM unnest(days, types, creators, deltas) AS u(day, interaction_type, created_by, delta)
+    GROUP BY 1, 2, 3
+    HAVING SUM(delta) <> 0
+    ORDER BY 1, 2, 3
+    ON CONFLICT (day, interaction_type, created_by, slot) DO UPDATE SET interactions = d.interactions + EXCLUDED.interactions;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_timeline_rebuild() RETURNS VOID
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    LOCK TABLE crm_interactions_daily IN EXCLUSIVE MODE;
+    LOCK TABLE interactions IN SHARE MODE;
+
+    DELETE FROM crm_interactions_daily;
+    INSERT INTO crm_interactions_daily (day, interaction_type, created_by, slot, interactions)
+    SELECT interaction_date::date, interaction_type, COALESCE(created_by, ''), 1, COUNT(*)
+    FROM interactions
+    GROUP BY 1, 2, 3;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_timeline_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_timeline_apply(array_agg(d), array_agg(t), array_agg(c), array_agg(n))
+    FROM (
+        SELECT interaction_date::date AS d, interaction_type AS t, COALESCE(created_by, '') AS c, COUNT(*) AS n
+        FROM new_rows
+        GROUP BY 1, 2, 3
+    ) x;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_timeline_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_timeline_apply(array_agg(d), array_agg(t), array_agg(c), array_agg(-n))
+    FROM (
+        SELECT interaction_date::date AS d, interaction_type AS t, COALESCE(created_by, '') AS c, COUNT(*) AS n
+        FROM old_rows
+        GROUP BY 1, 2, 3
+    ) x;
+    RETURN NULL;
+END;
+$$;
+
+-- Правка описания или перенос к другому клиенту счётчики не трогает - только смена дня, типа или автора
+CREATE OR REPLACE FUNCTION crm_timeline_update() RETURNS TRIGGER
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+    PERFORM crm_timeline_apply(array_agg(d), array_agg(t), array_agg(c), array_agg(n))
+    FROM (
+        SELECT o.interaction_date::date AS d, o.interaction_type AS t, COALESCE(o.created_by, '') AS c, -1::bigint AS n
+        FROM old_rows o JOIN new_rows nr ON nr.id = o.id
+        WHERE (o.interaction_date::date, o.interaction_type, o.created_by)
+              IS DISTINCT FROM (nr.interaction_date::date, nr.interaction_type, nr.created_by)
+        UNION ALL
+        SELECT nr.interaction_date::date, nr.interaction_type, COALESCE(nr.created_by, ''), 1
+        FROM old_rows o JOIN new_rows nr ON nr.id = o.id
+        WHERE (o.interaction_date::date, o.interaction_type, o.created_by)
+              IS DISTINCT FROM (nr.interaction_date::date, nr.interaction_type, nr.created_by)
+    ) x;
+    RETURN NULL;
+END;
+$$;
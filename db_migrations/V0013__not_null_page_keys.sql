@@ -0,0 +1,12 @@
+-- Ключи keyset-пагинации без NULL: сравнение (created_at, id) < (NULL, x) даёт NULL, и страницы
+-- после строки с пустым created_at или is_primary молча заканчивались. interaction_date
+-- уже NOT NULL с V0005. Пустые created_at берутся из updated_at, is_primary - false; DEFAULT
+-- у колонок был и раньше, теперь NULL нельзя и записать явно. Условия страниц и индексы
+-- V0006 остаются прежними.
+UPDATE clients SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+UPDATE contacts SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+UPDATE contacts SET is_primary = FALSE WHERE is_primary IS NULL;
+
+ALTER TABLE clients ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE contacts ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE contacts ALTER COLUMN is_primary SET NOT NULL;
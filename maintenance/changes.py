@@ -0,0 +1,62 @@
+'''
+Business: Очистка ленты изменений crm_changes (миграция V0007) от записей старше заданного срока
+Args: prune [--keep-hours N] - удалить записи старше N часов
+Returns: число удалённых записей; граница crm_changes_horizon сдвигается за последнюю удалённую транзакцию
+
+Запуск по расписанию раз в час, например:
+    python maintenance/changes.py --dsn "$DATABASE_URL" prune --keep-hours 24
+
+Лента нужна только открытым вкладкам между опросами, поэтому хранится сутки. Записи
+удаляются транзакциями целиком: граница ставится сразу за самой поздней удалённой
+транзакцией, и отметка клиента ниже неё получает reset вместо дельты с дырой.
+'''
+import argparse
+import os
+
+import psycopg2
+
+DEFAULT_KEEP_HOURS = 24
+
+
+def prune(conn, keep_hours: int) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT max(txid)::text::bigint
+            FROM crm_changes
+            WHERE changed_at < CURRENT_TIMESTAMP - make_interval(hours => %s)
+        """, (keep_hours,))
+        last = cursor.fetchone()[0]
+        if last is None:
+            conn.commit()
+            print('prune: nothing to delete')
+            return
+        cursor.execute("""
+            UPDATE crm_changes_horizon
+            SET pruned_before = GREATEST(pruned_before, (%s + 1)::text::xid8)
+            WHERE id = 1
+        """, (last,))
+        cursor.execute('DELETE FROM crm_changes WHERE txid <= %s::text::xid8', (str(last),))
+        deleted = cursor.rowcount
+    conn.commit()
+    print(f'prune: deleted {deleted} change(s), horizon {last + 1}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    prune_parser = commands.add_parser('prune')
+    prune_parser.add_argument('--keep-hours', type=int, default=DEFAULT_KEEP_HOURS)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        prune(conn, args.keep_hours)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''
+Business: Полный проход поиска дублей клиентов (миграция V0008) - очередь пар в crm_duplicate_candidates
+Args: scan [--batch N] [--per-client N] - пройти всех клиентов пачками по id
+Returns: очередь пар (меньший id, больший id) с причинами и score для GET action=duplicates
+
+Запуск по расписанию раз в сутки, например:
+    python maintenance/dedup.py --dsn "$DATABASE_URL" scan
+
+Кандидаты ищутся функцией crm_client_duplicates по индексам блоков, поэтому проход линейный:
+на клиента несколько индексных поисков. Пачка - своя транзакция, прерванный проход ничего
+не портит, следующий начнёт заново. Пара находится с обеих сторон - причины объединяются.
+Пары, которых полный проход не нашёл снова (клиента поправили), из очереди удаляются.
+'''
+import argparse
+import os
+import time
+
+import psycopg2
+
+DEFAULT_BATCH = 5000
+DEFAULT_PER_CLIENT = 10
+
+
+def scan(conn, batch: int, per_client: int) -> None:
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT CURRENT_TIMESTAMP')
+        scan_started_at = cursor.fetchone()[0]
+    conn.commit()
+
+    last_id = 0
+    clients = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT ARRAY(SELECT id FROM clients WHERE id > %s ORDER BY id LIMIT %s)', (last_id, batch))
+            ids = cursor.fetchone()[0]
+            if not ids:
+                break
+            cursor.execute("""
+                INSERT INTO crm_duplicate_candidates (client_id, duplicate_id, reasons, score)
+                SELECT least(d.client_id, d.duplicate_id), greatest(d.client_id, d.duplicate_id),
+                       array_agg(DISTINCT r ORDER BY r), max(d.score)
+                FROM crm_client_duplicates(%(ids)s, %(per_client)s) d, unnest(d.reasons) r
+                GROUP BY 1, 2
+                ON CONFLICT (client_id, duplicate_id) DO UPDATE SET
+                    reasons = CASE WHEN crm_duplicate_candidates.found_at >= %(started)s
+                        THEN ARRAY(SELECT DISTINCT unnest(crm_duplicate_candidates.reasons || EXCLUDED.reasons) ORDER BY 1)
+                        ELSE EXCLUDED.reasons END,
+                    score = CASE WHEN crm_duplicate_candidates.found_at >= %(started)s
+                        THEN greatest(crm_duplicate_candidates.score, EXCLUDED.score)
+                        ELSE EXCLUDED.score END,
+                    found_at = EXCLUDED.found_at
+            """, {'ids': ids, 'per_client': per_client, 'started': scan_started_at})
+        conn.commit()
+        clients += len(ids)
+        last_id = ids[-1]
+
+    with conn.cursor() as cursor:
+        cursor.execute('DELETE FROM crm_duplicate_candidates WHERE found_at < %s', (scan_started_at,))
+        stale = cursor.rowcount
+        cursor.execute('SELECT COUNT(*) FROM crm_duplicate_candidates')
+        pairs = cursor.fetchone()[0]
+    conn.commit()
+    print(f'scan: {clients} clients, {pairs} candidate pair(s), {stale} stale removed '
+          f'in {time.perf_counter() - started:.1f}s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan_parser = commands.add_parser('scan')
+    scan_parser.add_argument('--batch', type=int, default=DEFAULT_BATCH)
+    scan_parser.add_argument('--per-client', type=int, default=DEFAULT_PER_CLIENT)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        scan(conn, args.batch, args.per_client)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+'''
+Business: Обслуживание месячных секций interactions (миграция V0005) - секции вперёд и архив старых месяцев
+Args: ensure [--months-ahead N] - создать секции; archive --keep-months N --dir PATH - выгрузить и удалить старые
+Returns: секции на ближайшие месяцы; старые месяцы - файлы interactions_yYYYYmMM.csv.gz с манифестом .json
+
+Запуск по расписанию раз в сутки, например:
+    python maintenance/partitions.py --dsn "$DATABASE_URL" ensure
+    python maintenance/partitions.py --dsn "$DATABASE_URL" archive --keep-months 24 --dir /var/backups/crm
+
+Архивация идёт в два шага. Сначала секция отсоединяется короткой транзакцией - из
+interactions месяц исчезает сразу, счётчик crm_stats.total_interactions, дневные счётчики
+таймлайна и версия для ETag обновляются. Потом отсоединённая таблица выгружается COPY
+в gzip, файл проверяется по числу строк и только после этого таблица удаляется. Если выгрузка упала, таблица остаётся в базе
+и следующий запуск archive доделает её. Вернуть месяц можно через \\copy из CSV.
+'''
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import date
+
+import psycopg2
+
+PARTITION_RE = re.compile(r'^interactions_y(\d{4})m(\d{2})$')
+
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_KEEP_MONTHS = 24
+
+
+def month_start(months_back: int) -> date:
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_month(name: str) -> date:
+    match = PARTITION_RE.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def attached_partitions(cursor) -> list:
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'interactions'::regclass
+    """)
+    return sorted(name for (name,) in cursor.fetchall() if PARTITION_RE.match(name))
+
+
+def detached_partitions(cursor) -> list:
+    '''
+    Таблицы interactions_yYYYYmMM без родителя - остатки прерванного archive.
+    '''
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_class parent ON parent.oid = 'interactions'::regclass
+        WHERE c.relkind = 'r'
+          AND c.relnamespace = parent.relnamespace
+          AND NOT c.relispartition
+    """)
+    return sorted(name for (name,) in cursor.fetchall() if PARTITION_RE.match(name))
+
+
+def ensure(conn, months_ahead: int) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT crm_interactions_ensure_partitions(%s)', (months_ahead,))
+        created = cursor.fetchone()[0]
+    conn.commit()
+    print(f'ensure: created {created} partition(s)')
+
+
+def detach(conn, name: str) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE interactions DETACH PARTITION {name}')
+        # DETACH не запускает триггеры DELETE, поэтому счётчик и версия правятся вручную
+        cursor.execute(f"""
+            UPDATE crm_stats SET total_interactions = total_interactions - (SELECT COUNT(*) FROM {name})
+            WHERE id = crm_stats_slot()
+        """)
+        # Секция - ровно один месяц, поэтому дневные счётчики таймлайна (V0009) уходят вместе с ней
+        month = partition_month(name)
+        cursor.execute(
+            "DELETE FROM crm_interactions_daily WHERE day >= %s AND day < %s + INTERVAL '1 month'",
+            (month, month)
+        )
+        cursor.execute("UPDATE crm_versions SET version = version + 1 WHERE entity = 'interactions' AND slot = crm_stats_slot()")
+        # Строки месяца пропадают без записей D в ленте - отметка TRUNCATE отправит читателей дельты на reset
+        cursor.execute("INSERT INTO crm_changes (entity, op) VALUES ('interactions', 'T')")
+    conn.commit()
+
+
+def export(conn, name: str, directory: str) -> None:
+    path = os.path.join(directory, f'{name}.csv.gz')
+    partial = f'{path}.partial'
+    with conn.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {name}')
+        rows = cursor.fetchone()[0]
+        with gzip.open(partial, 'wb') as f:
+            cursor.copy_expert(f'COPY (SELECT * FROM {name} ORDER BY interaction_date, id) TO STDOUT WITH (FORMAT csv, HEADER)', f)
+            f.flush()
+            os.fsync(f.fileobj.fileno())
+    conn.commit()
+
+    sha256 = hashlib.sha256()
+    with open(partial, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    with gzip.open(partial, 'rt', encoding='utf-8', newline='') as f:
+        archived = sum(1 for _ in csv.reader(f)) - 1
+    if archived != rows:
+        raise RuntimeError(f'{name}: archive has {archived} rows, table has {rows}')
+
+    os.replace(partial, path)
+    month = partition_month(name)
+    manifest = {
+        'partition': name,
+        'from': month.isoformat(),
+        'rows': rows,
+        'file': os.path.basename(path),
+        'sha256': sha256.hexdigest(),
+        'archivedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+    with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f'archive: {name} -> {path} ({rows} rows)')
+
+
+def archive(conn, keep_months: int, directory: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    cutoff = month_start(keep_months)
+    with conn.cursor() as cursor:
+        old = [name for name in attached_partitions(cursor) if partition_month(name) < cutoff]
+    conn.commit()
+
+    for name in old:
+        detach(conn, name)
+
+    with conn.cursor() as cursor:
+        pending = detached_partitions(cursor)
+    conn.commit()
+
+    for name in pending:
+        export(conn, name, directory)
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {name}')
+        conn.commit()
+    if not pending:
+        print(f'archive: nothing older than {cutoff.isoformat()}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    ensure_parser = commands.add_parser('ensure')
+    ensure_parser.add_argument('--months-ahead', type=int, default=DEFAULT_MONTHS_AHEAD)
+    archive_parser = commands.add_parser('archive')
+    archive_parser.add_argument('--keep-months', type=int, default=DEFAULT_KEEP_MONTHS)
+    archive_parser.add_argument('--dir', required=True)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.command == 'ensure':
+            ensure(conn, args.months_ahead)
+        else:
+            # Секции месяцев вперёд создаются и при архивации - одна задача по расписанию покрывает оба дела
+            ensure(conn, DEFAULT_MONTHS_AHEAD)
+            archive(conn, args.keep_months, args.dir)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,46 @@ import { Client, Contact } from '@/types/client';
 const CLIENTS_API = 'https://functions.poehali.dev/8695a7be-f940-4ae5-bc32-af54e101c743';
 const CONTACTS_API = 'https://functions.poehali.dev/bebd6db5-8950-42be-9388-5ad83b2e2054';
 
+// Позиция WAL последней записи: чтения сразу после неё не уходят на отстающую реплику
+const READ_YOUR_WRITES_MS = 10_000;
+let lastWrite: { lsn: string; at: number } | null = null;
+
+function rememberWrite(response: Response): void {
+  const lsn = response.headers.get('X-Db-Lsn');
+  if (lsn) lastWrite = { lsn, at: Date.now() };
+}
+
+// Заголовок только в окне после записи: без него GET остаётся простым запросом без preflight
+function readInit(): RequestInit | undefined {
+  if (!lastWrite || Date.now() - lastWrite.at > READ_YOUR_WRITES_MS) return undefined;
+  return { headers: { 'X-Db-Lsn': lastWrite.lsn } };
+}
+
+// Списки отдаются страницами: идём по X-Next-Cursor, пока сервер его присылает
+const PAGE_SIZE = 500;
+
+async function fetchAllPages<T>(url: string, error: string): Promise<T[]> {
+  const separator = url.includes('?') ? '&' : '?';
+  const rows: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const page = `${url}${separator}limit=${PAGE_SIZE}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`;
+    const response = await fetch(page, readInit());
+    if (!response.ok) throw new Error(error);
+    rows.push(...((await response.json()) as T[]));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return rows;
+}
+
 export const clientsApi = {
   async getAll(search?: string): Promise<Client[]> {
     const url = search ? `${CLIENTS_API}?search=${encodeURIComponent(search)}` : CLIENTS_API;
-    const response = await fetch(url);
-    if (!response.ok) throw new Error('Failed to fetch clients');
-    return response.json();
+    return fetchAllPages<Client>(url, 'Failed to fetch clients');
   },
 
   async getById(id: number): Promise<Client> {
-    const response = await fetch(`${CLIENTS_API}?id=${id}`);
+    const response = await fetch(`${CLIENTS_API}?id=${id}`, readInit());
     if (!response.ok) throw new Error('Failed to fetch client');
     return response.json();
   },
@@ -24,6 +54,7 @@ export const clientsApi = {
       body: JSON.stringify(client),
     });
     if (!response.ok) throw new Error('Failed to create client');
+    rememberWrite(response);
     return response.json();
   },
 
@@ -34,6 +65,7 @@ export const clientsApi = {
       body: JSON.stringify(client),
     });
     if (!response.ok) throw new Error('Failed to update client');
+    rememberWrite(response);
     return response.json();
   },
 
@@ -42,15 +74,14 @@ export const clientsApi = {
       method: 'DELETE',
     });
     if (!response.ok) throw new Error('Failed to delete client');
+    rememberWrite(response);
   },
 };
 
 export const contactsApi = {
   async getAll(clientId?: number): Promise<Contact[]> {
     const url = clientId ? `${CONTACTS_API}?client_id=${clientId}` : CONTACTS_API;
-    const response = await fetch(url);
-    if (!response.ok) throw new Error('Failed to fetch contacts');
-    return response.json();
+    return fetchAllPages<Contact>(url, 'Failed to fetch contacts');
   },
 
   async create(contact: Omit<Contact, 'id' | 'created_at'>): Promise<Contact> {
@@ -60,6 +91,7 @@ export const contactsApi = {
       body: JSON.stringify(contact),
     });
     if (!response.ok) throw new Error('Failed to create contact');
+    rememberWrite(response);
     return response.json();
   },
 
@@ -70,6 +102,7 @@ export const contactsApi = {
       body: JSON.stringify(contact),
     });
     if (!response.ok) throw new Error('Failed to update contact');
+    rememberWrite(response);
     return response.json();
   },
 
@@ -78,5 +111,6 @@ export const contactsApi = {
       method: 'DELETE',
     });
     if (!response.ok) throw new Error('Failed to delete contact');
+    rememberWrite(response);
   },
 };